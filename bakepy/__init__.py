@@ -5,6 +5,7 @@ except:
     pass
 
 from .report import Report
+from .html import Deferred
 
 from .recipes import get_recipes, get_recipe_info
 from .rendering import get_renderers, get_renderer_info
\ No newline at end of file
@@ -0,0 +1,640 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+import mimetypes
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .utils import get_image_data, get_data_uri, check_is_url, get_session, HTTPCache, DEFAULT_FETCH_WORKERS, DEFAULT_TIMEOUT
+
+_ACTIVE_REGISTRY = ContextVar("bakepy_asset_registry", default=None)
+
+IMG_TAG_REGEX = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+IMG_SRC_ATTR_REGEX = re.compile(r"""\b(src|srcset)\s*=\s*(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+DATA_URI_REGEX = re.compile(r"data:[^\s,\"']*,[^\s\"']*")
+
+#Replaces the references to deduplicated images with object URLs of their contents. Placed before the end of the body.
+ASSET_LOADER_SCRIPT = """<script>
+(function(){
+  var assets = JSON.parse(document.getElementById("bakepy-assets").textContent), urls = {};
+  function url(hash){
+    if (!(hash in urls)){
+      var uri = assets[hash], comma = uri.indexOf(","), meta = uri.slice(5, comma);
+      var type = meta.split(";")[0], data = uri.slice(comma + 1), bytes;
+      if (/;base64$/.test(meta)){
+        var raw = atob(data);
+        bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++){ bytes[i] = raw.charCodeAt(i); }
+      } else {
+        bytes = decodeURIComponent(data);
+      }
+      urls[hash] = URL.createObjectURL(new Blob([bytes], {type: type}));
+    }
+    return urls[hash];
+  }
+  document.querySelectorAll("img[data-bakepy-src], img[data-bakepy-srcset]").forEach(function(img){
+    var srcset = img.getAttribute("data-bakepy-srcset"), src = img.getAttribute("data-bakepy-src");
+    if (srcset !== null){ img.srcset = srcset.replace(/bakepy-asset:([0-9a-f]+)/g, function(_, hash){ return url(hash); }); }
+    if (src !== null){ img.src = url(src); }
+  });
+})();
+</script>"""
+
+#Extensions of the asset files, for the types mimetypes does not map (or maps differently across platforms).
+ASSET_EXTENSIONS = {
+    "image/svg+xml": ".svg",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "text/css": ".css",
+    "font/woff2": ".woff2",
+    "font/woff": ".woff",
+    "font/ttf": ".ttf",
+}
+
+#Size of the chunks used to hash and copy files.
+COPY_CHUNK_SIZE = 1 << 20
+
+def _copy_file(src, dst):
+    """
+    Copies a file, in the kernel when possible (copy_file_range, which may share the blocks on copy-on-write filesystems, or sendfile).
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for name in ("copy_file_range", "sendfile"):
+            copy = getattr(os, name, None)
+            if copy is None:
+                continue
+            offset = 0
+            try:
+                while offset < size:
+                    if name == "sendfile":
+                        sent = copy(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                    else:
+                        sent = copy(fsrc.fileno(), fdst.fileno(), size - offset, offset_src=offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except OSError:
+                if offset > 0:
+                    raise
+                continue
+            if offset == size:
+                return
+        #Fallback: copy through user space.
+        fsrc.seek(0)
+        fdst.seek(0)
+        fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+
+class AssetWriter:
+    """
+    Writes the assets of a report (images, figures and stylesheets) to content-hashed files, so browsers can cache them.
+
+    Parameters
+    ----------
+    directory: str
+        The directory holding the assets. Created if it does not exist.
+    base: str, default = None
+        The directory the assets are linked from (usually the one holding the HTML file). If None, uses the current working directory.
+    workers: int, default = 8
+        The number of files written concurrently. If None or lower than 2, files are written when registered.
+
+    Notes
+    ----------
+        File names are a hash of their contents, so unchanged assets are never written again and sibling reports
+        saved to the same directory share their files. Files are never removed.
+        Local files are copied without reading them into memory.
+    """
+    def __init__(self, directory, base = None, workers = DEFAULT_FETCH_WORKERS):
+        self.directory = os.path.abspath(directory)
+        self.base = os.path.abspath(base if base is not None else os.getcwd())
+        self.workers = workers
+        #Files written (or being written), as file name: future
+        self._files = dict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        #Other processes write their files before returning, since nothing waits for them.
+        state = self.__dict__.copy()
+        state["_files"] = dict()
+        state["_pool"] = None
+        state["workers"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Waits for every file to be written, raising the first error found.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        files, self._files = self._files, dict()
+        for future in files.values():
+            if future is not None:
+                future.result()
+
+    def key(self):
+        """
+        Gets a hashable summary of the writer's settings.
+        """
+        return (self.directory, self.base)
+
+    def _get_url(self, name):
+        return os.path.relpath(os.path.join(self.directory, name), self.base).replace(os.sep, "/")
+
+    def _submit(self, name, write):
+        """
+        Writes a file (unless it exists or is being written) and returns its URL.
+        """
+        with self._lock:
+            if name in self._files:
+                return self._get_url(name)
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                self._files[name] = None
+                return self._get_url(name)
+            os.makedirs(self.directory, exist_ok=True)
+            if self.workers is None or self.workers < 2:
+                self._files[name] = None
+            else:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers)
+                self._files[name] = self._pool.submit(self._write, path, write)
+                return self._get_url(name)
+        self._write(path, write)
+        return self._get_url(name)
+
+    def _write(self, path, write):
+        #Written to a temporary file first, so readers (and other reports) never see partial files.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def write_data(self, data, data_type):
+        """
+        Writes an asset held in memory.
+
+        Parameters
+        ----------
+        data: bytes/str
+            The contents of the asset.
+        data_type: str
+            The MIME type of the asset.
+        Returns
+        -------
+        url: str
+            The URL of the asset, relative to the base directory.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        extension = ASSET_EXTENSIONS.get(data_type) or mimetypes.guess_extension(data_type) or ""
+        name = f"{hashlib.sha256(data).hexdigest()[:32]}{extension}"
+
+        def write(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        return self._submit(name, write)
+
+    def copy_file(self, path):
+        """
+        Copies a local file.
+
+        Parameters
+        ----------
+        path: str
+            The path of the file.
+        Returns
+        -------
+        url: str
+            The URL of the copy, relative to the base directory.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        name = f"{digest.hexdigest()[:32]}{os.path.splitext(path)[1].lower()}"
+        path = os.path.abspath(path)
+        return self._submit(name, lambda tmp_path: _copy_file(path, tmp_path))
+
+class AssetRegistry:
+    """
+    Collects the images referenced while rendering a report and resolves the src used for each one.
+
+    Parameters
+    ----------
+    embed_images: bool, default = True
+        If True, images referenced by path are embedded as base64.
+    fetch_workers: int, default = 8
+        The number of concurrent downloads used when prefetching remote images.
+    timeout: float, default = 30
+        The timeout in seconds of each remote image request.
+    http_cache: HTTPCache/str, default = None
+        A cache (or the directory of one) used to avoid downloading unchanged remote images again.
+    image_optimizer: ImageOptimizer, default = None
+        If provided, embedded raster images are resized and recompressed with it.
+    asset_writer: AssetWriter, default = None
+        Only used if embed_images is False. If provided, local images and figures are written to its directory and linked.
+    """
+    def __init__(self, embed_images = True, fetch_workers = DEFAULT_FETCH_WORKERS, timeout = DEFAULT_TIMEOUT, http_cache = None, image_optimizer = None,
+                 asset_writer = None):
+        if http_cache is not None and not isinstance(http_cache, HTTPCache):
+            http_cache = HTTPCache(http_cache)
+        self.embed_images = embed_images
+        self.fetch_workers = fetch_workers
+        self.timeout = timeout
+        self.http_cache = http_cache
+        self.image_optimizer = image_optimizer
+        self.asset_writer = None if embed_images else asset_writer
+        self.images = []
+        #Savings of each image optimized while rendering, as (path, original size, optimized size).
+        self.optimized_images = []
+        #Downloads started by prefetch(), as url: [future, number of pending uses].
+        self._pending = dict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        #Downloads in progress cannot be sent to other processes.
+        state = self.__dict__.copy()
+        state["_pending"] = dict()
+        state["_pool"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Stops any download started by prefetch() that has not finished.
+        """
+        if self._pool is not None:
+            for future, _ in self._pending.values():
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self._pending.clear()
+
+    def empty_copy(self):
+        """
+        Creates an empty registry with the same settings. Used to render in worker threads/processes.
+
+        Notes
+        ----------
+            The copy shares the downloads started by prefetch(), unless it is sent to another process.
+        """
+        copy = AssetRegistry(embed_images=self.embed_images, fetch_workers=self.fetch_workers, timeout=self.timeout, http_cache=self.http_cache,
+                             image_optimizer=self.image_optimizer, asset_writer=self.asset_writer)
+        copy._pending = self._pending
+        copy._lock = self._lock
+        return copy
+
+    def prefetch(self, paths):
+        """
+        Starts downloading remote images concurrently, so they are ready when registered.
+
+        Parameters
+        ----------
+        paths: list
+            The paths (local or remote) of the images. Local paths are ignored.
+        """
+        if not self.embed_images or self.fetch_workers is None or self.fetch_workers < 2:
+            return
+        with self._lock:
+            for path in paths:
+                if not check_is_url(path):
+                    continue
+                if path in self._pending:
+                    self._pending[path][1] += 1
+                    continue
+                if self._pool is None:
+                    get_session(self.fetch_workers)
+                    self._pool = ThreadPoolExecutor(max_workers=self.fetch_workers)
+                self._pending[path] = [self._pool.submit(get_image_data, path, self.timeout, self.http_cache), 1]
+
+    def get_image_data(self, path):
+        """
+        Gets the type and data of an image, using the prefetched download if there is one.
+        """
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is not None:
+                pending[1] -= 1
+                if pending[1] <= 0:
+                    del self._pending[path]
+        if pending is not None:
+            return pending[0].result()
+        return get_image_data(path, self.timeout, self.http_cache)
+
+    def key(self):
+        """
+        Gets a hashable summary of the registry's settings. HTML rendered under registries with equal keys is interchangeable.
+        """
+        optimizer = self.image_optimizer
+        writer = None if self.asset_writer is None else self.asset_writer.key()
+        if optimizer is None:
+            return (self.embed_images, None, writer)
+        return (self.embed_images, (optimizer.format, optimizer.quality, optimizer.max_width, optimizer.densities), writer)
+
+    def merge(self, other):
+        """
+        Adds the images registered in another registry to this one.
+
+        Parameters
+        ----------
+        other: AssetRegistry
+            The registry to merge.
+        """
+        self.replay(other.images)
+        self.optimized_images.extend(other.optimized_images)
+
+    def replay(self, registrations):
+        """
+        Adds previously made registrations (for example, those of a memoized element) to this registry.
+
+        Parameters
+        ----------
+        registrations: list
+            The registrations, as returned by get_registrations_since().
+        """
+        self.images.extend(registrations)
+
+    def register_image(self, path = None, data = None, img_type = None):
+        """
+        Registers an image and returns the src to use for it.
+
+        Parameters
+        ----------
+        path: str, default = None
+            The path (local or remote) to the image file.
+        data: bytes, default = None
+            The image contents, if already available.
+        img_type: str, default = None
+            The MIME type of the image. Only used along with data.
+        Returns
+        -------
+        src: str
+            The value for the src attribute of the image.
+        """
+        return self.register_responsive_image(path, data, img_type)[0]
+
+    def register_responsive_image(self, path = None, data = None, img_type = None):
+        """
+        Registers an image and returns the src and srcset to use for it.
+
+        Parameters
+        ----------
+        path: str, default = None
+            The path (local or remote) to the image file.
+        data: bytes, default = None
+            The image contents, if already available.
+        img_type: str, default = None
+            The MIME type of the image. Only used along with data.
+        Returns
+        -------
+        src: str
+            The value for the src attribute of the image.
+        srcset: str
+            The value for the srcset attribute of the image, or None if it has a single variant.
+        """
+        self.images.append(path)
+        if data is None:
+            #If image is already embedded or embedding is disabled, keep the path. Remote images are linked even with an asset writer.
+            if path.startswith('data:') or (not self.embed_images and (self.asset_writer is None or check_is_url(path))):
+                return path, None
+            if self.asset_writer is not None and self.image_optimizer is None:
+                return self.asset_writer.copy_file(path), None
+            img_type, data = self.get_image_data(path)
+
+        if self.image_optimizer is None:
+            return self._get_src(img_type, data), None
+        variants = self.image_optimizer.optimize(path, img_type, data)
+        self.optimized_images.append((path, len(data), len(variants[0][1])))
+        src = self._get_src(variants[0][0], variants[0][1])
+        if len(variants) < 2:
+            return src, None
+        srcset = ", ".join(f"{self._get_src(t, d)} {density}x" for (t, d, _), density in zip(variants, self.image_optimizer.densities))
+        return src, srcset
+
+    def _get_src(self, img_type, data):
+        """
+        Gets the src of an image held in memory: a data URI, or the URL of its file if there is an asset writer.
+        """
+        if self.asset_writer is not None:
+            return self.asset_writer.write_data(data, img_type)
+        return get_data_uri(img_type, data)
+
+class AssetDeduplicator:
+    """
+    Stores each distinct image embedded in a document once, and makes every <img> tag reference it.
+
+    Notes
+    ----------
+        Embedded images (data URIs in src/srcset attributes) are identified by a hash of their contents.
+        The tags get a data-bakepy-src/data-bakepy-srcset attribute instead, which a script resolves when the document loads,
+        so the document requires JavaScript to show its images.
+    """
+    def __init__(self):
+        #Distinct images, as hash: data URI
+        self.assets = dict()
+
+    def _hash(self, uri):
+        digest = hashlib.sha256(uri.encode("ascii", "ignore")).hexdigest()[:32]
+        self.assets.setdefault(digest, uri)
+        return digest
+
+    def dedupe(self, html):
+        """
+        Moves the embedded images of an HTML string to the deduplicator.
+
+        Parameters
+        ----------
+        html: str
+            The HTML string. May be a partial document.
+        Returns
+        -------
+        html: str
+            The HTML string, with the embedded images replaced by references.
+        """
+        def dedupe_attr(match):
+            name, value = match.group(1).lower(), match.group(3)
+            if name == "src":
+                if not value.startswith("data:"):
+                    return match.group(0)
+                return f'data-bakepy-src="{self._hash(value)}"'
+            if "data:" not in value:
+                return match.group(0)
+            value = DATA_URI_REGEX.sub(lambda m: f"bakepy-asset:{self._hash(m.group(0))}", value)
+            return f'data-bakepy-srcset="{value}"'
+
+        def dedupe_tag(match):
+            return IMG_SRC_ATTR_REGEX.sub(dedupe_attr, match.group(0))
+
+        if "data:" not in html:
+            return html
+        return IMG_TAG_REGEX.sub(dedupe_tag, html)
+
+    def get_html(self):
+        """
+        Gets the block holding every distinct image and the script that resolves their references, to be placed before </body>.
+        """
+        if len(self.assets) == 0:
+            return ""
+        #JSON strings could otherwise close the <script> tag.
+        data = json.dumps(self.assets, separators=(",", ":")).replace("</", "<\\/")
+        return f"""<script type="application/json" id="bakepy-assets">{data}</script>\n{ASSET_LOADER_SCRIPT}"""
+
+    def insert(self, html):
+        """
+        Inserts the block returned by get_html() before the closing </body> tag of an HTML string (or at its end if there is none).
+        """
+        block = self.get_html()
+        i = html.rfind("</body>")
+        if i == -1:
+            return html + block
+        return html[:i] + block + html[i:]
+
+def get_asset_registry():
+    """
+    Gets the asset registry active in the current context, or None if there is none.
+    """
+    return _ACTIVE_REGISTRY.get()
+
+@contextmanager
+def use_asset_registry(registry):
+    """
+    Context manager that sets the active asset registry used by the renderers.
+
+    Parameters
+    ----------
+    registry: AssetRegistry
+        The registry to activate.
+    """
+    token = _ACTIVE_REGISTRY.set(registry)
+    try:
+        yield registry
+    finally:
+        _ACTIVE_REGISTRY.reset(token)
+
+def register_image(path = None, data = None, img_type = None):
+    """
+    Registers an image with the active asset registry and returns the src to use for it.
+
+    Parameters
+    ----------
+    path: str, default = None
+        The path (local or remote) to the image file.
+    data: bytes, default = None
+        The image contents, if already available.
+    img_type: str, default = None
+        The MIME type of the image. Only used along with data.
+    Returns
+    -------
+    src: str
+        The value for the src attribute of the image.
+
+    Notes
+    ----------
+        Outside of a registry (for example when calling to_html() directly), paths are kept as-is and data is embedded as base64.
+    """
+    registry = get_asset_registry()
+    if registry is None:
+        if data is not None:
+            return get_data_uri(img_type, data)
+        return path
+    return registry.register_image(path, data, img_type)
+
+def register_responsive_image(path):
+    """
+    Registers an image with the active asset registry and returns the src and srcset to use for it.
+
+    Parameters
+    ----------
+    path: str
+        The path (local or remote) to the image file.
+    Returns
+    -------
+    src: str
+        The value for the src attribute of the image.
+    srcset: str
+        The value for the srcset attribute of the image, or None if it has a single variant.
+    """
+    registry = get_asset_registry()
+    if registry is None:
+        return path, None
+    return registry.register_responsive_image(path)
+
+def get_registry_key():
+    """
+    Gets the key of the active asset registry, or None if there is none.
+    """
+    registry = get_asset_registry()
+    if registry is None:
+        return None
+    return registry.key()
+
+def get_registration_mark():
+    """
+    Gets a marker for the current state of the active asset registry, to be used with get_registrations_since().
+    """
+    registry = get_asset_registry()
+    if registry is None:
+        return 0
+    return len(registry.images)
+
+def get_registrations_since(mark):
+    """
+    Gets the registrations made in the active asset registry since a marker was obtained.
+
+    Parameters
+    ----------
+    mark: int
+        A marker returned by get_registration_mark().
+    """
+    registry = get_asset_registry()
+    if registry is None:
+        return []
+    return registry.images[mark:]
+
+def replay_registrations(registrations):
+    """
+    Adds previously made registrations to the active asset registry.
+
+    Parameters
+    ----------
+    registrations: list
+        The registrations, as returned by get_registrations_since().
+    """
+    registry = get_asset_registry()
+    if registry is not None:
+        registry.replay(registrations)
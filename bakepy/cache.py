@@ -0,0 +1,345 @@
+import os
+import hashlib
+import tempfile
+import warnings
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from .__about__ import __version__
+from .assets import get_registry_key
+
+CACHE_KEY_FUNCTIONS_DICT = dict()
+
+_ACTIVE_CACHE = ContextVar("bakepy_render_cache", default=None)
+
+DEFAULT_CACHE_SIZE = 512 * 2**20
+
+#Decorator to register a content hashing function
+def register_cache_key(cls):
+    """
+    Decorator to register a function that hashes the content of an object for the render cache.
+
+    Parameters
+    ----------
+    cls: type/class
+        The type/class to assign for the hashing function.
+    Example
+    -------
+    @register_cache_key(cls=bytes)
+    def _get_bytes_key(element):
+        return hashlib.sha256(element).hexdigest()
+
+    Notes
+    ----------
+        The hashing function should return None if the object cannot be hashed, in which case it is rendered without caching.
+    """
+    def registration(f):
+        CACHE_KEY_FUNCTIONS_DICT[cls] = f
+        return f
+    return registration
+
+def get_cache_key(element, render_function, options):
+    """
+    Gets the key of a rendered object in the render cache.
+
+    Parameters
+    ----------
+    element: Object
+        The object to render.
+    render_function: function
+        The function used to render the object.
+    options: dict
+        The keyword arguments used by the rendering function.
+    Returns
+    -------
+    key: str
+        A hex digest, or None if the object type has no hashing function.
+    """
+    for i in type(element).__mro__:
+        if i in CACHE_KEY_FUNCTIONS_DICT:
+            content_key = CACHE_KEY_FUNCTIONS_DICT[i](element)
+            break
+    else:
+        return None
+
+    if content_key is None:
+        return None
+
+    key = hashlib.sha256()
+    #The active asset registry decides how images are referenced (embedded, optimized or written to files).
+    for part in [__version__, render_function.__module__, render_function.__qualname__, content_key, repr(sorted(options.items())), get_registry_key()]:
+        key.update(str(part).encode("utf-8"))
+        key.update(b"\0")
+    return key.hexdigest()
+
+class RenderCache:
+    """
+    A directory-based cache of rendered HTML fragments, shared across processes and runs.
+
+    Parameters
+    ----------
+    directory: str
+        The directory holding the cache entries. Created if it does not exist.
+    max_size: int, default = 512 MiB
+        The maximum size of the cache in bytes. The least recently used entries are evicted when it is exceeded.
+    """
+    def __init__(self, directory, max_size = DEFAULT_CACHE_SIZE):
+        self.directory = Path(directory).absolute()
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(p.stat().st_size for p in self._entries())
+
+    def _entries(self):
+        return self.directory.glob("*.html")
+
+    def _path(self, key):
+        return self.directory / f"{key}.html"
+
+    def get(self, key):
+        """
+        Gets a cached fragment.
+
+        Parameters
+        ----------
+        key: str
+            The key of the entry.
+        Returns
+        -------
+        html: str
+            The cached HTML string, or None if the entry does not exist.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            return None
+        #Mark the entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return html
+
+    def set(self, key, html):
+        """
+        Stores a fragment in the cache.
+
+        Parameters
+        ----------
+        key: str
+            The key of the entry.
+        html: str
+            The HTML string.
+        """
+        data = html.encode("utf-8")
+        if len(data) > self.max_size:
+            return
+        try:
+            #Write to a temporary file first so other processes never read partial entries.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            warnings.warn(f"Could not write to the render cache at {self.directory}.")
+            return
+        self._size += len(data)
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits within its maximum size.
+        """
+        entries = []
+        for p in self._entries():
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if self._size <= self.max_size:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        """
+        Removes every entry of the cache.
+        """
+        for p in self._entries():
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        self._size = 0
+
+def get_render_cache():
+    """
+    Gets the render cache active in the current context, or None if there is none.
+    """
+    return _ACTIVE_CACHE.get()
+
+@contextmanager
+def use_render_cache(cache):
+    """
+    Context manager that sets the active render cache.
+
+    Parameters
+    ----------
+    cache: RenderCache/str
+        The cache to activate, or the directory of one. If None, caching is disabled.
+    """
+    if cache is not None and not isinstance(cache, RenderCache):
+        cache = RenderCache(cache)
+    token = _ACTIVE_CACHE.set(cache)
+    try:
+        yield cache
+    finally:
+        _ACTIVE_CACHE.reset(token)
+
+#Conditional registration of function; only if matplotlib and pandas installed
+
+try:
+    from pandas import DataFrame
+    from pandas.util import hash_pandas_object
+
+    @register_cache_key(cls=DataFrame)
+    def _get_pandas_key(df):
+        """
+        Hashes the values, index and column labels of a dataframe.
+        """
+        try:
+            key = hashlib.sha256(hash_pandas_object(df, index=True).values.tobytes())
+        except TypeError:
+            #Unhashable cell contents (for example, lists).
+            return None
+        key.update(repr((list(df.columns), list(df.dtypes), df.index.names, df.shape)).encode("utf-8"))
+        return key.hexdigest()
+
+except:
+    pass
+
+try:
+    import numpy as np
+
+    from matplotlib.artist import Artist
+    from matplotlib.axes import Axes
+    from matplotlib.axis import Axis, Tick
+    from matplotlib.colors import Colormap
+    from matplotlib.figure import Figure
+    from matplotlib.legend import Legend
+    from matplotlib.path import Path as MatplotlibPath
+    from matplotlib.spines import Spine
+    from matplotlib.text import Text
+
+    #Getters whose values make up the key of a figure. They only read the state of the artists, without drawing them.
+    MATPLOTLIB_KEY_GETTERS = (
+        "get_xydata", "get_offsets", "get_array", "get_paths", "get_path", "get_xy", "get_width", "get_height", "get_extent",
+        "get_text", "get_position", "get_fontsize", "get_fontfamily", "get_fontweight", "get_fontstyle", "get_rotation",
+        "get_horizontalalignment", "get_verticalalignment",
+        "get_color", "get_facecolor", "get_edgecolor", "get_alpha", "get_cmap", "get_clim", "get_hatch", "get_fill",
+        "get_linewidth", "get_linestyle", "get_marker", "get_markersize", "get_drawstyle",
+        "get_xlim", "get_ylim", "get_xscale", "get_yscale", "get_aspect", "get_label", "get_zorder", "get_visible", "get_gid", "get_url",
+    )
+
+    def _update_matplotlib_key(key, value):
+        if isinstance(value, np.ndarray):
+            value = np.ma.asarray(value)
+            key.update(repr((value.dtype.str, value.shape)).encode("utf-8"))
+            key.update(np.ascontiguousarray(value.data).tobytes())
+            if value.mask is not np.ma.nomask:
+                key.update(np.ascontiguousarray(value.mask).tobytes())
+        elif isinstance(value, MatplotlibPath):
+            _update_matplotlib_key(key, value.vertices)
+            _update_matplotlib_key(key, value.codes)
+        elif isinstance(value, Colormap):
+            key.update(value.name.encode("utf-8"))
+        elif isinstance(value, Artist):
+            #Artists returned by getters (such as an axis' label) are hashed as children.
+            key.update(type(value).__name__.encode("utf-8"))
+        elif isinstance(value, (list, tuple)) and any(isinstance(x, (np.ndarray, MatplotlibPath)) for x in value):
+            for x in value:
+                _update_matplotlib_key(key, x)
+        else:
+            key.update(repr(value).encode("utf-8"))
+        key.update(b"\0")
+
+    #Getters of the geometry of artists that are placed when the figure is drawn.
+    MATPLOTLIB_LAYOUT_GETTERS = ("get_position", "get_path", "get_xy", "get_width", "get_height")
+
+    def _get_laid_out_children(artist, laid_out):
+        """
+        Gets the children of an artist to hash, and whether they are placed when the figure is drawn.
+        """
+        children = artist.get_children()
+        if isinstance(artist, Axis):
+            #Ticks are only created when the figure is drawn. They follow from the limits, locators and formatters.
+            return [(x, True) for x in children if not isinstance(x, Tick)]
+        if isinstance(artist, Axes):
+            #Titles are moved above the ticks, while texts added by the user keep their position.
+            return [(x, laid_out or (isinstance(x, Text) and x not in artist.texts) or isinstance(x, Spine)) for x in children]
+        return [(x, laid_out or isinstance(artist, Legend)) for x in children]
+
+    @register_cache_key(cls=Artist)
+    def _get_matplotlib_key(fig):
+        """
+        Hashes the data and properties of every artist of a figure.
+
+        Notes
+        ----------
+            The figure is not drawn, so the key is much cheaper to compute than the render it stands for. The geometry that drawing
+            computes (ticks, and the placement of titles, axis labels, spines and legends) is left out, since it follows from the rest.
+            Drawing a figure may still set some of its state, so a figure drawn before being added can miss the cache once.
+            Figures holding artists defined outside of matplotlib are not cached, since their state may not be covered by the key.
+            To cache them (or to key figures by something cheaper still), register a key function for Figure, or add the figure
+            as a Deferred element with a key so it is not even built on a hit.
+        """
+        if not isinstance(fig, Figure):
+            fig = getattr(fig, "figure", None)
+            if fig is None:
+                return None
+        key = hashlib.sha256()
+        _update_matplotlib_key(key, (tuple(fig.get_size_inches()), fig.dpi, type(getattr(fig, "get_layout_engine", lambda: None)()).__name__))
+        #Artists to hash, and whether they are placed when the figure is drawn.
+        artists = [(fig, False)]
+        while artists:
+            artist, laid_out = artists.pop()
+            if not type(artist).__module__.startswith(("matplotlib.", "mpl_toolkits.")):
+                return None
+            key.update(f"{type(artist).__module__}.{type(artist).__qualname__}".encode("utf-8"))
+            artists.extend(_get_laid_out_children(artist, laid_out))
+            if isinstance(artist, Axis):
+                _update_matplotlib_key(key, [type(x).__name__ for x in (artist.get_major_locator(), artist.get_minor_locator(),
+                                                                      artist.get_major_formatter(), artist.get_minor_formatter())])
+                continue
+            if isinstance(artist, Legend):
+                #The location is not exposed through a getter.
+                _update_matplotlib_key(key, (getattr(artist, "_loc", None), getattr(artist, "_ncols", None)))
+            for name in MATPLOTLIB_KEY_GETTERS:
+                if laid_out and name in MATPLOTLIB_LAYOUT_GETTERS:
+                    continue
+                getter = getattr(artist, name, None)
+                if getter is None:
+                    continue
+                try:
+                    #Axes may be moved when drawn (for example, by a layout engine or to keep an aspect ratio).
+                    value = getter(original=True) if name == "get_position" and isinstance(artist, Axes) else getter()
+                except Exception:
+                    continue
+                key.update(name.encode("utf-8"))
+                _update_matplotlib_key(key, value)
+        return key.hexdigest()
+
+except:
+    pass
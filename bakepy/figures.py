@@ -0,0 +1,245 @@
+import io
+import os
+import re
+import mimetypes
+import threading
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_ACTIVE_SERIALIZER = ContextVar("bakepy_figure_serializer", default=None)
+
+#rcParams are global, so figures saved with modified rcParams are serialized one at a time.
+_RC_LOCK = threading.Lock()
+
+SVG_TAG_REGEX = re.compile(rb"<svg\b[^>]*>")
+SVG_SIZE_REGEX = re.compile(rb"""\s(width|height)\s*=\s*(["']).*?\2""")
+
+#Parse options used by the matplotlib renderer that are not passed to fig.savefig()
+RENDER_ONLY_OPTIONS = ("caption", "save_format", "embed")
+
+def _set_svg_size(svg, width = b"100%", height = b"100%"):
+    """
+    Sets the width and height attributes of the root tag of an SVG document without parsing it.
+    """
+    match = SVG_TAG_REGEX.search(svg)
+    if match is None:
+        return svg
+    tag = SVG_SIZE_REGEX.sub(b"", match.group(0))
+    tag = tag[:4] + b' width="' + width + b'" height="' + height + b'"' + tag[4:]
+    return svg[:match.start()] + tag + svg[match.end():]
+
+def serialize_figure(fig, save_format = "svg", **options):
+    """
+    Serializes a matplotlib figure in memory.
+
+    Parameters
+    ----------
+    fig: Figure
+        The figure to serialize.
+    save_format: str, default="svg"
+        The save format for the output image.
+    options: dict
+        An optional dictionary containing other keyword arguments used by fig.savefig()
+    Returns
+    -------
+    img_type: str
+        The MIME type of the image.
+    img_data: bytes
+        The image contents. SVG images are set to take the full width/height of their container.
+    """
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    if save_format == "svg":
+        with _RC_LOCK, plt.rc_context({'svg.fonttype': 'none'}):
+            fig.savefig(buffer, format=save_format, bbox_inches='tight', **options)
+    else:
+        fig.savefig(buffer, format=save_format, bbox_inches='tight', **options)
+    img_data = buffer.getvalue()
+
+    if save_format == "svg":
+        #Change the format of svg file to have max width/height
+        img_data = _set_svg_size(img_data)
+
+    return mimetypes.guess_type(f"figure.{save_format}")[0], img_data
+
+def _get_figure(element):
+    """
+    Gets the Figure of a matplotlib object, or None if it is not one.
+    """
+    try:
+        from matplotlib.artist import Artist
+        from matplotlib.figure import Figure
+    except ImportError:
+        return None
+    if isinstance(element, Figure):
+        return element
+    if isinstance(element, Artist):
+        return getattr(element, "figure", None)
+    return None
+
+def close_figure(element):
+    """
+    Closes the Figure of a matplotlib object in pyplot, so it is freed once no longer referenced. Other objects are ignored.
+
+    Parameters
+    ----------
+    element: Object
+        The object to close.
+    """
+    fig = _get_figure(element)
+    if fig is None:
+        return
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return
+    plt.close(fig)
+
+def _get_key(fig, save_format, options):
+    return (id(fig), save_format, repr(sorted(options.items())))
+
+class FigureSerializer:
+    """
+    Serializes matplotlib figures in a pool of worker processes ahead of their rendering.
+
+    Parameters
+    ----------
+    workers: int, default = None
+        The number of worker processes. If None, uses the number of CPUs.
+    window: int, default = None
+        The maximum number of figures being serialized ahead of the one being rendered. If None, uses twice the number of workers.
+
+    Notes
+    ----------
+        Figures are pickled to be sent to the workers, which only pays off on several CPUs and for figures that take much longer to draw than to pickle.
+        Figures that were not submitted (or that are rendered out of order) are serialized in the rendering process as usual.
+    """
+    def __init__(self, workers = None, window = None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.window = window if window is not None else 2 * workers
+        self._queue = deque()
+        self._futures = dict()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Discards pending figures and stops the worker processes.
+        """
+        with self._lock:
+            self._queue.clear()
+            for future, _ in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self.pool.shutdown(wait=True)
+
+    def add(self, elements):
+        """
+        Queues the matplotlib objects among some elements for serialization, in rendering order.
+
+        Parameters
+        ----------
+        elements: iterable
+            (object, parse options) tuples, as generated by HTMLElement.iter_elements(). Objects other than matplotlib figures are ignored.
+        """
+        for element, options in elements:
+            fig = _get_figure(element)
+            if fig is None:
+                continue
+            save_format = options.get("save_format", "svg")
+            savefig_options = {k: v for k, v in options.items() if k not in RENDER_ONLY_OPTIONS}
+            self._queue.append((_get_key(fig, save_format, savefig_options), fig, save_format, savefig_options))
+        with self._lock:
+            self._submit()
+
+    def _submit(self):
+        """
+        Submits queued figures until the window is full. Must be called holding the lock.
+        """
+        while len(self._queue) > 0 and len(self._futures) < self.window:
+            key, fig, save_format, savefig_options = self._queue.popleft()
+            if key in self._futures:
+                #The same figure is rendered several times; keep one job and count its uses.
+                self._futures[key][1] += 1
+                continue
+            future = self.pool.submit(serialize_figure, fig, save_format, **savefig_options)
+            self._futures[key] = [future, 1]
+
+    def _discard(self, n):
+        """
+        Cancels the n oldest submitted figures. Must be called holding the lock.
+        """
+        for key in list(self._futures)[:n]:
+            self._futures.pop(key)[0].cancel()
+
+    def get(self, fig, save_format, options):
+        """
+        Gets the serialized image of a figure, if it was submitted.
+
+        Parameters
+        ----------
+        fig: Figure
+            The figure.
+        save_format: str
+            The save format for the output image.
+        options: dict
+            The keyword arguments used by fig.savefig()
+        Returns
+        -------
+        image: tuple
+            The MIME type and contents of the image, or None if the figure was not submitted.
+        """
+        key = _get_key(fig, save_format, options)
+        with self._lock:
+            if key not in self._futures:
+                position = next((i for i, job in enumerate(self._queue) if job[0] == key), None)
+                if position is None:
+                    return None
+                #Every figure before this one was skipped while rendering (for example, because it was cached).
+                self._discard(len(self._futures))
+                for _ in range(position):
+                    self._queue.popleft()
+                self._submit()
+            else:
+                #Drop the figures submitted before this one, which were skipped while rendering.
+                self._discard(list(self._futures).index(key))
+
+            entry = self._futures[key]
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._futures[key]
+                self._submit()
+        return entry[0].result()
+
+def get_figure_serializer():
+    """
+    Gets the figure serializer active in the current context, or None if there is none.
+    """
+    return _ACTIVE_SERIALIZER.get()
+
+@contextmanager
+def use_figure_serializer(serializer):
+    """
+    Context manager that sets the active figure serializer used by the matplotlib renderer.
+
+    Parameters
+    ----------
+    serializer: FigureSerializer
+        The serializer to activate.
+    """
+    token = _ACTIVE_SERIALIZER.set(serializer)
+    try:
+        yield serializer
+    finally:
+        _ACTIVE_SERIALIZER.reset(token)
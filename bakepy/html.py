@@ -1,10 +1,124 @@
+import threading
+
 from abc import ABC
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from typing import Any
 from .utils import as_list
+from .assets import get_registry_key, get_registration_mark, get_registrations_since, replay_registrations
+
+_MEMOIZE = ContextVar("bakepy_memoize_html", default=False)
+
+@contextmanager
+def memoize_html(active = True):
+    """
+    Context manager that enables storing the rendered HTML of containers, rows and columns.
+
+    Parameters
+    ----------
+    active: bool, default = True
+        If True, rendered elements keep their HTML until they are modified.
+    """
+    token = _MEMOIZE.set(active)
+    try:
+        yield
+    finally:
+        _MEMOIZE.reset(token)
+
+class _SharedOptions(dict):
+    """
+    Empty parse options shared by every element added without any. It cannot be modified.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise Exception("These parse options are shared by several elements and cannot be modified. Assign a new dictionary instead.")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        #Copies and unpickled objects keep using the shared instance.
+        return "EMPTY_OPTIONS"
+
+EMPTY_OPTIONS = _SharedOptions()
+
+#Tuples of classes/styles, shared by every element using the same ones.
+_INTERNED = dict()
+#Once this many tuples are shared, other values are stored as they are, so unique classes/styles do not stay in memory forever.
+MAX_INTERNED = 1024
+
+def _intern(values):
+    """
+    Gets the shared tuple holding some values.
+    """
+    if type(values) is not tuple:
+        values = tuple(as_list(values))
+    try:
+        interned = _INTERNED.get(values)
+        if interned is None and len(_INTERNED) < MAX_INTERNED:
+            interned = _INTERNED[values] = values
+    except TypeError:
+        return values
+    return values if interned is None else interned
+
+#Attributes of an HTMLElement that are not pickled: its parent, memoized HTML and index of child positions.
+UNPICKLED_ATTRIBUTES = ("_parent", "_html", "_positions")
 
 class HTMLElement(ABC):
-    
+    __slots__ = ()
+
+    #Parent element, set when the element is added to another HTMLElement.
+    _parent = None
+    #Memoized render, as a (registry key, html, asset registrations) tuple.
+    _html = None
+    #If False, the element is never memoized (for example, the Body, which would hold a copy of the whole document).
+    _memoizable = True
+    #Position of each child element, as id: index. Entries may be stale; they are checked against the elements when used.
+    _positions = None
+
+    def _get_slots(self):
+        for cls in type(self).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            yield from ([slots] if isinstance(slots, str) else slots)
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in self._get_slots() if hasattr(self, name)}
+        #Subclasses without slots keep their other attributes in a dictionary.
+        state.update(getattr(self, "__dict__", {}))
+        #The links to the rest of the report are not pickled, so a single element (for example, a column sent to a worker process) does not take the whole report along.
+        for name in UNPICKLED_ATTRIBUTES:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        for name in UNPICKLED_ATTRIBUTES:
+            object.__setattr__(self, name, None)
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        #Children are restored before their parent, so their links to it are set here. Children shared with the original (shallow copies) keep their parent.
+        for x in getattr(self, "elements", ()):
+            if isinstance(x, HTMLElement) and x._parent is None:
+                object.__setattr__(x, "_parent", self)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        #Detached elements without memoized HTML (for example, while being created) have nothing to discard.
+        if not name.startswith("_") and (self._parent is not None or self._html is not None):
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        """
+        Discards the memoized HTML of the element and all of its parents.
+
+        Notes
+        ----------
+            Called automatically when elements, classes, styles or other attributes are set.
+            Call it manually after modifying an element's contents in place (for example, editing a DataFrame already in the report).
+        """
+        node = self
+        while node is not None:
+            object.__setattr__(node, "_html", None)
+            node = node._parent
+
     def add_element(self, element, pos = None, replace = False, **other_args):
         if pos is None:
             pos = len(self.elements)
@@ -13,18 +127,59 @@ class HTMLElement(ABC):
                 raise Exception(f"Cannot replace element at position {pos}.")
             self.pop_element(pos)
             self.elements.insert(pos, element)
-            self.parse_options.insert(pos, other_args)
+            self.parse_options.insert(pos, other_args or EMPTY_OPTIONS)
         else:
             self.elements.insert(pos, element)
-            self.parse_options.insert(pos, other_args)
+            self.parse_options.insert(pos, other_args or EMPTY_OPTIONS)
+        if isinstance(element, HTMLElement):
+            element._parent = self
+            if self._positions is not None:
+                self._positions[id(element)] = pos
+        self.mark_dirty()
+
+    def find_element(self, element):
+        """
+        Gets the position of a child element, compared by identity.
+
+        Parameters
+        ----------
+        element: HTMLElement
+            The child element.
+        Returns
+        ----------
+        pos: int
+            The position of the element, or None if it is not a child of this element.
+
+        Notes
+        ----------
+            Positions are indexed, so looking up recently added elements takes constant time.
+            The index is rebuilt only when it is found to be stale, for example after inserting or removing elements before the one looked up.
+        """
+        if not isinstance(element, HTMLElement) or (element._parent is not None and element._parent is not self):
+            return None
+        elements = self.elements
+        if self._positions is not None:
+            pos = self._positions.get(id(element))
+            if pos is not None and pos < len(elements) and elements[pos] is element:
+                return pos
+        positions = {id(x): i for i, x in enumerate(elements)}
+        object.__setattr__(self, "_positions", positions)
+        pos = positions.get(id(element))
+        if pos is None or elements[pos] is not element:
+            return None
+        return pos
 
     def pop_element(self, pos = None):
         if pos is None or pos >= len(self.elements):
             pos = len(self.elements)-1
         try:
-            return self.elements.pop(pos), self.parse_options.pop(pos)
+            element, options = self.elements.pop(pos), self.parse_options.pop(pos)
         except:
             return None, None
+        if isinstance(element, HTMLElement) and element._parent is self:
+            element._parent = None
+        self.mark_dirty()
+        return element, options
     
     def get_head(self):
         cls_str = self.str_cls()
@@ -37,9 +192,115 @@ class HTMLElement(ABC):
     
     def get_tail(self):
         return """</div>"""
-    
-    def to_html(self): 
-        return self.get_head() +'\n'.join([self._get_html_element(x, **o) for (x, o) in zip(self.elements, self.parse_options)])+ self.get_tail()
+
+    def get_memo(self):
+        """
+        Gets the memoized HTML of the element if it is valid for the active asset registry, otherwise None.
+        """
+        memo = self._html
+        if memo is None or memo[0] != get_registry_key():
+            return None
+        return memo
+
+    def set_memo(self, html, registrations = ()):
+        """
+        Stores the rendered HTML of the element, if memoization is enabled.
+
+        Parameters
+        ----------
+        html: str
+            The rendered HTML.
+        registrations: list, default = ()
+            The asset registrations made while rendering the element, replayed when the memo is used.
+        """
+        if self._memoizable and _MEMOIZE.get():
+            object.__setattr__(self, "_html", (get_registry_key(), html, list(registrations)))
+
+    def iter_html(self, render_element = None):
+        """
+        Generates the HTML of the element as a sequence of string fragments.
+
+        Parameters
+        ----------
+        render_element: function, default = None
+            A function that takes a child element and its parse options and returns an iterable of HTML strings.
+            If None, children are rendered through the registered renderers.
+
+        Notes
+        ----------
+            Child elements are streamed recursively, so only the fragment of a single non-container element is held in memory at a time.
+            If the element was memoized and has not been modified since, its stored HTML is used instead.
+        """
+        memo = self.get_memo()
+        if memo is not None:
+            replay_registrations(memo[2])
+            yield memo[1]
+            return
+
+        if not (self._memoizable and _MEMOIZE.get()):
+            yield from self._iter_html(render_element)
+            return
+
+        mark = get_registration_mark()
+        fragments = []
+        for fragment in self._iter_html(render_element):
+            fragments.append(fragment)
+            yield fragment
+        self.set_memo("".join(fragments), get_registrations_since(mark))
+
+    def _iter_html(self, render_element = None):
+        """
+        Renders the element without memoization. See iter_html().
+        """
+        if render_element is None:
+            render_element = self._iter_html_element
+        batch_rendered = rendering.render_batch(self.elements, self.parse_options)
+        yield self.get_head()
+        for i, (x, o) in enumerate(zip(self.elements, self.parse_options)):
+            if i > 0:
+                yield '\n'
+            if i in batch_rendered:
+                yield batch_rendered.pop(i)
+            else:
+                yield from render_element(x, **o)
+        yield self.get_tail()
+
+    def iter_elements(self, skip_memoized = False):
+        """
+        Generates every non-HTMLElement object contained in the element (recursively) in document order.
+
+        Parameters
+        ----------
+        skip_memoized: bool, default = False
+            If True, the contents of elements whose memoized HTML is valid are skipped, since they will not be rendered.
+
+        Returns
+        ----------
+        elements: generator
+            A generator of (object, parse options) tuples.
+        """
+        if skip_memoized and self.get_memo() is not None:
+            return
+        for x, o in zip(self.elements, self.parse_options):
+            if isinstance(x, HTMLElement):
+                yield from x.iter_elements(skip_memoized)
+            else:
+                yield x, o
+
+    def write_html(self, writer):
+        """
+        Writes the HTML of the element into a file-like object.
+
+        Parameters
+        ----------
+        writer: file-like
+            Any object with a write(str) method.
+        """
+        for fragment in self.iter_html():
+            writer.write(fragment)
+
+    def to_html(self):
+        return "".join(self.iter_html())
     
     def str_main_cls(self):
         return self.main_class
@@ -49,17 +310,17 @@ class HTMLElement(ABC):
         if overwrite:
             self.classes = to_add
         else:
-            self.classes = self.classes + to_add
+            self.classes = list(self.classes) + to_add
         
     def add_sty(self, to_add, overwrite = False):
         to_add = as_list(to_add)
         if overwrite:
             self.styles = to_add
         else:
-            self.styles = self.styles + to_add
+            self.styles = list(self.styles) + to_add
 
     def get_cls(self):
-        return [self.str_main_cls()] + self.classes
+        return [self.str_main_cls()] + list(self.classes)
     
     def str_cls(self):
         return " ".join(self.get_cls())
@@ -71,19 +332,121 @@ class HTMLElement(ABC):
         """
         Mapping for different types of objects from the parsing submodule.
         """
-        from .rendering import get_html
-        return get_html(element, **options)
+        return rendering.get_html(element, **options)
 
-@dataclass
-class Body(HTMLElement):
+    def _iter_html_element(self, element, **options):
+        """
+        Streaming version of _get_html_element.
+        """
+        return rendering.iter_html(element, **options)
+
+class _SlottedElement(HTMLElement):
+    """
+    Base of the elements of a report's tree. Attributes are stored in slots instead of a dictionary, to reduce their memory usage.
+
+    Notes
+    ----------
+        Elements are created, compared and printed like dataclasses, from the (name, default) pairs in _fields.
+        A default of list creates a new list for each element. dataclasses.fields(), replace() and asdict() work on them as well.
+    """
+    __slots__ = ("_parent", "_html", "_positions")
+    _fields = ()
+
+    def __init__(self, *args, **kwargs):
+        names = [name for name, _ in self._fields]
+        if len(args) > len(names):
+            raise TypeError(f"{type(self).__name__}() takes at most {len(names)} positional arguments but {len(args)} were given")
+        values = dict(zip(names, args))
+        for name in kwargs:
+            if name not in names:
+                raise TypeError(f"{type(self).__name__}() got an unexpected keyword argument '{name}'")
+            if name in values:
+                raise TypeError(f"{type(self).__name__}() got multiple values for argument '{name}'")
+        values.update(kwargs)
+
+        #The element is detached, so nothing needs to be marked as modified.
+        object.__setattr__(self, "_parent", None)
+        object.__setattr__(self, "_html", None)
+        object.__setattr__(self, "_positions", None)
+        for name, default in self._fields:
+            object.__setattr__(self, name, values[name] if name in values else (list() if default is list else default))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name, _ in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name, _ in self._fields)
+
+    __hash__ = None
+
+def _add_dataclass_fields(cls):
+    """
+    Describes the _fields of an element as dataclass fields, so dataclasses.fields(), replace() and asdict() keep working on it.
+    """
+    namespace = {"__annotations__": {name: Any for name, _ in cls._fields}}
+    for name, default in cls._fields:
+        namespace[name] = field(default_factory=list) if default is list else default
+    spec = dataclass(init=False, repr=False, eq=False)(type(cls.__name__, (), namespace))
+    cls.__dataclass_fields__ = spec.__dataclass_fields__
+    cls.__dataclass_params__ = spec.__dataclass_params__
+    return cls
+
+class _GridElement(_SlottedElement):
+    """
+    Base of containers, rows and columns.
+
+    Notes
+    ----------
+        Classes and styles are stored as tuples shared by every element using the same ones. Assigning a list converts it.
+    """
+    __slots__ = ("name", "elements", "parse_options", "_classes", "_styles", "main_class")
+
+    def __init__(self, name = "", elements = None, parse_options = None, classes = (), styles = (), main_class = None):
+        #Written out (instead of the generic constructor) since reports create many of these.
+        set_attr = object.__setattr__
+        set_attr(self, "_parent", None)
+        set_attr(self, "_html", None)
+        set_attr(self, "_positions", None)
+        set_attr(self, "name", name)
+        set_attr(self, "elements", [] if elements is None else elements)
+        set_attr(self, "parse_options", [] if parse_options is None else parse_options)
+        set_attr(self, "_classes", _intern(classes))
+        set_attr(self, "_styles", _intern(styles))
+        set_attr(self, "main_class", self._fields[-1][1] if main_class is None else main_class)
+
+    @property
+    def classes(self):
+        return self._classes
+
+    @classes.setter
+    def classes(self, classes):
+        object.__setattr__(self, "_classes", _intern(classes))
+
+    @property
+    def styles(self):
+        return self._styles
+
+    @styles.setter
+    def styles(self, styles):
+        object.__setattr__(self, "_styles", _intern(styles))
+
+@_add_dataclass_fields
+class Body(_SlottedElement):
     """
     An HTML5 body with Bootstrap 5 support.
     """
-    name : str = ""
-    elements: Any = field(default_factory=list)
-    parse_options: Any = field(default_factory=list)
-    main_stylesheet: str = """<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.2.1/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-iYQeCzEYFbKjA/T2uDLTpkwGzCiq6soy8tYaI1GyVh/UjpbCx/TYkiZhlZB6+fzT" crossorigin="anonymous">"""
-    stylesheets: Any = field(default_factory=list)
+    __slots__ = ("name", "elements", "parse_options", "main_stylesheet", "stylesheets")
+    _fields = (
+        ("name", ""),
+        ("elements", list),
+        ("parse_options", list),
+        ("main_stylesheet", """<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.2.1/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-iYQeCzEYFbKjA/T2uDLTpkwGzCiq6soy8tYaI1GyVh/UjpbCx/TYkiZhlZB6+fzT" crossorigin="anonymous">"""),
+        ("stylesheets", list),
+    )
+    _memoizable = False
         
     def get_head(self):
         return f"""<!doctype html>
@@ -100,44 +463,161 @@ class Body(HTMLElement):
     def get_tail(self):
         return "</body></html>"
             
-@dataclass
-class Container(HTMLElement):
+@_add_dataclass_fields
+class Container(_GridElement):
     """
     A container has a collection of elements (rows/columns/containers).
     """
-    name : str = ""
-    elements: Any = field(default_factory=list)
-    parse_options: Any = field(default_factory=list)
-    classes: Any = field(default_factory=list)
-    styles: Any = field(default_factory=list)
-    main_class: str = "container"
+    __slots__ = ()
+    _fields = (("name", ""), ("elements", list), ("parse_options", list), ("classes", ()), ("styles", ()), ("main_class", "container"))
 
-@dataclass
-class Row(HTMLElement):
+@_add_dataclass_fields
+class Row(_GridElement):
     """
     A Bootstrap 5 row element.
     """
-    name : str = ""
-    elements: Any = field(default_factory=list)
-    parse_options: Any = field(default_factory=list)
-    classes: Any = field(default_factory=list)
-    styles: Any = field(default_factory=list)
-    main_class: str = "row"
+    __slots__ = ()
+    _fields = (("name", ""), ("elements", list), ("parse_options", list), ("classes", ()), ("styles", ()), ("main_class", "row"))
 
-@dataclass
-class Column(HTMLElement):
+@_add_dataclass_fields
+class Column(_GridElement):
     """
     A Bootstrap 5 column element.
     """
-    name : str = ""
-    elements: Any = field(default_factory=list)
-    parse_options: Any = field(default_factory=list)
-    classes: Any = field(default_factory=list)
-    styles: Any = field(default_factory=list)
-    size: Any = None
-    main_class: str = "col"
+    __slots__ = ("size",)
+    _fields = (("name", ""), ("elements", list), ("parse_options", list), ("classes", ()), ("styles", ()), ("size", None), ("main_class", "col"))
+
+    def __init__(self, name = "", elements = None, parse_options = None, classes = (), styles = (), size = None, main_class = "col"):
+        super().__init__(name, elements, parse_options, classes, styles, main_class)
+        object.__setattr__(self, "size", size)
         
     def str_main_cls(self):
         if self.size is not None:
             return f"col-{self.size}"
-        return "col"
\ No newline at end of file
+        return "col"
+
+def _get_figure_html(src, caption = None, srcset = None):
+    """
+    Gets the HTML of an image with an optional caption.
+    """
+    str_caption = ""
+    if caption is not None:
+        str_caption = f"""<figcaption class="figure-caption text-center">{caption}</figcaption>"""
+
+    str_srcset = ""
+    if srcset is not None:
+        str_srcset = f' srcset="{srcset}"'
+
+    return f"""<figure class="figure" style="width:100%;">
+                <img src="{src}"{str_srcset} class="figure-img img-fluid">
+                {str_caption}
+            </figure>"""
+
+class Image(str):
+    """
+    An image referenced by a path (local or remote).
+
+    Parameters
+    ----------
+    url: str
+        The path (local or remote) to the image file.
+    caption: str, default = None
+        The caption for the image.
+
+    Notes
+    ----------
+        As a string, an Image is the HTML referencing the image by its path, so it can be used wherever the HTML of the img recipe was.
+        When added to a report, the image is instead registered with the active asset registry when rendered, so it can be embedded without parsing the HTML.
+    """
+    def __new__(cls, url, caption = None):
+        self = super().__new__(cls, _get_figure_html(url, caption))
+        self.url = url
+        self.caption = caption
+        return self
+
+    def __getnewargs__(self):
+        return (self.url, self.caption)
+
+    def get_html(self, src = None, srcset = None):
+        """
+        Gets the HTML of the image.
+
+        Parameters
+        ----------
+        src: str, default = None
+            The source of the image. If None, uses its path.
+        srcset: str, default = None
+            The srcset attribute of the image, if any.
+        """
+        return _get_figure_html(self.url if src is None else src, self.caption, srcset)
+
+@dataclass
+class MarkdownText:
+    """
+    A markdown string rendered when the report is.
+
+    Notes
+    ----------
+        Deferring the conversion lets the LaTeX formulas of the whole report be rendered at once before saving.
+    """
+    text : str
+    latex : bool = False
+    classes : list = field(default_factory=list)
+    styling : list = field(default_factory=list)
+
+class Deferred:
+    """
+    A function without arguments whose result is computed and rendered when the report is.
+
+    Parameters
+    ----------
+    function: callable
+        The function returning the object to render (use functools.partial to pass arguments).
+    key: str, default = None
+        A key identifying the result. If a render cache is active, the rendered HTML is looked up by it, and the function is only called on a miss.
+
+    Notes
+    ----------
+        The result is computed once and kept, so rendering the report again does not call the function again.
+        Functions of elements that are overwritten or removed before rendering are never called.
+        With the "process" executor or when building reports in other processes, the function must be picklable.
+    """
+    def __init__(self, function, key = None):
+        if not callable(function):
+            raise Exception(f"Deferred elements require a callable, but got a {type(function)}.")
+        self.function = function
+        self.key = key
+        self.evaluated = False
+        self._result = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Deferred(function={self.function!r}, key={self.key!r}, evaluated={self.evaluated})"
+
+    def evaluate(self):
+        """
+        Gets the result of the function, calling it the first time.
+
+        Returns
+        -------
+        result: Object
+            The object to render.
+        """
+        #Elements added to several columns are only computed once, even if they are rendered by several threads at the same time.
+        with self._lock:
+            if not self.evaluated:
+                self._result = self.function()
+                self.evaluated = True
+            return self._result
+
+#Imported last since the rendering module depends on the classes defined here.
+from . import rendering
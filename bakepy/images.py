@@ -0,0 +1,247 @@
+import io
+import hashlib
+import logging
+import threading
+import warnings
+
+from concurrent.futures import Future
+
+from .html import HTMLElement, Column, Image
+
+#Conditional import; only if Pillow installed
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+#Bootstrap 5 grid: width of a .container at the widest breakpoint, number of columns and horizontal gutter of the report's rows (gx-5).
+CONTAINER_MAX_WIDTH = 1320
+GRID_COLUMNS = 12
+COLUMN_GUTTER = 48
+
+OPTIMIZED_FORMATS = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+#Image types that are decoded, resized and recompressed. Vector and animated images are kept as-is.
+OPTIMIZABLE_TYPES = ("image/png", "image/jpeg", "image/webp", "image/bmp", "image/tiff")
+
+def get_column_width(column, width = CONTAINER_MAX_WIDTH):
+    """
+    Gets the maximum width in pixels at which the contents of a column are rendered.
+
+    Parameters
+    ----------
+    column: Column
+        The column.
+    width: int, default = 1320
+        The width of the element holding the column's row.
+    Returns
+    -------
+    width: int
+        The width of the column's contents.
+    """
+    row = column._parent
+    columns = [column] if row is None else [x for x in row.elements if isinstance(x, Column)]
+    if column.size is not None:
+        share = column.size / GRID_COLUMNS
+    else:
+        #Columns without a size share the space left by the others.
+        sized = sum(x.size for x in columns if x.size is not None)
+        auto = sum(1 for x in columns if x.size is None)
+        share = max(GRID_COLUMNS - sized, 0) / GRID_COLUMNS / auto
+    return max(int(width * share) - COLUMN_GUTTER, 1)
+
+def get_image_widths(element, width = CONTAINER_MAX_WIDTH, widths = None):
+    """
+    Gets the maximum width at which each image of an element is rendered.
+
+    Parameters
+    ----------
+    element: HTMLElement
+        The element holding the images, usually the report's Body.
+    width: int, default = 1320
+        The width of the element.
+    widths: dict, default = None
+        A dictionary to add the widths to. If None, a new one is created.
+    Returns
+    -------
+    widths: dict
+        A dictionary from the path of each image to its widest rendered width.
+    """
+    if widths is None:
+        widths = dict()
+    for x in element.elements:
+        if isinstance(x, Column):
+            get_image_widths(x, get_column_width(x, width), widths)
+        elif isinstance(x, HTMLElement):
+            get_image_widths(x, width, widths)
+        elif isinstance(x, Image):
+            widths[x.url] = max(widths.get(x.url, 0), width)
+    return widths
+
+class ImageOptimizer:
+    """
+    Resizes embedded images to the width at which they are shown and recompresses them.
+
+    Parameters
+    ----------
+    format: str, default = "webp"
+        The format of the optimized images. One of "webp", "jpeg" or "png" (lossless).
+    quality: int, default = 80
+        The quality used by lossy formats.
+    max_width: int, default = None
+        The maximum width in pixels of any image. If None, images are only limited by the width of their column.
+    densities: tuple, default = (1,)
+        The pixel densities of the variants of each image. With more than one (for example, (1, 2)), images get a srcset attribute.
+    widths: dict, default = None
+        The width at which each image path is shown. Filled by Report.save_html() from the report's layout.
+
+    Notes
+    ----------
+        Requires Pillow. Without it, images are embedded unchanged, with a warning.
+        Images are never enlarged, and the original is kept whenever the optimized image would not be smaller.
+    """
+    def __init__(self, format = "webp", quality = 80, max_width = None, densities = (1,), widths = None):
+        if format not in OPTIMIZED_FORMATS:
+            raise Exception(f"Invalid format {format}. Valid formats are: {list(OPTIMIZED_FORMATS)}.")
+        self.format = format
+        self.quality = quality
+        self.max_width = max_width
+        self.densities = tuple(sorted(densities))
+        self.widths = dict() if widths is None else widths
+        #Optimized images, as (path, data hash, width): future of the variants
+        self._results = dict()
+        self._lock = threading.Lock()
+        #Savings of each embedded image, as (path, original size, optimized size). Filled by Report.save_html().
+        self.stats = []
+        self._warned = False
+
+    def __getstate__(self):
+        #Optimized images are not sent to other processes.
+        state = self.__dict__.copy()
+        state["_results"] = dict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_target_width(self, path, density):
+        width = self.widths.get(path)
+        if width is not None:
+            width *= density
+        if self.max_width is not None:
+            width = self.max_width if width is None else min(width, self.max_width)
+        return width
+
+    def _encode(self, img, width):
+        if width is not None and img.width > width:
+            img = img.resize((width, max(round(img.height * width / img.width), 1)), resample=PILImage.LANCZOS)
+        if self.format == "webp" and img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        elif self.format == "jpeg" and img.mode not in ("RGB", "L"):
+            #JPEG has no transparency, so transparent pixels are set on white.
+            background = PILImage.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        buffer = io.BytesIO()
+        if self.format == "png":
+            img.save(buffer, format="png", optimize=True)
+        else:
+            img.save(buffer, format=self.format, quality=self.quality)
+        return buffer.getvalue(), img.width
+
+    def optimize(self, path, img_type, data):
+        """
+        Optimizes an image.
+
+        Parameters
+        ----------
+        path: str
+            The path of the image, used to look up the width at which it is shown. May be None.
+        img_type: str
+            The MIME type of the image.
+        data: bytes
+            The image contents.
+        Returns
+        -------
+        variants: list
+            The (MIME type, data, width) of each variant of the image, from the lowest to the highest density.
+            A single variant holding the original image if it cannot be optimized.
+        """
+        original = [(img_type, data, None)]
+        if img_type not in OPTIMIZABLE_TYPES:
+            return original
+        if PILImage is None:
+            if not self._warned:
+                warnings.warn("Tried to optimize images but Pillow could not be imported. Is the library installed?")
+                self._warned = True
+            return original
+
+        #Each image is optimized once, even if it is registered by several threads at the same time.
+        key = (path, hashlib.sha256(data).digest(), self.widths.get(path))
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = self._results[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            variants = self._optimize(path, img_type, data)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(variants)
+        return variants
+
+    def _optimize(self, path, img_type, data):
+        try:
+            img = PILImage.open(io.BytesIO(data))
+            img.load()
+        except Exception as e:
+            warnings.warn(f"Could not optimize the image {path}: {e}")
+            return [(img_type, data, None)]
+
+        variants = []
+        for density in self.densities:
+            width = self._get_target_width(path, density)
+            if width is not None and width >= img.width:
+                width = None
+            if variants and (width or img.width) <= variants[-1][2]:
+                #Larger densities would not add detail (the image is no wider, or max_width was reached).
+                break
+            variant_data, variant_width = self._encode(img, width)
+            if width is None and len(variant_data) >= len(data):
+                variant = (img_type, data, img.width)
+            else:
+                variant = (OPTIMIZED_FORMATS[self.format], variant_data, variant_width)
+            variants.append(variant)
+
+        logging.info(f"Optimized image {path}: {len(data)} -> {len(variants[0][1])} bytes.")
+        return variants
+
+    def summary(self):
+        """
+        Gets the byte savings of the images embedded so far.
+
+        Returns
+        -------
+        summary: dict
+            The number of embedded images, their original and optimized sizes in bytes, and the saved bytes and ratio.
+        """
+        original = sum(s[1] for s in self.stats)
+        optimized = sum(s[2] for s in self.stats)
+        return {
+            "images": len(self.stats),
+            "original_bytes": original,
+            "optimized_bytes": optimized,
+            "saved_bytes": original - optimized,
+            "saved_ratio": 0 if original == 0 else (original - optimized) / original,
+        }
+
@@ -0,0 +1,296 @@
+import os
+import json
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import markdown
+
+from .cache import RenderCache, DEFAULT_CACHE_SIZE
+
+_ACTIVE_FORMULA_CACHE = ContextVar("bakepy_formula_cache", default=None)
+
+#Markdown instances are reused, but they are not thread-safe, so each thread keeps its own.
+_CONVERTERS = threading.local()
+
+KATEX_CONFIG = {'no_inline_svg': False, 'insert_fonts_css': False}
+
+class FormulaCache:
+    """
+    A cache of the HTML rendered by KaTeX for each formula, kept in memory and optionally in a directory shared across processes and runs.
+
+    Parameters
+    ----------
+    directory: str, default = None
+        The directory holding the cached formulas, for example stylesheets.get_cache_dir() / "katex". If None, formulas are only cached in memory.
+    max_size: int, default = 512 MiB
+        The maximum size of the directory in bytes. The least recently used formulas are evicted when it is exceeded.
+    """
+    def __init__(self, directory = None, max_size = DEFAULT_CACHE_SIZE):
+        #False is accepted as well, as in earlier versions.
+        self.directory = None if directory is None or directory is False else os.path.abspath(directory)
+        self._disk = None if self.directory is None else RenderCache(self.directory, max_size)
+        self._formulas = dict()
+
+    def _key(self, kind, tex, options):
+        key = hashlib.sha256()
+        for part in [KATEX_VERSION, kind, tex, json.dumps(options, sort_keys=True)]:
+            key.update(str(part).encode("utf-8"))
+            key.update(b"\0")
+        return key.hexdigest()
+
+    def lookup(self, kind, tex, options):
+        """
+        Gets the HTML of a formula if it is cached, or None otherwise.
+        """
+        key = self._key(kind, tex, options)
+        html = self._formulas.get(key)
+        if html is not None or self._disk is None:
+            return html
+        html = self._disk.get(key)
+        if html is not None:
+            self._formulas[key] = html
+        return html
+
+    def store(self, kind, tex, options, html):
+        """
+        Stores the HTML of a formula.
+        """
+        key = self._key(kind, tex, options)
+        self._formulas[key] = html
+        if self._disk is not None:
+            self._disk.set(key, html)
+
+    def get(self, kind, tex, options, render):
+        """
+        Gets the HTML of a formula, rendering it if it is not cached.
+
+        Parameters
+        ----------
+        kind: str
+            "block" or "inline".
+        tex: str
+            The formula's source.
+        options: dict
+            The KaTeX options used to render it.
+        render: function
+            A function without arguments that renders the formula.
+        Returns
+        -------
+        html: str
+            The HTML of the formula.
+        """
+        html = self.lookup(kind, tex, options)
+        if html is None:
+            html = render()
+            self.store(kind, tex, options, html)
+        return html
+
+    def clear(self):
+        """
+        Removes every cached formula, in memory and on disk.
+        """
+        self._formulas.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+class _FormulaCollector:
+    """
+    Stand-in for a formula cache that collects the formulas missing from it instead of rendering them.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.missing = dict()
+
+    def get(self, kind, tex, options, render):
+        html = self.cache.lookup(kind, tex, options)
+        if html is None:
+            self.missing[self.cache._key(kind, tex, options)] = (kind, tex, dict(options), render)
+            return ""
+        return html
+
+_DEFAULT_FORMULA_CACHE = None
+
+def get_formula_cache():
+    """
+    Gets the formula cache active in the current context, or the default one (created on first use) if there is none.
+    """
+    global _DEFAULT_FORMULA_CACHE
+    cache = _ACTIVE_FORMULA_CACHE.get()
+    if cache is None:
+        if _DEFAULT_FORMULA_CACHE is None:
+            _DEFAULT_FORMULA_CACHE = FormulaCache()
+        cache = _DEFAULT_FORMULA_CACHE
+    return cache
+
+@contextmanager
+def use_formula_cache(cache):
+    """
+    Context manager that sets the active formula cache used by the markdown recipe.
+
+    Parameters
+    ----------
+    cache: FormulaCache/str
+        The cache to activate, or the directory of one (for example, stylesheets.get_cache_dir() / "katex" to keep formulas across runs).
+    """
+    if isinstance(cache, (str, os.PathLike)):
+        cache = FormulaCache(cache)
+    token = _ACTIVE_FORMULA_CACHE.set(cache)
+    try:
+        yield cache
+    finally:
+        _ACTIVE_FORMULA_CACHE.reset(token)
+
+#Conditional definition of the KaTeX extension; only if markdown_katex installed
+
+try:
+    from markdown_katex import __version__ as KATEX_VERSION
+    from markdown_katex.extension import (KatexExtension, KatexPreprocessor, make_marker_id,
+                                          md_block2html, md_inline2html)
+
+    class CachedKatexPreprocessor(KatexPreprocessor):
+        """
+        KatexPreprocessor that looks formulas up in the active formula cache before rendering them.
+        """
+        def _make_tag_for_block(self, block_lines):
+            indent_len = len(block_lines[0]) - len(block_lines[0].lstrip())
+            indent_text = block_lines[0][:indent_len]
+            block_text = '\n'.join(line[indent_len:] for line in block_lines).rstrip()
+            marker_tag = 'tmp_block_md_katex_{0}'.format(make_marker_id('block' + block_text))
+            math_html = get_formula_cache().get("block", block_text, self.ext.options,
+                                                lambda: md_block2html(block_text, self.ext.options))
+            self.ext.math_html[marker_tag] = '<p>{0}</p>'.format(math_html)
+            return indent_text + marker_tag
+
+        def _make_tag_for_inline(self, inline_text):
+            marker_tag = 'tmp_inline_md_katex_{0}'.format(make_marker_id('inline' + inline_text))
+            math_html = get_formula_cache().get("inline", inline_text, self.ext.options,
+                                                lambda: md_inline2html(inline_text, self.ext.options))
+            self.ext.math_html[marker_tag] = math_html
+            return marker_tag
+
+    class CachedKatexExtension(KatexExtension):
+        """
+        The markdown_katex extension, rendering formulas through the active formula cache.
+        """
+        def extendMarkdown(self, md):
+            super().extendMarkdown(md)
+            md.preprocessors.register(CachedKatexPreprocessor(md, self), name='katex_fenced_code_block', priority=50)
+
+except ImportError:
+    KATEX_VERSION = None
+    CachedKatexExtension = None
+
+def get_markdown_converter(latex = False):
+    """
+    Gets the Markdown instance of the current thread for a configuration, creating it on first use.
+
+    Parameters
+    ----------
+    latex: bool, default = False
+        If True, the instance parses LaTeX formulas with markdown_katex.
+    Returns
+    -------
+    md: Markdown
+        The Markdown instance. It must be reset before each conversion.
+    """
+    converters = getattr(_CONVERTERS, "converters", None)
+    if converters is None:
+        converters = _CONVERTERS.converters = dict()
+    md = converters.get(latex)
+    if md is None:
+        extensions = []
+        if latex:
+            #Without markdown_katex, this fails just like loading the extension by name.
+            extensions.append(CachedKatexExtension(**KATEX_CONFIG) if CachedKatexExtension is not None else 'markdown_katex')
+        md = converters[latex] = markdown.Markdown(extensions=extensions)
+    return md
+
+def convert_markdown(text, latex = False):
+    """
+    Converts a markdown string to HTML, reusing the Markdown instance of the current thread.
+
+    Parameters
+    ----------
+    text: str
+        The string to parse as markdown.
+    latex: bool, default = False
+        If True, parsing for LaTeX is enabled.
+    Returns
+    -------
+    html: str
+        The HTML string.
+    """
+    md = get_markdown_converter(latex)
+    md.reset()
+    return md.convert(text)
+
+def render_formulas(texts, workers = None):
+    """
+    Renders the LaTeX formulas of several markdown strings at once into the active formula cache.
+
+    Parameters
+    ----------
+    texts: iterable
+        The markdown strings.
+    workers: int, default = None
+        The number of KaTeX processes run concurrently. If None, uses the number of CPUs.
+    Returns
+    -------
+    rendered: int
+        The number of formulas that were not cached and have been rendered.
+
+    Notes
+    ----------
+        The strings are only parsed to collect their formulas; converting them afterwards finds every formula in the cache.
+        Identical formulas are rendered once.
+        markdown_katex runs KaTeX as a command line program that renders a single formula per call, so there is no long-lived process to feed the whole batch to.
+        Instead, each formula missing from the cache gets its own KaTeX process, and up to workers of them run at the same time.
+    """
+    cache = get_formula_cache()
+    collector = _FormulaCollector(cache)
+    with use_formula_cache(collector):
+        for text in texts:
+            convert_markdown(text, latex=True)
+
+    if len(collector.missing) == 0:
+        return 0
+
+    #Each formula is rendered by its own KaTeX process, so threads are enough to run them in parallel.
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        jobs = [(kind, tex, options, pool.submit(render)) for kind, tex, options, render in collector.missing.values()]
+        for kind, tex, options, future in jobs:
+            cache.store(kind, tex, options, future.result())
+    return len(jobs)
+
+def get_markdown_html(text, classes = [], styling = [], latex = False):
+    """
+    Renders a markdown string inside a <div>, as the markdown recipe does.
+
+    Parameters
+    ----------
+    text: str
+        The string to parse as markdown.
+    classes: list, default = []
+        The classes to apply to the element.
+    styling: list, default = []
+        The styles to apply to the element.
+    latex : bool, default = False
+        If True, parsing for LaTeX is enabled.
+    Returns
+    -------
+    repr: str
+        An HTML string.
+    """
+    html = convert_markdown(text, latex)
+        
+    cls_str = ""
+    if len(classes) > 0:
+        cls_str = f""" class="{" ".join(classes)}" """
+    style_str = ""
+    if len(styling) > 0:
+        style_str = f""" style="{" ".join(styling)}" """
+    return f"""<div{cls_str}{style_str}>{html}</div>"""
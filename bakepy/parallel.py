@@ -0,0 +1,147 @@
+import os
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextvars import copy_context
+
+from .html import HTMLElement, Column
+from .assets import get_asset_registry, use_asset_registry
+from .cache import get_render_cache, use_render_cache
+from .rendering import iter_html
+from .snapshot import render_fragments
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+def _iter_columns(element):
+    """
+    Generates the outermost columns of an element in document order, skipping memoized elements.
+    """
+    for x in element.elements:
+        if isinstance(x, Column):
+            yield x
+        elif isinstance(x, HTMLElement) and x.get_memo() is None:
+            yield from _iter_columns(x)
+
+def _render_column(column, registry, cache):
+    """
+    Renders a column inside a worker. Returns the HTML and the registry holding the assets registered while rendering.
+    """
+    with use_asset_registry(registry), use_render_cache(cache):
+        return column.to_html(), registry
+
+def iter_html_parallel(element, workers = None, executor = "thread", window = None):
+    """
+    Renders the columns of an element concurrently and generates the HTML in document order.
+
+    Parameters
+    ----------
+    element: HTMLElement
+        The element to render.
+    workers: int, default = None
+        The number of workers. If None, uses the executor's default.
+    executor: str, default = "thread"
+        The type of executor to use. "thread" works best when rendering is I/O-bound (for example, embedding remote images).
+        "process" works best when rendering is CPU-bound (for example, serializing figures), but requires the columns' contents to be picklable.
+    window: int, default = None
+        The maximum number of columns being rendered ahead of the one being written. If None, uses four times the number of workers.
+    Returns
+    -------
+    repr: generator
+        A generator of HTML strings.
+
+    Notes
+    ----------
+        With the "process" executor, only renderers registered when the worker processes start are available.
+    """
+    if executor not in EXECUTORS:
+        raise Exception(f"Invalid executor {executor}. Valid executors are: {list(EXECUTORS)}.")
+
+    if window is None:
+        window = 4 * (workers or os.cpu_count() or 1)
+
+    registry = get_asset_registry()
+    cache = get_render_cache()
+    columns = _iter_columns(element)
+    pending = deque()
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+
+        def submit_next():
+            column = next(columns, None)
+            if column is None:
+                return
+            #Memoized columns are not submitted.
+            if column.get_memo() is not None:
+                pending.append((column, None))
+                return
+            worker_registry = None if registry is None else registry.empty_copy()
+            if executor == "thread":
+                future = pool.submit(copy_context().run, _render_column, column, worker_registry, cache)
+            else:
+                future = pool.submit(_render_column, column, worker_registry, cache)
+            pending.append((column, future))
+
+        def render_element(x, **o):
+            if isinstance(x, Column):
+                if len(pending) == 0 or pending[0][0] is not x:
+                    #Not scheduled (for example, the tree changed while rendering); render it here.
+                    return x.iter_html()
+                submit_next()
+                column, future = pending.popleft()
+                if future is None:
+                    return column.iter_html()
+                html, worker_registry = future.result()
+                if registry is not None:
+                    registry.merge(worker_registry)
+                column.set_memo(html, [] if worker_registry is None else worker_registry.images)
+                return [html]
+            if isinstance(x, HTMLElement):
+                return x.iter_html(render_element)
+            return iter_html(x, **o)
+
+        for _ in range(window):
+            submit_next()
+
+        yield from element.iter_html(render_element)
+
+def _build_report(builder):
+    """
+    Builds a report inside a worker, replacing its contents with their rendered fragments.
+    """
+    report = builder()
+    render_fragments(report.body)
+    return report
+
+def build_reports(builders, workers = None, executor = "process"):
+    """
+    Builds several reports concurrently, rendering their contents in the workers.
+
+    Parameters
+    ----------
+    builders: list
+        Functions without arguments that return a Report (use functools.partial to pass arguments).
+        With the "process" executor, they must be picklable (for example, defined at the top level of a module).
+    workers: int, default = None
+        The number of workers. If None, uses the executor's default.
+    executor: str, default = "process"
+        The type of executor to use. Either "thread" or "process".
+    Returns
+    -------
+    reports: list
+        The reports, in the order of their builders.
+
+    Notes
+    ----------
+        The contents of the reports (other than containers, rows and columns) are replaced with RenderedFragment objects,
+        so only their HTML and images are sent back instead of objects such as figures.
+        Merging the reports with Report.merge() in the returned order gives the same document regardless of which worker finishes first.
+    """
+    if executor not in EXECUTORS:
+        raise Exception(f"Invalid executor {executor}. Valid executors are: {list(EXECUTORS)}.")
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        futures = [pool.submit(_build_report, builder) for builder in builders]
+        return [future.result() for future in futures]
@@ -1,3 +1,5 @@
+from .html import Image, MarkdownText
+
 SPECIAL_FORMATS_DICT = dict()
 
 #Decorator to register an HTML rendering function
@@ -28,8 +30,8 @@ def get_html(format_type, *args, **kwargs):
         The name of the format.
     Returns
     ----------
-    repr: str
-        An HTML string.
+    repr: str/Object
+        An HTML string, or an object that is rendered when the report is saved.
     """
     return SPECIAL_FORMATS_DICT[format_type](*args, **kwargs)
 
@@ -75,19 +77,15 @@ def _get_img(url, caption = None):
         The path (local or remote) to the image file.
     caption: str, default = None
         The caption for the image.
+    Returns
+    ----------
+    repr: Image
+        The HTML string of the image. When added to a report, the image is registered with the active asset registry instead.
     """
-    str_caption = ""
-
-    if caption is not None:
-        str_caption = f"""<figcaption class="figure-caption text-center">{caption}</figcaption>"""
-
-    return f"""<figure class="figure" style="width:100%;">
-                <img src="{url}" class="figure-img img-fluid">
-                {str_caption}
-            </figure>"""
+    return Image(url, caption)
     
 @register_recipe("markdown")
-def _get_markdown(text, classes = [], styling = [], latex=False):
+def _get_markdown(text, classes = [], styling = [], latex=False, defer=False):
     """
     Generates a block of text with interpreted as markdown.
 
@@ -101,26 +99,17 @@ def _get_markdown(text, classes = [], styling = [], latex=False):
         The styles to apply to the element.
     latex : bool, default = False
         If True, parsing for LaTeX is enabled.
+    defer : bool, default = False
+        If True, the text is converted when the report is rendered, and the formulas of the whole report are rendered at once.
     """
-    import markdown
     from textwrap import dedent
+    from .markdown_engine import get_markdown_html
 
-    extensions = []
-    extension_configs = {}
+    if defer:
+        return MarkdownText(dedent(text), latex, list(classes), list(styling))
 
-    if latex:
-        extensions.append('markdown_katex')
-        extension_configs['markdown_katex'] = {'no_inline_svg': False, 'insert_fonts_css': False}
-        
-    html = markdown.markdown(dedent(text), extensions=extensions, extension_configs=extension_configs)
-        
-    cls_str = ""
-    if len(classes) > 0:
-        cls_str = f""" class="{" ".join(classes)}" """
-    style_str = ""
-    if len(styling) > 0:
-        style_str = f""" style="{" ".join(styling)}" """
-    return f"""<div{cls_str}{style_str}>{html}</div>"""
+    #The Markdown instance (and its extensions) is reused across calls, and formulas are looked up in the formula cache.
+    return get_markdown_html(dedent(text), classes, styling, latex)
 
 @register_recipe(f_str="title")
 def _get_title(text, level = 1, center = True):
@@ -1,15 +1,17 @@
+import hashlib
 import warnings
-import os
-import base64
 
-from pathlib import Path
-
-from bs4 import BeautifulSoup
-
-from .html import HTMLElement
-from .utils import get_image_data
+from .html import HTMLElement, Image, MarkdownText, Deferred
+from .assets import register_image, register_responsive_image
+from .cache import get_render_cache, get_cache_key, register_cache_key
+from .figures import serialize_figure, get_figure_serializer
+from .markdown_engine import get_markdown_html, render_formulas
 
 RENDER_FUNCTIONS_DICT = dict()
+BATCH_RENDER_FUNCTIONS_DICT = dict()
+
+#Cache of the renderers resolved for each type. Cleared whenever a renderer is registered.
+_RENDERER_CACHE = dict()
 
 #Decorator to register an HTML rendering function
 def register_html_renderer(cls):
@@ -28,26 +30,85 @@ def register_html_renderer(cls):
     """
     def registration(f):
         RENDER_FUNCTIONS_DICT[cls] = f
+        _RENDERER_CACHE.clear()
         return f
     return registration
 
-def get_render_function(element, verbose = False):
+#Decorator to register a batch HTML rendering function
+def register_batch_html_renderer(cls):
     """
-    Obtains the associated function to render an object.
+    Decorator to register a function to render HTML from several objects of the same type at once.
+
+    Parameters
+    ----------
+    cls: type/class
+        The type/class to assign for the batch rendering function.
+    Example
+    -------
+    @register_batch_html_renderer(cls=int)
+    def _get_int_batch_html(elements, options):
+        return [str(e) for e in elements]
+
+    Notes
+    ----------
+        The function receives a list of objects and a list with the keyword arguments of each one, and returns a list of HTML strings.
+        It is called once per column (or any other HTMLElement) with all its elements that resolve to it, not once per report,
+        since columns are rendered (and memoized) independently, possibly in other threads or processes.
+        Objects rendered on their own (for example, with get_html()) use the regular renderer of their type.
+        Only MarkdownText has a batch renderer built in, which renders the formulas of a column at once.
     """
-    inheritance = type(element).__mro__
+    def registration(f):
+        BATCH_RENDER_FUNCTIONS_DICT[cls] = f
+        _RENDERER_CACHE.clear()
+        return f
+    return registration
+
+def _resolve_renderers(element_type, verbose = False):
+    """
+    Finds the rendering function and batch rendering function (or None) of a type.
+    """
+    render_function = _default_html_conversion
+    batch_function = None
+    found = False
     #Tries to find a function for each type in the inheritance order of the object.
-    for i in inheritance:
+    for i in element_type.__mro__:
+        if i in BATCH_RENDER_FUNCTIONS_DICT and batch_function is None and not found:
+            if verbose:
+                print(f"Found a batch renderer for the type {i}.")
+            batch_function = BATCH_RENDER_FUNCTIONS_DICT[i]
         if i in RENDER_FUNCTIONS_DICT:
             if verbose:
                 print(f"Found a renderer for the type {i}.")
-            return RENDER_FUNCTIONS_DICT[i]
-        else:
-            if verbose:
-                print(f"Found no associated renderer for the type {i}.")
-    if verbose:
+            render_function = RENDER_FUNCTIONS_DICT[i]
+            found = True
+            break
+        elif verbose:
+            print(f"Found no associated renderer for the type {i}.")
+    if verbose and not found:
         print(f"Found no associated renderer for the inheritance. Returning default rendering function.")
-    return _default_html_conversion
+    return render_function, batch_function
+
+def get_render_function(element, verbose = False):
+    """
+    Obtains the associated function to render an object.
+    """
+    if verbose:
+        return _resolve_renderers(type(element), verbose)[0]
+    try:
+        return _RENDERER_CACHE[type(element)][0]
+    except KeyError:
+        renderers = _RENDERER_CACHE[type(element)] = _resolve_renderers(type(element))
+        return renderers[0]
+
+def get_batch_render_function(element):
+    """
+    Obtains the associated function to render several objects of the same type as an object at once, or None if there is none.
+    """
+    try:
+        return _RENDERER_CACHE[type(element)][1]
+    except KeyError:
+        renderers = _RENDERER_CACHE[type(element)] = _resolve_renderers(type(element))
+        return renderers[1]
 
 def get_renderers():
     return RENDER_FUNCTIONS_DICT.keys()
@@ -73,7 +134,118 @@ def get_html(element, **options):
     repr: str
         An HTML string.
     """
-    return get_render_function(element)(element, **options)
+    return "".join(iter_html(element, **options))
+
+def iter_html(element, **options):
+    """
+    Renders an object to a sequence of HTML string fragments.
+
+    Parameters
+    ----------
+    element: Object
+        The object to render.
+    options: dict
+        An optional dictionary containing keyword arguments to be used by the rendering functon.
+    Returns
+    -------
+    repr: generator
+        A generator of HTML strings.
+
+    Notes
+    ----------
+        Rendering functions may return either a string or an iterable of strings. The latter allows them to stream their output.
+        If a render cache is active and the object's type has a registered hashing function, the rendered HTML is looked up in and stored to the cache.
+    """
+    render_function = get_render_function(element)
+
+    cache = get_render_cache()
+    key = None
+    if cache is not None:
+        key = get_cache_key(element, render_function, options)
+        if key is not None:
+            html = cache.get(key)
+            if html is not None:
+                yield html
+                return
+
+    html = render_function(element, **options)
+
+    if key is not None:
+        if not isinstance(html, str):
+            html = "".join(html)
+        cache.set(key, html)
+
+    if isinstance(html, str):
+        yield html
+    else:
+        yield from html
+
+def render_batch(elements, options):
+    """
+    Renders the objects that have a batch renderer, grouping them by renderer.
+
+    Parameters
+    ----------
+    elements: list
+        The objects to render.
+    options: list
+        The keyword arguments of each object.
+    Returns
+    -------
+    rendered: dict
+        A dictionary from the position of each batch rendered object to its HTML string.
+    """
+    groups = dict()
+    for i, element in enumerate(elements):
+        batch_function = get_batch_render_function(element)
+        if batch_function is not None:
+            groups.setdefault(batch_function, []).append(i)
+
+    rendered = dict()
+    if len(groups) == 0:
+        return rendered
+
+    cache = get_render_cache()
+    for batch_function, idxs in groups.items():
+        keys = dict()
+        if cache is not None:
+            for i in idxs:
+                key = get_cache_key(elements[i], batch_function, options[i])
+                if key is None:
+                    continue
+                html = cache.get(key)
+                if html is None:
+                    keys[i] = key
+                else:
+                    rendered[i] = html
+            idxs = [i for i in idxs if i not in rendered]
+        if len(idxs) == 0:
+            continue
+
+        results = batch_function([elements[i] for i in idxs], [options[i] for i in idxs])
+        for i, html in zip(idxs, results):
+            if not isinstance(html, str):
+                html = "".join(html)
+            rendered[i] = html
+            if i in keys:
+                cache.set(keys[i], html)
+    return rendered
+
+def write_html(element, writer, **options):
+    """
+    Renders an object into a file-like object.
+
+    Parameters
+    ----------
+    element: Object
+        The object to render.
+    writer: file-like
+        Any object with a write(str) method.
+    options: dict
+        An optional dictionary containing keyword arguments to be used by the rendering functon.
+    """
+    for fragment in iter_html(element, **options):
+        writer.write(fragment)
 
 @register_html_renderer(cls=object)
 def _default_html_conversion(element, **_options):
@@ -115,7 +287,7 @@ def _get_str_html(element, **_options):
 @register_html_renderer(cls=HTMLElement)
 def _get_htmlelement_html(element, **_options):
     """
-    Rendering function for HTMLElement objects. Calls the object's to_html() function.
+    Rendering function for HTMLElement objects. Streams the object's iter_html() fragments.
 
     Parameters
     ----------
@@ -125,18 +297,106 @@ def _get_htmlelement_html(element, **_options):
         Unused. Kept for compatibility with get_html()
     Returns
     -------
+    repr: generator
+        A generator of HTML strings.
+    """
+    return element.iter_html()
+
+@register_html_renderer(cls=Image)
+def _get_image_html(element, **_options):
+    """
+    Rendering function for Image objects. Registers the image with the active asset registry, which may optimize it.
+
+    Parameters
+    ----------
+    element: Image
+        The image to render.
+    _options: dict
+        Unused. Kept for compatibility with get_html()
+    Returns
+    -------
+    repr: str
+        An HTML string.
+    """
+    src, srcset = register_responsive_image(element.url)
+    return element.get_html(src, srcset)
+
+@register_html_renderer(cls=MarkdownText)
+def _get_markdown_text_html(element, **_options):
+    """
+    Rendering function for MarkdownText objects.
+
+    Parameters
+    ----------
+    element: MarkdownText
+        The markdown text to render.
+    _options: dict
+        Unused. Kept for compatibility with get_html()
+    Returns
+    -------
     repr: str
         An HTML string.
     """
-    return element.to_html()
+    return get_markdown_html(element.text, element.classes, element.styling, element.latex)
+
+@register_html_renderer(cls=Deferred)
+def _get_deferred_html(element, **options):
+    """
+    Rendering function for Deferred objects. Computes the result of the function (once) and renders it.
+
+    Parameters
+    ----------
+    element: Deferred
+        The deferred element to render.
+    options: dict
+        An optional dictionary containing keyword arguments used by the rendering function of the result.
+    Returns
+    -------
+    repr: generator
+        A generator of HTML strings.
+    """
+    return iter_html(element.evaluate(), **options)
+
+@register_cache_key(cls=Deferred)
+def _get_deferred_key(element):
+    """
+    Hashes the key of a deferred element, so its cached HTML is found without calling its function.
+    """
+    if element.key is None:
+        return None
+    function = getattr(element.function, "func", element.function)
+    key = (getattr(function, "__module__", None), getattr(function, "__qualname__", None), element.key)
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+@register_batch_html_renderer(cls=MarkdownText)
+def _get_markdown_text_batch_html(elements, options):
+    """
+    Batch rendering function for MarkdownText objects. Renders the formulas of every element at once before converting them.
+
+    Parameters
+    ----------
+    elements: list
+        The markdown texts to render.
+    options: list
+        Unused. Kept for compatibility with render_batch()
+    Returns
+    -------
+    repr: list
+        A list of HTML strings.
+    """
+    render_formulas(e.text for e in elements if e.latex)
+    return [_get_markdown_text_html(e) for e in elements]
 
 #Conditional registration of function; only if matplotlib and pandas installed
 
 try:
     from pandas import DataFrame
 
+    from .tables import get_large_table_html, write_table_html, can_write_table_html, DEFAULT_LARGE_TABLE_THRESHOLD, DEFAULT_PAGE_SIZE
+
     @register_html_renderer(cls=DataFrame)
-    def _get_pandas_html(df, caption = None, classes = ["table", "table-bordered"], justify = "left", index=True, **options):
+    def _get_pandas_html(df, caption = None, classes = ["table", "table-bordered"], justify = "left", index=True,
+                         large_table_threshold = DEFAULT_LARGE_TABLE_THRESHOLD, page_size = DEFAULT_PAGE_SIZE, engine = "bakepy", **options):
         """
         Rendering function for pandas dataframes.
 
@@ -152,13 +412,31 @@ try:
             The justification for the table's text.
         index: bool, default=True
             If True, adds the index to the HTML render of the dataframe.
+        large_table_threshold: int, default = 10000
+            Dataframes with more rows are embedded compressed and rendered by the browser as they are scrolled into view, in pages.
+            If None, every dataframe is rendered as a regular table.
+        page_size: int, default = 10000
+            The number of rows of each page of large tables.
+        engine: str, default = "bakepy"
+            The table writer. "bakepy" formats whole columns at once and produces the same markup as "pandas", which uses df.to_html().
+            Dataframes with MultiIndex index/columns, named columns or options other than na_rep, float_format and escape always use df.to_html().
         options: dict
             An optional dictionary containing other keyword arguments used by df.to_html()
+            Large tables only use na_rep and float_format.
         Returns
         -------
         repr: str
             An HTML string.
         """
+        if large_table_threshold is not None and len(df) > large_table_threshold:
+            large_options = {k: v for k, v in options.items() if k in ("na_rep", "float_format")}
+            return get_large_table_html(df, caption, classes, justify, index, page_size, **large_options)
+
+        if engine == "bakepy" and can_write_table_html(df, options):
+            return write_table_html(df, caption, classes, justify, index, **options)
+        elif engine not in ("bakepy", "pandas"):
+            raise Exception(f"Invalid engine {engine}. Valid engines are: ['bakepy', 'pandas'].")
+
         html = df.to_html(index=index, classes = classes, justify=justify, **options)
         if caption is not None:
             html = html.replace("</thead>", f"""</thead>\n  <caption class="text-center">{caption}</caption>""")
@@ -194,6 +472,10 @@ try:
         -------
         repr: str
             An HTML string.
+
+        Notes
+        ----------
+            The figure is serialized in memory; a file is only written if embed is False.
         """
         if not isinstance(fig, Figure):
             try:
@@ -201,40 +483,24 @@ try:
             except:
                 raise Exception("The provided matplotlib object does not contain a Figure.")
 
-        old_config = plt.rcParams['svg.fonttype']
-        
-        filename = f"BAKEPY_IMG_{id(fig)}.{save_format}"
-
-        plt.rcParams['svg.fonttype'] = 'none'
-        fig.savefig(filename, format=save_format, bbox_inches='tight', **options)
-        
-        if save_format == "svg":
-            #Change the format of svg file to have max width/height
-            with open(filename,'r+') as file:
-                soup = BeautifulSoup(file, features="lxml-xml")
-                for svg_f in soup.find_all('svg'):
-                    svg_f.attrs["width"] = "100%"
-                    svg_f.attrs["height"] = "100%"
-                file.seek(0)
-                file.write(str(soup))
-                file.truncate()
-
-        plt.rcParams['svg.fonttype'] = old_config
-        
+        #Use the image serialized by the worker processes, if any.
+        serializer = get_figure_serializer()
+        image = None if serializer is None else serializer.get(fig, save_format, options)
+        if image is None:
+            image = serialize_figure(fig, save_format, **options)
+        img_type, img_data = image
+
         str_caption = ""
 
         if caption is not None:
             str_caption = f"""<figcaption class="figure-caption text-center">{caption}</figcaption>"""
 
         if embed:
-            img_type, img_data = get_image_data(filename)                   
-            img_src = f"data:{img_type};base64,{str(base64.b64encode(img_data),'utf-8')}"
-            try:
-                os.remove(filename)
-            except:
-                warnings.warn(f"Could not delete file {filename}.") 
+            img_src = register_image(data=img_data, img_type=img_type)
         else:
-            img_src = filename
+            img_src = f"BAKEPY_IMG_{id(fig)}.{save_format}"
+            with open(img_src, "wb") as file:
+                file.write(img_data)
 
         return f"""<figure class="figure" style="width:100%;">
                     <img src="{img_src}" class="figure-img img-fluid">
@@ -242,4 +508,4 @@ try:
                 </figure>"""
 
 except:
-    warnings.warn(f"Tried to register render function for matplotlib figures but it failed. Is the library installed?")
\ No newline at end of file
+    warnings.warn(f"Tried to register render function for matplotlib figures but it failed. Is the library installed?")
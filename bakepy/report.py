@@ -1,20 +1,33 @@
 import logging
-import base64
 import os
+import shutil
+import tempfile
 import warnings
 
 import copy as copy_lib
 
+from contextlib import nullcontext
+
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Any
 
 from bs4 import BeautifulSoup
 
-from .html import Body, Container, Row, Column
-from .utils import as_list, get_filename, get_valid_list_idx, limit_list_insert_idx, check_is_url, get_image_data, Working_Directory
+from .html import HTMLElement, Body, Container, Row, Column, Image, MarkdownText, Deferred, EMPTY_OPTIONS, memoize_html
+from .utils import as_list, get_filename, get_valid_list_idx, limit_list_insert_idx, check_is_url, get_images_data, get_data_uri, embed_image_srcs, Working_Directory
+from .utils import DEFAULT_FETCH_WORKERS, DEFAULT_TIMEOUT
 from .recipes import get_html, get_recipes, get_recipe_info
 from .rendering import get_renderers, get_renderer_info
+from .assets import AssetRegistry, AssetDeduplicator, AssetWriter, use_asset_registry
+from .parallel import iter_html_parallel
+from .cache import use_render_cache
+from .figures import FigureSerializer, use_figure_serializer, close_figure
+from .markdown_engine import render_formulas
+from .images import ImageOptimizer, get_image_widths
+from .snapshot import save_snapshot, load_snapshot, render_fragment
+from .stylesheets import StylesheetCache, get_used_classes, link_stylesheets
+from .stylesheets import embed_links as embed_links_html
 
 # Defaults
 
@@ -27,6 +40,10 @@ DEFAULT_STYLESHEETS = ["""<link rel="stylesheet" href="https://cdn.jsdelivr.net/
 class Report:
     """
     The report class is a collection of containers. A custom interface for a HTML Body.
+
+    Notes
+    ----------
+        With eager_render, elements are rendered when they are added and only their HTML and images are kept (see add()).
     """
     name : str = DEFAULT_NAME
     _name: int = field(init=False, repr=False)
@@ -52,6 +69,8 @@ class Report:
     current_col_idx : Any = None
 
     containers: Any = field(default_factory=dict)
+
+    eager_render: bool = False
         
     body : Body = field(init=False)
 
@@ -127,9 +146,11 @@ class Report:
             raise Exception(f"Container {name} already exists. If you wish to overwrite it, set overwrite=True.")
             
         idx = len(self.body.elements)
+        replace = False
 
         if name in self.containers.keys() and overwrite:
-            idx = self.body.elements.index(self.current_container)
+            idx = self.body.find_element(self.containers[name])
+            replace = True
 
         kwargs = self._kwargs_defaults(kwargs, "classes", self.cont_default_classes)
         kwargs = self._kwargs_defaults(kwargs, "styles", self.cont_default_styles)
@@ -138,7 +159,7 @@ class Report:
 
         self.containers[name] = new_cont
 
-        self.body.add_element(new_cont, pos=idx, replace=overwrite)
+        self.body.add_element(new_cont, pos=idx, replace=replace)
 
         self.set_current_container(name)
 
@@ -167,8 +188,8 @@ class Report:
         if name not in self.containers.keys():
             raise Exception(f"Container {name} does not exist.")
         
+        e, e_o = self.body.pop_element(self.body.find_element(self.containers[name]))
         del self.containers[name]
-        e, e_o = self.body.pop_element(self.body.elements.index(self.current_container))
 
         if name == self.current_container_name:
             self.current_container = None
@@ -200,8 +221,12 @@ class Report:
                 self.current_container_name = list(self.containers)[-1]
                 self.current_container = self.containers[self.current_container_name]
                 logging.info(f"Set current container to {self.current_container_name}.")
-        #Verify the current row
-        if self.current_row is None or not any([self.current_row is x for x in self.current_container.elements]):
+        #Verify the current row. Elements know their parent and position, so this does not scan the container.
+        if self.current_row is not None:
+            self.current_row_idx = self._find_child(self.current_container, self.current_row, self.current_row_idx)
+            if self.current_row_idx is None:
+                self.current_row = None
+        if self.current_row is None:
             self.current_col = None
             self.current_col_idx = None
             c_items = len(self.current_container.elements)
@@ -215,7 +240,11 @@ class Report:
                 self.current_row = self.current_container.elements[self.current_row_idx]
                 logging.info(f"Set current row to {self.current_row_idx}.")
         #Verify the current column
-        if self.current_col is None or not any([self.current_col is x for x in self.current_row.elements]):
+        if self.current_col is not None:
+            self.current_col_idx = self._find_child(self.current_row, self.current_col, self.current_col_idx)
+            if self.current_col_idx is None:
+                self.current_col = None
+        if self.current_col is None:
             c_items = len(self.current_row.elements)
             if c_items == 0:
                 self.current_col = None
@@ -226,6 +255,25 @@ class Report:
                 self.current_col = self.current_row.elements[self.current_col_idx]
                 logging.info(f"Set current col to {self.current_row_idx}.")
 
+    @staticmethod
+    def _find_child(parent, child, idx = None):
+        """
+        Gets the position of an element in its parent, or None if it is not one of its children.
+
+        Parameters
+        ----------
+        parent : HTMLElement
+            The parent element.
+        child : HTMLElement
+            The element to find.
+        idx : int, default = None
+            The expected position of the element, checked first.
+        """
+        elements = parent.elements
+        if idx is not None and 0 <= idx < len(elements) and elements[idx] is child:
+            return idx
+        return parent.find_element(child)
+
     def get_container(self, name, **kwargs):
         """
         Gets a container object.
@@ -359,7 +407,7 @@ class Report:
         if row_idx == self.current_row_idx:
             self.current_row = None
         
-        if self.current_row_idx > row_idx:
+        if self.current_row_idx is not None and self.current_row_idx > row_idx:
             self.current_row_idx = self.current_row_idx - 1
             self.current_row = self.current_container.elements[self.current_row_idx]
 
@@ -508,11 +556,11 @@ class Report:
         e, e_o = row.pop_element(col_idx)
 
         if col_idx == self.current_col_idx:
-            self.current_row = None
+            self.current_col = None
         
-        if self.current_col_idx > col_idx:
+        if self.current_col_idx is not None and self.current_col_idx > col_idx:
             self.current_col_idx = self.current_col_idx - 1
-            self.current_col = self.current_container.elements[self.current_col_idx]
+            self.current_col = row.elements[self.current_col_idx]
 
         self._verify_current_pos()
 
@@ -712,6 +760,24 @@ class Report:
         e = self._get_col_from_idx_arg(col_idx = col_idx, row_idx = row_idx, container_name = container_name)
         e.add_sty(vals, overwrite)
 
+    def _prepare_element(self, element, copy = False, eager_render = None, options = EMPTY_OPTIONS):
+        """
+        Gets an element and its parse options as they are stored in a column.
+        """
+        if eager_render is None:
+            eager_render = self.eager_render
+        if not eager_render:
+            return (copy_lib.copy(element) if copy else element), options
+
+        #Rendering does not modify the element, so it is never copied.
+        fragment = render_fragment(element, **options)
+        if isinstance(element, HTMLElement):
+            for x, _ in element.iter_elements():
+                close_figure(x)
+        else:
+            close_figure(element)
+        return fragment, EMPTY_OPTIONS
+
     def add(self,
             elements,
             container_name = None,
@@ -722,6 +788,8 @@ class Report:
             size = None,
             copy = False,
             overwrite = False,
+            lazy = False,
+            eager_render = None,
             **other_args):
         """
         Add content to the report.
@@ -746,9 +814,24 @@ class Report:
             If True, the elements will be copied before inserting.
         overwrite : bool, default = False
             Set to true if overwriting the item in the specified position.
+        lazy : bool, default = False
+            If True, the elements are functions without arguments, called when the report is rendered to get the objects to render.
+            Their results are kept after the first call. Use Deferred objects directly to give them a render cache key.
+        eager_render : bool, default = None
+            If True, the elements are rendered now and only their HTML and images are kept, and matplotlib figures are closed.
+            If None, uses the report's eager_render, except for lazy elements.
+
+        Notes
+        ----------
+            Eagerly rendered images are kept as data, so optimize_images only limits them to max_width when the report is saved,
+            and figures are not serialized by figure_workers. Figures saved with embed=False are written to the working directory.
         """
+        if eager_render is None and lazy:
+            eager_render = False
 
         elements = as_list(elements)
+        if lazy:
+            elements = [e if isinstance(e, Deferred) else Deferred(e) for e in elements]
         if new_col and new_row and not overwrite:
             self.add_row(row_idx = row_idx, container_name = container_name, overwrite = False)
         if new_col and not overwrite:
@@ -764,11 +847,127 @@ class Report:
             col.size = size
         
         for e in elements:
-            if copy:
-                col.add_element(copy_lib.copy(e), **other_args)
-            else:
-                col.add_element(e, **other_args)
+            e, options = self._prepare_element(e, copy, eager_render, other_args)
+            col.add_element(e, **options)
         
+    def add_many(self,
+                 items,
+                 ncols = None,
+                 sizes = None,
+                 container_name = None,
+                 new_row = True,
+                 copy = False,
+                 eager_render = None,
+                 **other_args):
+        """
+        Add many items to the report at once, laid out in a grid with one item per column.
+
+        Parameters
+        ----------
+        items : list
+            The items to add. Each item is an element, or a list of elements to add to the same column.
+        ncols : int, default = None
+            The number of columns of each row. If None, uses the number of sizes, or as many columns of the given size as fit in a row (12).
+            If there are no sizes either, every item is added to the same row. Required if there is a single size that is not a number (for example, "auto").
+        sizes : list/int, default = None
+            The width of the columns. If a list, the width of each column of a row, repeated for every row.
+        container_name : str, default = None
+            The name of the container to insert at. If None, uses the current container.
+        new_row : bool, default = True
+            If True, the items start in a new row. Otherwise, the current row is filled up to ncols columns, counting the ones it already has.
+        copy : bool, default = False
+            If True, the elements will be copied before inserting.
+        eager_render : bool, default = None
+            If True, the elements are rendered now and only their HTML and images are kept. If None, uses the report's eager_render.
+
+        Notes
+        ----------
+            Equivalent to calling add() for each item, but rows and columns are created directly and the current position is only verified at the end.
+            The report's current row and column will be set to the last ones created.
+        """
+        items = list(items)
+        if len(items) == 0:
+            return
+
+        if sizes is not None:
+            sizes = as_list(sizes)
+            if len(sizes) == 0:
+                raise Exception("Invalid sizes []. Use None for columns without a size.")
+            invalid = [x for x in sizes if isinstance(x, int) and x < 1]
+            if len(invalid) > 0:
+                raise Exception(f"Invalid column sizes {invalid}. Sizes must be at least 1.")
+        if ncols is None:
+            if sizes is None:
+                ncols = len(items) + (0 if new_row or self.current_row is None else len(self.current_row.elements))
+            elif len(sizes) > 1:
+                ncols = len(sizes)
+            elif isinstance(sizes[0], int):
+                ncols = max(12 // sizes[0], 1)
+            else:
+                raise Exception(f"The number of columns cannot be derived from the size {sizes[0]!r}. Pass ncols as well.")
+        if ncols < 1:
+            raise Exception(f"Invalid number of columns {ncols}.")
+
+        container = self._get_container_from_name_arg(container_name)
+        row = None if new_row else self.get_current_row()
+        row_idx = self.current_row_idx
+        #Columns already in the current row count towards its ncols. If it is full, the items start in a new row.
+        offset = 0 if row is None else len(row.elements)
+        if offset >= ncols:
+            row, offset = None, 0
+
+        #Rows are filled before being added, so each column does not mark the whole report as modified.
+        cols = []
+        for i, item in enumerate(items):
+            col = Column(classes=list(self.col_default_classes), styles=list(self.col_default_styles),
+                         size=None if sizes is None else sizes[(offset + len(cols)) % len(sizes)])
+            for e in as_list(item):
+                e, options = self._prepare_element(e, copy, eager_render, other_args)
+                col.add_element(e, **options)
+            cols.append(col)
+
+            if offset + len(cols) == ncols or i == len(items) - 1:
+                if row is None:
+                    row = Row(classes=list(self.row_default_classes), styles=list(self.row_default_styles))
+                    row.elements, row.parse_options = cols, [EMPTY_OPTIONS] * len(cols)
+                    for x in cols:
+                        x._parent = row
+                    container.add_element(row)
+                    row_idx = len(container.elements) - 1
+                else:
+                    for x in cols:
+                        row.add_element(x)
+                last_col = cols[-1]
+                cols = []
+                row, offset = None, 0
+
+        self.current_row = container.elements[row_idx]
+        self.current_row_idx = row_idx
+        self.current_col = last_col
+        self.current_col_idx = len(self.current_row.elements) - 1
+        self._verify_current_pos()
+
+    def extend(self, elements, container_name = None, copy = False, eager_render = None, **other_args):
+        """
+        Add several elements to the report, each in a new row.
+
+        Parameters
+        ----------
+        elements : list
+            The elements to add. Each element may also be a list of elements to add to the same column.
+        container_name : str, default = None
+            The name of the container to insert at. If None, uses the current container.
+        copy : bool, default = False
+            If True, the elements will be copied before inserting.
+        eager_render : bool, default = None
+            If True, the elements are rendered now and only their HTML and images are kept. If None, uses the report's eager_render.
+
+        Notes
+        ----------
+            Equivalent to calling add() for each element. See add_many().
+        """
+        self.add_many(elements, ncols=1, container_name=container_name, copy=copy, eager_render=eager_render, **other_args)
+
     def recipe(self,
                type,
                *args,
@@ -848,7 +1047,70 @@ class Report:
         """
         return get_renderer_info(recipe, verbose)
 
-    def save_html(self, filename = None, embed_images=True, embed_links=True):
+    def merge(self, other, container_name = None, overwrite = False, copy = False):
+        """
+        Add the containers of another report to this one.
+
+        Parameters
+        ----------
+        other : Report
+            The report to merge.
+        container_name : str, default = None
+            If provided, the rows of every container of the other report are added to this container (created if it does not exist).
+            If None, each container is merged into the container with the same name.
+        overwrite : bool, default = False
+            If True, containers that already exist are replaced by the merged ones. Otherwise, the merged rows are added after theirs.
+        copy : bool, default = False
+            If True, the other report's elements are copied before merging. Otherwise, they are moved, and the other report is left empty.
+
+        Notes
+        ----------
+            Containers are merged in the order of the other report. Merging several reports in a fixed order gives the same document
+            regardless of how they were built, for example concurrently with bakepy.parallel.build_reports().
+            The report's current container will be set to the last merged container.
+        """
+        if other is self:
+            raise Exception("Cannot merge a report into itself.")
+        if copy:
+            other = copy_lib.deepcopy(other)
+
+        merged = None
+        replaced = set()
+        for element, options in zip(other.body.elements, other.body.parse_options):
+            if not isinstance(element, Container):
+                #Objects added to the body directly
+                self.body.add_element(element, **options)
+                continue
+
+            name = element.name if container_name is None else container_name
+            if name not in self.containers:
+                element.name = name
+                self.containers[name] = element
+                self.body.add_element(element, **options)
+            elif overwrite and name not in replaced:
+                element.name = name
+                idx = self.body.find_element(self.containers[name])
+                self.containers[name] = element
+                self.body.add_element(element, pos=idx, replace=True, **options)
+            else:
+                target = self.containers[name]
+                for row, row_options in zip(element.elements, element.parse_options):
+                    target.add_element(row, **row_options)
+            replaced.add(name)
+            merged = name
+
+        #The merged elements now belong to this report.
+        if not copy:
+            other.body.elements = []
+            other.body.parse_options = []
+            other.containers = dict()
+            other.current_container = None
+            other._verify_current_pos()
+
+        if merged is not None:
+            self.set_current_container(merged)
+
+    def save_html(self, filename = None, embed_images=True, embed_links=False, prettify=True, scan_images=True, workers=None, executor="thread", cache=None, memoize=False, fetch_workers=DEFAULT_FETCH_WORKERS, timeout=DEFAULT_TIMEOUT, http_cache=None, prune_css=False, stylesheet_cache=None, figure_workers=None, optimize_images=None, dedupe_assets=False, assets_dir=None):
         """
         Save the report to an HTML file.
 
@@ -858,33 +1120,79 @@ class Report:
             The path to save at. If None, uses the report name.
         embed_images : bool, default = True
             If True, embeds any linked images as base64.
-        embed_links : bool, default = True
-            If True, embeds any linked styles.
+        embed_links : bool, default = False
+            If True, embeds any linked styles, so the report can be opened without network access.
+            Remote stylesheets are downloaded, checked against their integrity attribute and stored in the stylesheet cache.
+            If False, the stylesheets stay linked and nothing is downloaded.
+        prettify : bool, default = True
+            If True, the whole document is built in memory and reformatted before saving, since reformatting needs the parsed document.
+            If False, the document is streamed to the file element by element, so peak memory is bounded by the largest single element.
+            Use prettify=False for large reports.
+        scan_images : bool, default = True
+            Only used if prettify is False. If True, the rendered HTML is also searched for <img> tags (for example, in raw HTML strings) to embed.
+            If False, only the images registered by the img recipe and the renderers are embedded, and the HTML is never scanned.
+        workers : int, default = None
+            The number of workers used to render columns concurrently. If None, the report is rendered serially.
+        executor : str, default = "thread"
+            The type of executor used if workers is set. Either "thread" (for I/O-bound rendering such as embedding remote images)
+            or "process" (for CPU-bound rendering such as serializing figures; the report's contents must be picklable).
+        cache : RenderCache/str, default = None
+            A persistent render cache (or the directory of one). Objects with unchanged content, such as DataFrames and figures,
+            reuse their HTML from previous runs instead of being rendered again. If None, nothing is cached.
+        memoize : bool, default = False
+            If True, containers, rows and columns keep their rendered HTML, so that saving again only renders the ones modified since.
+            Modifications made in place to objects already in the report are not detected; call mark_dirty() on their column.
+        fetch_workers : int, default = 8
+            The number of remote images downloaded concurrently when embedding.
+        timeout : float, default = 30
+            The timeout in seconds of each remote image request.
+        http_cache : HTTPCache/str, default = None
+            A cache (or the directory of one) of remote images, revalidated with their ETag/Last-Modified headers.
+            If None, remote images are always downloaded.
+        prune_css : bool, default = False
+            Only used if embed_links is True. If True, the embedded stylesheets only keep the rules that apply to the classes used in the report.
+        stylesheet_cache : StylesheetCache/str, default = None
+            The local cache (or the directory of one) of remote stylesheets. If None, uses the default cache directory:
+            BAKEPY_CACHE_DIR if set, otherwise bakepy under XDG_CACHE_HOME (by default, ~/.cache/bakepy).
+        figure_workers : int, default = None
+            The number of worker processes used to serialize matplotlib figures ahead of their rendering (figures must be picklable).
+            If None, figures are serialized while rendering. Ignored if workers is set, or if the machine has a single CPU.
+            Starting the workers and pickling each figure to send it to them have a cost, so this only helps on several CPUs
+            with figures that take much longer to draw than to pickle (for example, SVG figures with many artists).
+            Measure it with benchmarks/bench_figures.py before enabling it.
+        optimize_images : ImageOptimizer/bool, default = None
+            Only used if embed_images is True or assets_dir is set. If provided (or True, for the default settings), raster images and figures are resized
+            to the width of their column and recompressed. Requires Pillow. The optimizer's summary() reports the saved bytes.
+        dedupe_assets : bool, default = False
+            If True, each distinct embedded image is stored once at the end of the document and referenced by every <img> tag showing it.
+            The document then requires JavaScript to show its images.
+        assets_dir : str, default = None
+            Only used if embed_images is False. If provided, figures, local images and (if embed_links is True) stylesheets are written to
+            files named after a hash of their contents in this directory, and linked from the report. Files are written concurrently,
+            unchanged files are never written again, and reports saved to the same directory share them, so browsers can cache them.
+            Remote images are linked as-is.
         """
 
         if filename is None:
             output_dir = Path().cwd().absolute()
         else:
-            output_dir = Path(filename).parent.absolute()
+            #The file is written from the output directory, so a relative path would be applied twice.
+            filename = Path(filename).absolute()
+            output_dir = filename.parent
 
-        with Working_Directory(output_dir) as wd:
+        writer = None
+        if assets_dir is not None and not embed_images:
+            writer = AssetWriter(assets_dir, base=output_dir, workers=fetch_workers)
 
-            html = self.body.to_html()
-            soup = BeautifulSoup(html, "html.parser")
+        def get_head(head, used_classes = None):
+            #Stylesheets are either embedded, or written to the assets directory.
+            if writer is not None:
+                return link_stylesheets(head, writer, stylesheet_cache, used_classes)
+            return embed_links_html(head, stylesheet_cache, used_classes)
 
-            #Embed images as base64
-            if embed_images:
-                for img in soup.find_all('img'):
-                    img_src = img.attrs['src']
-                    #If image is already embedded, skip.
-                    if img_src.startswith('data:'):
-                        continue
-                    img_type, img_data = get_image_data(img_src)                   
-                    img.attrs['src'] = f"data:{img_type};base64,{str(base64.b64encode(img_data),'utf-8')}"
-            #Embed links (stylesheets) using bs4
-            #TODO
+        with Working_Directory(output_dir) as wd, writer or nullcontext():
 
-            #Save the file
+            #Get the file name
             name = self.name
             
             if name == "":
@@ -895,8 +1203,162 @@ class Report:
                 
             filename = get_filename(filename, "html")
 
+            if stylesheet_cache is not None and not isinstance(stylesheet_cache, StylesheetCache):
+                stylesheet_cache = StylesheetCache(stylesheet_cache, timeout)
+
+            if optimize_images is True:
+                optimize_images = ImageOptimizer()
+            if optimize_images:
+                #Images are resized to the widest column they are shown in.
+                get_image_widths(self.body, widths=optimize_images.widths)
+
+            registry = AssetRegistry(embed_images=embed_images, fetch_workers=fetch_workers, timeout=timeout, http_cache=http_cache,
+                                     image_optimizer=optimize_images or None, asset_writer=writer)
+            fetch_options = dict(workers=fetch_workers, timeout=timeout, http_cache=registry.http_cache)
+
+            deduplicator = AssetDeduplicator() if dedupe_assets else None
+
+            serializer = None
+            if figure_workers is not None and workers is None:
+                if (os.cpu_count() or 1) > 1:
+                    serializer = FigureSerializer(figure_workers)
+                else:
+                    warnings.warn("Ignoring figure_workers, since there is a single CPU. Figures are serialized while rendering.")
+
+            with registry, serializer or nullcontext(), use_asset_registry(registry), use_render_cache(cache), memoize_html(memoize), use_figure_serializer(serializer):
+                #Start downloading the remote images that will be registered while rendering
+                registry.prefetch(x.url for x, _ in self.body.iter_elements(skip_memoized=True) if isinstance(x, Image))
+
+                #Start serializing the figures that will be rendered
+                if serializer is not None:
+                    serializer.add(self.body.iter_elements(skip_memoized=True))
+
+                #Render the formulas of the deferred markdown texts at once
+                render_formulas(x.text for x, _ in self.body.iter_elements(skip_memoized=True) if isinstance(x, MarkdownText) and x.latex)
+
+                if workers is None:
+                    fragments = self.body.iter_html()
+                else:
+                    fragments = iter_html_parallel(self.body, workers, executor)
+
+                #The first fragment is the head of the document, which holds the stylesheets.
+                head = next(fragments)
+
+                if not prettify:
+                    def process(fragment):
+                        #Embed images that were not registered while rendering
+                        if embed_images and scan_images:
+                            fragment = embed_image_srcs(fragment, **fetch_options)
+                        if deduplicator is not None:
+                            fragment = deduplicator.dedupe(fragment)
+                        return fragment
+
+                    def iter_processed():
+                        #The last fragment is held back, since the deduplicated images go before the end of the body.
+                        previous = None
+                        for fragment in fragments:
+                            if previous is not None:
+                                yield previous
+                            previous = process(fragment)
+                        if previous is not None:
+                            yield previous if deduplicator is None else deduplicator.insert(previous)
+
+                    with open(filename, 'w') as f:
+                        if embed_links and prune_css:
+                            #The used classes are only known after rendering, so the rest of the document is buffered in a temporary file.
+                            used_classes = set()
+                            with tempfile.TemporaryFile('w+') as tmp:
+                                for fragment in iter_processed():
+                                    get_used_classes(fragment, used_classes)
+                                    tmp.write(fragment)
+                                f.write(get_head(head, used_classes))
+                                tmp.seek(0)
+                                shutil.copyfileobj(tmp, f)
+                        else:
+                            if embed_links:
+                                head = get_head(head)
+                            f.write(head)
+                            for fragment in iter_processed():
+                                f.write(fragment)
+                    if optimize_images:
+                        optimize_images.stats.extend(registry.optimized_images)
+                        logging.info(f"Optimized images: {optimize_images.summary()}")
+                    return
+
+                html = "".join(fragments)
+                if optimize_images:
+                    optimize_images.stats.extend(registry.optimized_images)
+                    logging.info(f"Optimized images: {optimize_images.summary()}")
+
+            #Embed links (stylesheets)
+            if embed_links:
+                head = get_head(head, get_used_classes(html) if prune_css else None)
+
+            soup = BeautifulSoup(head + html, "html.parser")
+
+            #Embed images as base64
+            if embed_images:
+                #If image is already embedded, skip.
+                imgs = [img for img in soup.find_all('img') if not img.attrs['src'].startswith('data:')]
+                images = get_images_data([img.attrs['src'] for img in imgs], **fetch_options)
+                for img in imgs:
+                    img.attrs['src'] = get_data_uri(*images[img.attrs['src']])
+
+            html = soup.prettify()
+
+            #Store each distinct embedded image once
+            if deduplicator is not None:
+                html = deduplicator.insert(deduplicator.dedupe(html))
+
+            #Save the file
             with open(filename, 'w') as f:
-                f.write(soup.prettify())
+                f.write(html)
+
+    def save_snapshot(self, filename = None):
+        """
+        Save the report to a snapshot file, which can be loaded with Report.load_snapshot() to keep adding content to it.
+
+        Parameters
+        ----------
+        filename : str, default = None
+            The path to save at. If None, uses the report name.
+
+        Notes
+        ----------
+            Containers, rows and columns are stored as they are, while any other object (for example, a figure) is stored as its rendered HTML,
+            with its images as binary blobs. Identical images are stored once.
+        """
+        name = self.name
+
+        if name == "":
+            name = id(self)
+
+        if filename is None:
+            filename = name
+
+        save_snapshot(self, get_filename(filename, "bakepy"))
+
+    @classmethod
+    def load_snapshot(cls, filename):
+        """
+        Load a report from a snapshot file.
+
+        Parameters
+        ----------
+        filename : str
+            The path of the snapshot file.
+
+        Returns
+        ----------
+        report : Report
+            The report, with the same containers, rows, columns and current position as when it was saved.
+
+        Notes
+        ----------
+            The file is mapped into memory and its contents are only read when the report is rendered, so loading is fast regardless of its size.
+            The file must not be modified while the report is in use, other than by saving a snapshot over it.
+        """
+        return load_snapshot(filename, cls)
 
     # def save_pdf(self, filename = None):
     #     """
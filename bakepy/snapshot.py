@@ -0,0 +1,439 @@
+import os
+import re
+import json
+import mmap
+import base64
+import struct
+import hashlib
+import tempfile
+
+from dataclasses import dataclass
+from typing import Any
+
+from .html import Container, Row, Column, EMPTY_OPTIONS
+from .utils import Working_Directory, get_image_data
+from .assets import AssetRegistry, IMG_TAG_REGEX, IMG_SRC_ATTR_REGEX, use_asset_registry, register_image, register_responsive_image
+from .rendering import register_html_renderer, iter_html
+
+#File layout: header | blob section | manifest (JSON). The header holds the position of the manifest, which is written last.
+SNAPSHOT_MAGIC = b"BKPYSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQ")
+
+#Blobs are aligned so they can be viewed as arrays without copying.
+BLOB_ALIGNMENT = 8
+
+BASE64_DATA_URI_REGEX = re.compile(r"data:([^\s,;\"']+);base64,([A-Za-z0-9+/=]*)")
+ASSET_REF_REGEX = re.compile(r"bakepy-snapshot-asset:(\d+)|\s*srcset=\"bakepy-snapshot-srcset:(\d+)\"")
+
+#Element types stored as nodes of the snapshot's tree. Any other object is stored as its rendered HTML.
+NODE_TYPES = {cls.__name__: cls for cls in (Container, Row, Column)}
+
+#Report attributes stored in the snapshot.
+REPORT_ATTRIBUTES = ("name", "main_stylesheet", "stylesheets",
+                     "cont_default_styles", "cont_default_classes", "row_default_styles", "row_default_classes",
+                     "col_default_styles", "col_default_classes", "eager_render",
+                     "current_container_name", "current_row_idx", "current_col_idx")
+
+class SnapshotFile:
+    """
+    A snapshot file mapped into memory. Blobs are read from the mapping on demand.
+
+    Parameters
+    ----------
+    path: str
+        The path of the snapshot file.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._open()
+
+    def _open(self):
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < SNAPSHOT_HEADER.size:
+                raise Exception(f"{self.path} is not a BakePy snapshot.")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+
+        magic, version, _, manifest_offset, manifest_length = SNAPSHOT_HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise Exception(f"{self.path} is not a BakePy snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise Exception(f"Unsupported snapshot version {version}. Supported version: {SNAPSHOT_VERSION}.")
+        try:
+            if manifest_offset < SNAPSHOT_HEADER.size or manifest_offset + manifest_length > stat.st_size:
+                raise ValueError("The manifest is out of bounds.")
+            self.manifest = json.loads(self._mmap[manifest_offset:manifest_offset + manifest_length].decode("utf-8"))
+            self.blobs = self.manifest["blobs"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise Exception(f"The snapshot {self.path} is corrupt ({e}).")
+
+    def __getstate__(self):
+        #The mapping is opened again by other processes, as long as the file has not changed.
+        return {"path": self.path, "_stat": self._stat}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+        if self._stat != state["_stat"]:
+            raise Exception(f"The snapshot {self.path} changed after it was loaded.")
+
+    def __deepcopy__(self, memo):
+        #Snapshots are read-only, so copies share the mapping.
+        return self
+
+    def get_view(self, blob):
+        """
+        Gets a blob as a memoryview of the mapping, without copying it.
+        """
+        offset, length = self.blobs[blob]
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def get_bytes(self, blob):
+        """
+        Gets a blob as bytes.
+        """
+        offset, length = self.blobs[blob]
+        return self._mmap[offset:offset + length]
+
+    def get_text(self, blob):
+        """
+        Gets a blob as a string.
+        """
+        return self.get_bytes(blob).decode("utf-8")
+
+@dataclass
+class SnapshotFragment:
+    """
+    The rendered HTML of an object, loaded from a snapshot.
+
+    Notes
+    ----------
+        The images of the fragment are stored as binary blobs, and are registered with the active asset registry when the fragment
+        is rendered, so they can still be embedded, optimized or written to an assets directory.
+    """
+    source : SnapshotFile
+    html : int
+    #Blob index and MIME type of each image referenced by the fragment.
+    assets : Any
+
+    def get_html(self):
+        return _resolve_assets(self.source.get_text(self.html), [(self.source.get_bytes(blob), img_type) for blob, img_type in self.assets])
+
+@dataclass
+class RenderedFragment:
+    """
+    The rendered HTML of an object, held in memory. Unlike the object, it can be sent to other processes cheaply.
+
+    Notes
+    ----------
+        As with SnapshotFragment, its images are registered with the active asset registry when it is rendered.
+        Images rendered from data (such as figures) are kept as bytes. Images referenced by a path are kept as the path, so relative
+        paths are resolved from the directory of the saved report, as they are for objects that are not rendered in advance.
+    """
+    html : str
+    #Contents and MIME type of each image referenced by the fragment, or its path and None.
+    assets : Any
+
+    def get_html(self):
+        return _resolve_assets(self.html, self.assets)
+
+def _resolve_assets(html, assets):
+    """
+    Replaces the image references of a fragment with the src given by the active asset registry.
+    """
+    if len(assets) == 0:
+        return html
+    #Images referenced by a path are registered once, for both their src and srcset.
+    responsive = dict()
+
+    def get_responsive(i):
+        if i not in responsive:
+            responsive[i] = register_responsive_image(assets[i][0])
+        return responsive[i]
+
+    def resolve(match):
+        if match.group(1) is not None:
+            i = int(match.group(1))
+            data, img_type = assets[i]
+            if img_type is None:
+                return get_responsive(i)[0]
+            return register_image(data=data, img_type=img_type)
+        i = int(match.group(2))
+        if assets[i][1] is not None:
+            #The image was stored as bytes (for example, in a snapshot), so it has a single variant.
+            return ""
+        srcset = get_responsive(i)[1]
+        return "" if srcset is None else f' srcset="{srcset}"'
+    return ASSET_REF_REGEX.sub(resolve, html)
+
+@register_html_renderer(cls=SnapshotFragment)
+@register_html_renderer(cls=RenderedFragment)
+def _get_fragment_html(element, **_options):
+    """
+    Rendering function for SnapshotFragment and RenderedFragment objects.
+
+    Parameters
+    ----------
+    element: SnapshotFragment/RenderedFragment
+        The fragment to render.
+    _options: dict
+        Unused. Kept for compatibility with get_html()
+    Returns
+    -------
+    repr: str
+        An HTML string.
+    """
+    return element.get_html()
+
+class _SnapshotWriter:
+    """
+    Writes the blobs of a snapshot, storing identical blobs once.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.blobs = []
+        #Blobs written, as content hash (or snapshot blob): index
+        self._index = dict()
+
+    def _align(self):
+        padding = -self.f.tell() % BLOB_ALIGNMENT
+        if padding:
+            self.f.write(b"\0" * padding)
+
+    def write(self, data, key = None):
+        if key is None:
+            key = hashlib.sha256(data).digest()
+        index = self._index.get(key)
+        if index is not None:
+            return index
+        self._align()
+        self.blobs.append((self.f.tell(), len(data)))
+        self.f.write(data)
+        index = self._index[key] = len(self.blobs) - 1
+        return index
+
+    def write_fragment(self, fragment):
+        #Blobs of loaded snapshots are copied as-is, without rendering them again.
+        source = fragment.source
+        html = self.write(source.get_view(fragment.html), key=(id(source), fragment.html))
+        assets = [[self.write(source.get_view(blob), key=(id(source), blob)), img_type] for blob, img_type in fragment.assets]
+        return {"html": html, "assets": assets}
+
+    def write_rendered(self, html, assets):
+        #Images kept as paths are stored as blobs, read relative to the snapshot's directory.
+        assets = [get_image_data(data)[::-1] if img_type is None else (data, img_type) for data, img_type in assets]
+        return {"html": self.write(html.encode("utf-8")), "assets": [[self.write(data), img_type] for data, img_type in assets]}
+
+def _extract_data_uris(html, assets):
+    """
+    Moves the base64 images embedded in the <img> tags of an HTML string to a list of (data, MIME type) assets.
+    """
+    refs = dict()
+
+    def extract(match):
+        img_type, data = match.group(1), match.group(2)
+        key = (img_type, data)
+        if key not in refs:
+            refs[key] = len(assets)
+            assets.append((base64.b64decode(data), img_type))
+        return f"bakepy-snapshot-asset:{refs[key]}"
+
+    def extract_attr(match):
+        return match.group(0).replace(match.group(3), BASE64_DATA_URI_REGEX.sub(extract, match.group(3)))
+
+    def extract_tag(match):
+        return IMG_SRC_ATTR_REGEX.sub(extract_attr, match.group(0))
+
+    if "data:" in html:
+        html = IMG_TAG_REGEX.sub(extract_tag, html)
+    return html
+
+class _CaptureRegistry(AssetRegistry):
+    """
+    Asset registry that keeps the images of the rendered objects as bytes, instead of embedding them.
+
+    Parameters
+    ----------
+    keep_paths: bool, default = False
+        If True, images referenced by a path are kept as the path instead of being read.
+    """
+    def __init__(self, keep_paths = False):
+        super().__init__(embed_images=True)
+        self.keep_paths = keep_paths
+        #Contents and MIME type of each image of the object being rendered, or its path and None.
+        self.assets = []
+
+    def register_responsive_image(self, path = None, data = None, img_type = None):
+        if data is not None or not self.keep_paths or path.startswith("data:"):
+            return super().register_responsive_image(path, data, img_type)
+        self.images.append(path)
+        self.assets.append((path, None))
+        i = len(self.assets) - 1
+        return f"bakepy-snapshot-asset:{i}", f"bakepy-snapshot-srcset:{i}"
+
+    def _get_src(self, img_type, data):
+        self.assets.append((data, img_type))
+        return f"bakepy-snapshot-asset:{len(self.assets) - 1}"
+
+def render_fragment(element, keep_paths = True, **options):
+    """
+    Renders an object to a RenderedFragment.
+
+    Parameters
+    ----------
+    element: Object
+        The object to render.
+    keep_paths: bool, default = True
+        If True, images referenced by a path (local or remote) are kept as the path and read when the fragment is rendered.
+        Otherwise, they are read now, relative to the current working directory.
+    options: dict
+        An optional dictionary containing keyword arguments to be used by the rendering functon.
+    Returns
+    -------
+    fragment: RenderedFragment
+        The fragment, holding the images registered while rendering and those embedded in the HTML.
+    """
+    if isinstance(element, RenderedFragment):
+        return element
+    with _CaptureRegistry(keep_paths) as registry, use_asset_registry(registry):
+        html = "".join(iter_html(element, **options))
+    return RenderedFragment(_extract_data_uris(html, registry.assets), registry.assets)
+
+def render_fragments(element):
+    """
+    Replaces, in place, every object contained in an element (recursively) that is not a container, row or column with its RenderedFragment.
+
+    Parameters
+    ----------
+    element: HTMLElement
+        The element, usually the Body of a report.
+
+    Notes
+    ----------
+        Used to send reports built in other processes without their original objects, such as figures.
+        SnapshotFragment objects are kept, since they are read from their file.
+    """
+    for i, (x, o) in enumerate(zip(element.elements, element.parse_options)):
+        if NODE_TYPES.get(type(x).__name__) is type(x):
+            render_fragments(x)
+        elif not isinstance(x, SnapshotFragment):
+            element.elements[i] = render_fragment(x, **o)
+            element.parse_options[i] = EMPTY_OPTIONS
+    element.mark_dirty()
+
+def _dump_element(writer, element, options):
+    """
+    Stores an element of the report's tree, returning its node.
+    """
+    if NODE_TYPES.get(type(element).__name__) is type(element):
+        attrs = {name: getattr(element, name) for name, _ in element._fields if name not in ("elements", "parse_options")}
+        return {
+            "type": type(element).__name__,
+            "attrs": attrs,
+            "options": options,
+            "elements": [_dump_element(writer, x, o) for x, o in zip(element.elements, element.parse_options)],
+        }
+    if isinstance(element, SnapshotFragment):
+        return writer.write_fragment(element)
+    #Any other object is rendered. Its images are stored as blobs.
+    fragment = render_fragment(element, keep_paths=False, **options)
+    return writer.write_rendered(fragment.html, fragment.assets)
+
+def _load_element(source, node):
+    """
+    Rebuilds an element of the report's tree from its node.
+    """
+    if "type" not in node:
+        return SnapshotFragment(source, node["html"], [tuple(x) for x in node["assets"]])
+    element = NODE_TYPES[node["type"]](**node["attrs"])
+    for x in node["elements"]:
+        element.add_element(_load_element(source, x), **x.get("options", {}))
+    return element
+
+def save_snapshot(report, filename):
+    """
+    Stores a report in a snapshot file.
+
+    Parameters
+    ----------
+    report: Report
+        The report to store.
+    filename: str
+        The path of the snapshot file.
+
+    Notes
+    ----------
+        Containers, rows and columns are stored as a tree, and any other object as its rendered HTML.
+        Images are stored once as binary blobs. The file is replaced atomically, so the snapshot being loaded may be overwritten.
+    """
+    filename = os.path.abspath(filename)
+    directory = os.path.dirname(filename)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        #Relative image paths are resolved from the snapshot's directory, as Report.save_html() does from the report's.
+        with os.fdopen(fd, "wb") as f, Working_Directory(directory):
+            f.write(b"\0" * SNAPSHOT_HEADER.size)
+            writer = _SnapshotWriter(f)
+            body = report.body
+            elements = [_dump_element(writer, x, o) for x, o in zip(body.elements, body.parse_options)]
+            manifest = {
+                "report": {k: getattr(report, k) for k in REPORT_ATTRIBUTES},
+                "elements": elements,
+                "blobs": writer.blobs,
+            }
+            try:
+                data = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+            except TypeError as e:
+                raise Exception(f"Could not store the report: the attributes and parse options of its containers, rows and columns must be JSON serializable ({e}).")
+            manifest_offset = f.tell()
+            f.write(data)
+            f.seek(0)
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, manifest_offset, len(data)))
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def load_snapshot(filename, report_class):
+    """
+    Loads a report from a snapshot file.
+
+    Parameters
+    ----------
+    filename: str
+        The path of the snapshot file.
+    report_class: type
+        The class of the report to create.
+    Returns
+    -------
+    report: Report
+        The report. Objects other than containers, rows and columns are SnapshotFragment objects.
+
+    Notes
+    ----------
+        The file is mapped into memory and blobs are only read when rendered, so loading takes time proportional to the size of the tree.
+    """
+    source = SnapshotFile(filename)
+    attrs = source.manifest["report"]
+    report = report_class(**{k: attrs[k] for k in REPORT_ATTRIBUTES if k in attrs and not k.startswith("current_")})
+    for node in source.manifest["elements"]:
+        element = _load_element(source, node)
+        report.body.add_element(element, **node.get("options", {}))
+        if isinstance(element, Container):
+            report.containers[element.name] = element
+
+    #Restore the position of the cursor
+    name = attrs["current_container_name"]
+    if name in report.containers:
+        report.current_container = report.containers[name]
+        report.current_container_name = name
+        if attrs["current_row_idx"] is not None and attrs["current_row_idx"] < len(report.current_container.elements):
+            report.current_row_idx = attrs["current_row_idx"]
+            report.current_row = report.current_container.elements[report.current_row_idx]
+            if attrs["current_col_idx"] is not None and attrs["current_col_idx"] < len(report.current_row.elements):
+                report.current_col_idx = attrs["current_col_idx"]
+                report.current_col = report.current_row.elements[report.current_col_idx]
+    report._verify_current_pos()
+    return report
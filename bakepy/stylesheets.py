@@ -0,0 +1,476 @@
+import os
+import re
+import base64
+import hashlib
+import mimetypes
+import tempfile
+import warnings
+
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+from .utils import check_is_url, fetch_url, DEFAULT_TIMEOUT
+
+def get_cache_dir():
+    """
+    Gets the default directory of BakePy's local caches.
+
+    Returns
+    -------
+    directory: Path
+        The BAKEPY_CACHE_DIR environment variable if set, otherwise bakepy under XDG_CACHE_HOME (by default, ~/.cache/bakepy).
+    """
+    directory = os.environ.get("BAKEPY_CACHE_DIR")
+    if directory:
+        return Path(directory)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "bakepy"
+
+LINK_REGEX = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+ATTR_REGEX = re.compile(r"""([\w:-]+)\s*=\s*(["'])(.*?)\2""", re.DOTALL)
+CLASS_ATTR_REGEX = re.compile(r"""\bclass\s*=\s*(["'])(.*?)\1""", re.IGNORECASE | re.DOTALL)
+CSS_URL_REGEX = re.compile(r"""url\(\s*(["']?)(.*?)\1\s*\)""")
+CSS_CLASS_REGEX = re.compile(r"\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)")
+CSS_NOT_REGEX = re.compile(r":not\([^()]*\)")
+FONT_FACE_SRC_REGEX = re.compile(r"(@font-face\s*\{[^}]*?\bsrc\s*:)([^;}]*)", re.IGNORECASE)
+
+#MIME types of the files referenced by stylesheets, which older versions of mimetypes do not know.
+CSS_ASSET_TYPES = {
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+    ".otf": "font/otf",
+    ".eot": "application/vnd.ms-fontobject",
+    ".svg": "image/svg+xml",
+}
+
+#At-rules whose blocks contain style rules that can be pruned. Any other block (@font-face, @keyframes...) is kept as-is.
+PRUNABLE_AT_RULES = ("@media", "@supports", "@layer", "@container")
+
+def check_integrity(data, integrity):
+    """
+    Checks data against a Subresource Integrity attribute (for example, "sha384-...").
+
+    Parameters
+    ----------
+    data: bytes
+        The contents to check.
+    integrity: str
+        The integrity attribute. May hold several space separated hashes, any of which can match.
+    Returns
+    -------
+    valid: bool
+        True if any of the hashes matches the data.
+    """
+    for value in integrity.split():
+        algorithm, _, expected = value.partition("-")
+        if algorithm not in ("sha256", "sha384", "sha512"):
+            continue
+        digest = base64.b64encode(hashlib.new(algorithm, data).digest()).decode("ascii")
+        if digest == expected:
+            return True
+    return False
+
+class StylesheetCache:
+    """
+    A local, integrity-checked cache of remote stylesheets.
+
+    Parameters
+    ----------
+    directory: str, default = None
+        The directory holding the cached stylesheets. If None, uses the stylesheets directory of get_cache_dir().
+    timeout: float, default = 30
+        The timeout in seconds of each download.
+
+    Notes
+    ----------
+        Stylesheets can be added manually with add(), for example to prepare the cache of a machine without network access.
+    """
+    def __init__(self, directory = None, timeout = DEFAULT_TIMEOUT):
+        if directory is None:
+            directory = get_cache_dir() / "stylesheets"
+        self.directory = Path(directory).absolute()
+        self.timeout = timeout
+
+    def _path(self, url):
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        return self.directory / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}{extension if extension in CSS_ASSET_TYPES else '.css'}"
+
+    def add(self, url, data, integrity = None):
+        """
+        Stores a stylesheet in the cache.
+
+        Parameters
+        ----------
+        url: str
+            The URL of the stylesheet.
+        data: bytes
+            The contents of the stylesheet.
+        integrity: str, default = None
+            If provided, the data is checked against it before being stored.
+        """
+        if integrity and not check_integrity(data, integrity):
+            raise Exception(f"The contents of {url} do not match its integrity hash.")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(url))
+
+    def get(self, url, integrity = None):
+        """
+        Gets a stylesheet, downloading it if it is not cached.
+
+        Parameters
+        ----------
+        url: str
+            The URL of the stylesheet.
+        integrity: str, default = None
+            If provided, both cached and downloaded contents are checked against it.
+        Returns
+        -------
+        css: str
+            The contents of the stylesheet.
+        """
+        return self.get_data(url, integrity).decode("utf-8")
+
+    def get_data(self, url, integrity = None):
+        """
+        Gets a stylesheet or a file it references (for example, a font), downloading it if it is not cached.
+
+        Parameters
+        ----------
+        url: str
+            The URL of the file.
+        integrity: str, default = None
+            If provided, both cached and downloaded contents are checked against it.
+        Returns
+        -------
+        data: bytes
+            The contents of the file.
+        """
+        try:
+            with open(self._path(url), "rb") as f:
+                data = f.read()
+            if not integrity or check_integrity(data, integrity):
+                return data
+            warnings.warn(f"The cached copy of {url} does not match its integrity hash. Downloading it again.")
+        except OSError:
+            pass
+
+        _, data = fetch_url(url, self.timeout)
+        self.add(url, data, integrity)
+        return data
+
+def get_link_attrs(link):
+    """
+    Gets the attributes of a <link> tag as a dictionary.
+    """
+    return {m.group(1).lower(): m.group(3) for m in ATTR_REGEX.finditer(link)}
+
+def get_used_classes(html, classes = None):
+    """
+    Collects the classes used in the class attributes of an HTML string.
+
+    Parameters
+    ----------
+    html: str
+        The HTML string.
+    classes: set, default = None
+        A set to add the classes to. If None, a new set is created.
+    Returns
+    -------
+    classes: set
+        The used classes.
+    """
+    if classes is None:
+        classes = set()
+    for m in CLASS_ATTR_REGEX.finditer(html):
+        classes.update(m.group(2).split())
+    return classes
+
+def _split_selectors(selector):
+    """
+    Splits a selector list by its top-level commas.
+    """
+    parts = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(selector):
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(selector[start:i])
+            start = i + 1
+    parts.append(selector[start:])
+    return parts
+
+def _selector_is_used(selector, used_classes):
+    required = CSS_CLASS_REGEX.findall(CSS_NOT_REGEX.sub("", re.sub(r"\[[^\]]*\]", "", selector)))
+    return all(c in used_classes for c in required)
+
+def _find_block_end(css, start):
+    """
+    Finds the position after the closing brace of the block opened at css[start].
+    """
+    depth = 0
+    i = start
+    n = len(css)
+    while i < n:
+        c = css[i]
+        if c in "\"'":
+            i = css.find(c, i + 1)
+            if i == -1:
+                return n
+        elif c == "/" and css.startswith("/*", i):
+            i = css.find("*/", i + 2)
+            if i == -1:
+                return n
+            i += 1
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+def prune_css(css, used_classes):
+    """
+    Removes the style rules whose selectors need classes that are not used.
+
+    Parameters
+    ----------
+    css: str
+        The stylesheet.
+    used_classes: set
+        The classes used by the document.
+    Returns
+    -------
+    css: str
+        The pruned stylesheet.
+
+    Notes
+    ----------
+        A selector is kept if every class it requires (outside :not() and attribute selectors) is used.
+        Selectors without classes, such as element or :root selectors, are always kept.
+    """
+    out = []
+    i = 0
+    n = len(css)
+    while i < n:
+        #Skip whitespace and comments
+        if css[i].isspace():
+            i += 1
+            continue
+        if css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+
+        brace = css.find("{", i)
+        semicolon = css.find(";", i)
+        #Statements without a block, such as @charset or @import.
+        if css[i] == "@" and semicolon != -1 and (brace == -1 or semicolon < brace):
+            out.append(css[i:semicolon + 1])
+            i = semicolon + 1
+            continue
+        if brace == -1:
+            break
+
+        prelude = css[i:brace].strip()
+        end = _find_block_end(css, brace)
+        body = css[brace + 1:end - 1]
+
+        if prelude.startswith("@"):
+            if prelude.lower().startswith(PRUNABLE_AT_RULES):
+                inner = prune_css(body, used_classes)
+                if inner:
+                    out.append(f"{prelude}{{{inner}}}")
+            else:
+                out.append(css[i:end])
+        else:
+            selectors = [s for s in _split_selectors(prelude) if _selector_is_used(s, used_classes)]
+            if selectors:
+                out.append(f"{','.join(selectors)}{{{body}}}")
+        i = end
+    return "".join(out)
+
+def absolutize_css_urls(css, base_url):
+    """
+    Rewrites the relative url() references of a stylesheet (for example, fonts) so they keep working once it is inlined.
+    """
+    def absolutize(match):
+        url = match.group(2)
+        if url.startswith(("data:", "#")) or check_is_url(url):
+            return match.group(0)
+        return f"url({match.group(1)}{urljoin(base_url, url)}{match.group(1)})"
+    return CSS_URL_REGEX.sub(absolutize, css)
+
+def _keep_first_font_source(match):
+    sources = _split_selectors(match.group(2))
+    for source in sources:
+        if "url(" in source:
+            return f"{match.group(1)}{source.strip()}"
+    return match.group(0)
+
+def inline_css_urls(css, cache = None, write = None):
+    """
+    Replaces the remote url() references of a stylesheet (for example, fonts) with local copies, so it works without network access.
+
+    Parameters
+    ----------
+    css: str
+        The stylesheet.
+    cache: StylesheetCache, default = None
+        The cache used to download the referenced files. If None, uses the default cache.
+    write: function, default = None
+        A function taking the contents and MIME type of a file and returning the URL to reference it by.
+        If None, files are embedded as base64 data URIs.
+    Returns
+    -------
+    css: str
+        The stylesheet with its remote references replaced.
+
+    Notes
+    ----------
+        Browsers use the first source of each @font-face they support, so only the first url() of each is kept (usually woff2).
+        References that cannot be retrieved are kept, with a warning.
+    """
+    if cache is None:
+        cache = StylesheetCache()
+    css = FONT_FACE_SRC_REGEX.sub(_keep_first_font_source, css)
+    urls = dict()
+
+    def inline(match):
+        url = match.group(2)
+        if not check_is_url(url):
+            return match.group(0)
+        if url not in urls:
+            extension = os.path.splitext(urlparse(url).path)[1].lower()
+            data_type = CSS_ASSET_TYPES.get(extension) or mimetypes.guess_type(url)[0] or "application/octet-stream"
+            try:
+                data = cache.get_data(url)
+            except Exception as e:
+                warnings.warn(f"Could not retrieve {url}, so the stylesheet keeps referencing it: {e}")
+                urls[url] = url
+            else:
+                if write is None:
+                    urls[url] = f"data:{data_type};base64,{base64.b64encode(data).decode('ascii')}"
+                else:
+                    urls[url] = write(data, data_type)
+        return f"url({match.group(1)}{urls[url]}{match.group(1)})"
+    return CSS_URL_REGEX.sub(inline, css)
+
+def get_stylesheet_css(link, cache = None):
+    """
+    Gets the contents of the stylesheet referenced by a <link> tag.
+
+    Parameters
+    ----------
+    link: str
+        The <link> tag.
+    cache: StylesheetCache, default = None
+        The cache used for remote stylesheets. If None, uses the default cache.
+    Returns
+    -------
+    css: str
+        The contents of the stylesheet, or None if the tag does not reference a stylesheet.
+    """
+    attrs = get_link_attrs(link)
+    if "stylesheet" not in attrs.get("rel", "").lower().split() or "href" not in attrs:
+        return None
+    href = attrs["href"]
+
+    if check_is_url(href):
+        if cache is None:
+            cache = StylesheetCache()
+        css = cache.get(href, attrs.get("integrity"))
+        return absolutize_css_urls(css, href)
+
+    with open(href, "r", encoding="utf-8") as f:
+        return f.read()
+
+def embed_links(html, cache = None, used_classes = None):
+    """
+    Replaces the stylesheet <link> tags of an HTML string with <style> tags holding their contents.
+
+    Parameters
+    ----------
+    html: str
+        The HTML string, usually the document's head.
+    cache: StylesheetCache, default = None
+        The cache used for remote stylesheets. If None, uses the default cache.
+    used_classes: set, default = None
+        If provided, the stylesheets are pruned to the rules that apply to these classes.
+    Returns
+    -------
+    html: str
+        The HTML string with the stylesheets embedded.
+
+    Notes
+    ----------
+        Stylesheets that cannot be retrieved are kept as links, with a warning.
+        The fonts and other files referenced by remote stylesheets are embedded as well. See inline_css_urls().
+    """
+    if cache is None:
+        cache = StylesheetCache()
+
+    def embed(match):
+        try:
+            css = get_stylesheet_css(match.group(0), cache)
+        except Exception as e:
+            warnings.warn(f"Could not embed the stylesheet {match.group(0)}: {e}")
+            return match.group(0)
+        if css is None:
+            return match.group(0)
+        if used_classes is not None:
+            css = prune_css(css, used_classes)
+        return f"<style>{inline_css_urls(css, cache)}</style>"
+    return LINK_REGEX.sub(embed, html)
+
+def link_stylesheets(html, writer, cache = None, used_classes = None):
+    """
+    Replaces the stylesheet <link> tags of an HTML string with links to copies of the stylesheets written by an asset writer.
+
+    Parameters
+    ----------
+    html: str
+        The HTML string, usually the document's head.
+    writer: AssetWriter
+        The writer of the stylesheet files.
+    cache: StylesheetCache, default = None
+        The cache used for remote stylesheets. If None, uses the default cache.
+    used_classes: set, default = None
+        If provided, the stylesheets are pruned to the rules that apply to these classes.
+    Returns
+    -------
+    html: str
+        The HTML string with the stylesheets linked.
+
+    Notes
+    ----------
+        Stylesheets that cannot be retrieved keep their original link, with a warning.
+        The fonts and other files referenced by remote stylesheets are written by the asset writer as well. See inline_css_urls().
+    """
+    if cache is None:
+        cache = StylesheetCache()
+
+    def write(data, data_type):
+        #Stylesheets are written to the same directory, and their references are relative to it.
+        return writer.write_data(data, data_type).rsplit("/", 1)[-1]
+
+    def link(match):
+        try:
+            css = get_stylesheet_css(match.group(0), cache)
+        except Exception as e:
+            warnings.warn(f"Could not write the stylesheet {match.group(0)}: {e}")
+            return match.group(0)
+        if css is None:
+            return match.group(0)
+        if used_classes is not None:
+            css = prune_css(css, used_classes)
+        return f"""<link rel="stylesheet" href="{writer.write_data(inline_css_urls(css, cache, write), "text/css")}">"""
+    return LINK_REGEX.sub(link, html)
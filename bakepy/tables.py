@@ -0,0 +1,433 @@
+import json
+import gzip
+import base64
+import struct
+
+import numpy as np
+import pandas as pd
+
+from html import escape
+
+from .utils import as_list
+
+DEFAULT_LARGE_TABLE_THRESHOLD = 10000
+DEFAULT_PAGE_SIZE = 10000
+DEFAULT_ROW_HEIGHT = 33
+DEFAULT_MAX_HEIGHT = 600
+DEFAULT_COMPRESS_LEVEL = 1
+
+#Decompresses the table data and renders the visible rows of the current page.
+#Placed right after the table's <div>, which it finds through document.currentScript.
+LARGE_TABLE_SCRIPT = """<script>
+(function(root){
+  var payload = root.querySelector(".bakepy-table-data").textContent.trim();
+  var bytes = Uint8Array.from(atob(payload), function(c){ return c.charCodeAt(0); });
+  var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+  new Response(stream).arrayBuffer().then(function(buffer){
+    var headerLength = new DataView(buffer).getUint32(0, true);
+    var data = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    function column(spec){
+      if (spec.kind === "str"){
+        return function(i){ var v = spec.values[i]; return v === null ? data.na_rep : v; };
+      }
+      var values = new Float64Array(buffer, spec.offset, data.rows);
+      return function(i){ var v = values[i]; return isNaN(v) ? data.na_rep : v.toFixed(spec.precision); };
+    }
+    var cols = data.columns.map(column), idx = data.index ? column(data.index) : null, n = data.rows;
+    var pageSize = +root.dataset.pageSize, rowHeight = +root.dataset.rowHeight;
+    var pages = Math.max(1, Math.ceil(n / pageSize)), page = 0;
+    var scroll = root.querySelector(".bakepy-table-scroll"), tbody = root.querySelector("tbody");
+    var info = root.querySelector(".bakepy-table-info"), ncols = cols.length + (idx ? 1 : 0);
+    function spacer(h){
+      var tr = document.createElement("tr"), td = document.createElement("td");
+      td.colSpan = ncols; td.style.cssText = "height:" + h + "px;padding:0;border:0;";
+      tr.appendChild(td); return tr;
+    }
+    function row(i){
+      var tr = document.createElement("tr");
+      tr.style.height = rowHeight + "px";
+      if (idx){ var th = document.createElement("th"); th.textContent = idx(i); tr.appendChild(th); }
+      for (var j = 0; j < cols.length; j++){ var td = document.createElement("td"); td.textContent = cols[j](i); tr.appendChild(td); }
+      return tr;
+    }
+    function draw(){
+      var start = page * pageSize, end = Math.min(n, start + pageSize);
+      var first = Math.min(end, start + Math.max(0, Math.floor(scroll.scrollTop / rowHeight) - 10));
+      var last = Math.min(end, first + Math.ceil(scroll.clientHeight / rowHeight) + 20);
+      var rows = [spacer((first - start) * rowHeight)];
+      for (var i = first; i < last; i++){ rows.push(row(i)); }
+      rows.push(spacer((end - last) * rowHeight));
+      tbody.replaceChildren.apply(tbody, rows);
+      info.textContent = "Rows " + (n ? start + 1 : 0) + "-" + end + " of " + n + " (page " + (page + 1) + " of " + pages + ")";
+    }
+    var pending = false;
+    scroll.addEventListener("scroll", function(){
+      if (!pending){ pending = true; requestAnimationFrame(function(){ pending = false; draw(); }); }
+    });
+    root.querySelectorAll("[data-page]").forEach(function(button){
+      button.addEventListener("click", function(){
+        page = Math.min(pages - 1, Math.max(0, page + (button.dataset.page === "next" ? 1 : -1)));
+        scroll.scrollTop = 0; draw();
+      });
+    });
+    draw();
+  });
+})(document.currentScript.previousElementSibling);
+</script>"""
+
+def _format_labels(labels):
+    """
+    Formats index/column labels, joining the levels of MultiIndex labels.
+    """
+    return [" / ".join(map(str, l)) if isinstance(l, tuple) else str(l) for l in labels]
+
+def _encode_column(series, blobs, offset, float_format = None):
+    """
+    Encodes a column for the large table payload.
+
+    Numeric columns are stored as little-endian float64 arrays, appended to blobs, which the browser reads without parsing.
+    Any other column is stored as a list of strings.
+
+    Returns
+    -------
+    spec: dict
+        The description of the column included in the payload's header.
+    offset: int
+        The offset after the column's binary data.
+    """
+    kind = series.dtype.kind
+    if kind in "iuf" and not (kind == "f" and float_format is not None):
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        #Integers that do not fit in a float64 are kept as strings.
+        if kind == "f" or len(values) == 0 or np.nanmax(np.abs(values)) < 2**53:
+            blobs.append(values.astype("<f8").tobytes())
+            precision = pd.get_option("display.precision") if kind == "f" else 0
+            spec = {"kind": "num", "offset": offset, "precision": precision}
+            return spec, offset + len(blobs[-1])
+
+    if float_format is not None and kind == "f":
+        values = series.map(float_format).tolist()
+    else:
+        values = series.astype(str).tolist()
+    for i in np.flatnonzero(series.isna().to_numpy()):
+        values[i] = None
+    return {"kind": "str", "values": values}, offset
+
+def _encode_table(df, index = True, na_rep = "NaN", float_format = None):
+    """
+    Encodes the data of a dataframe as a gzip compressed binary payload.
+
+    The payload holds a 4 byte header length, a JSON header and the binary data of the numeric columns, aligned to 8 bytes.
+    """
+    columns = [df.iloc[:, j] for j in range(df.shape[1])]
+    if index:
+        columns = [df.index.to_series(index=range(len(df)))] + columns
+
+    #Numeric columns are encoded first to a list of blobs, at offsets that are only final once the header size is known.
+    blobs = []
+    specs = []
+    offset = 0
+    for c in columns:
+        spec, offset = _encode_column(c, blobs, offset, float_format)
+        specs.append(spec)
+
+    def get_header(data_start):
+        shifted = [dict(spec, offset=spec["offset"] + data_start) if spec["kind"] == "num" else spec for spec in specs]
+        header = {
+            "rows": len(df),
+            "na_rep": na_rep,
+            "index": shifted[0] if index else None,
+            "columns": shifted[1:] if index else shifted,
+        }
+        return json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    #The offsets change the header's length, so iterate until the data start is stable.
+    data_start = 0
+    while True:
+        header = get_header(data_start)
+        new_start = 4 + len(header)
+        new_start += -new_start % 8
+        if new_start == data_start:
+            break
+        data_start = new_start
+
+    padding = b"\0" * (data_start - 4 - len(header))
+    return gzip.compress(struct.pack("<I", len(header)) + header + padding + b"".join(blobs), compresslevel=DEFAULT_COMPRESS_LEVEL)
+
+def _str_classes(classes):
+    """
+    Gets the class attribute of a table, whose classes may be given as a string, a list or a tuple like in df.to_html().
+    """
+    if classes is None:
+        classes = []
+    elif isinstance(classes, str):
+        classes = as_list(classes)
+    return " ".join(["dataframe"] + list(classes))
+
+def get_large_table_html(df, caption = None, classes = ["table", "table-bordered"], justify = "left", index = True,
+                         page_size = DEFAULT_PAGE_SIZE, row_height = DEFAULT_ROW_HEIGHT, max_height = DEFAULT_MAX_HEIGHT,
+                         na_rep = "NaN", float_format = None):
+    """
+    Renders a dataframe as a table whose rows are rendered by the browser as they are scrolled into view.
+
+    Parameters
+    ----------
+    df: DataFrame
+        The dataframe to render.
+    caption: str, default = None
+        The table's caption.
+    classes: list/str, default = ["table", "table-bordered"]
+        The classes to apply to the HTML table generated.
+    justify: str, default="left"
+        The justification for the table's header.
+    index: bool, default=True
+        If True, adds the index to the table.
+    page_size: int, default = 10000
+        The number of rows of each page.
+    row_height: int, default = 33
+        The height in pixels of each row. Cells do not wrap so that every row has this height.
+    max_height: int, default = 600
+        The height in pixels of the scrollable area.
+    na_rep: str, default = "NaN"
+        The representation of missing values.
+    float_format: function, default = None
+        A function used to format floating point values.
+    Returns
+    -------
+    repr: str
+        An HTML string.
+
+    Notes
+    ----------
+        The data is embedded compressed and by columns: numeric columns as binary arrays (shown with pandas' display.precision) and any other column as strings.
+    """
+    payload = base64.b64encode(_encode_table(df, index, na_rep, float_format)).decode("ascii")
+
+    header = "".join(f"<th>{escape(c)}</th>" for c in _format_labels(df.columns))
+    if index:
+        header = f"<th>{escape(str(df.index.name or ''))}</th>" + header
+
+    str_caption = ""
+    if caption is not None:
+        str_caption = f"""\n  <caption class="text-center">{caption}</caption>"""
+
+    return f"""<div class="bakepy-table" data-page-size="{page_size}" data-row-height="{row_height}">
+  <div class="d-flex justify-content-between align-items-center mb-2">
+    <small class="bakepy-table-info text-muted"></small>
+    <div class="btn-group btn-group-sm">
+      <button type="button" class="btn btn-outline-secondary" data-page="prev">&laquo;</button>
+      <button type="button" class="btn btn-outline-secondary" data-page="next">&raquo;</button>
+    </div>
+  </div>
+  <div class="bakepy-table-scroll" style="max-height:{max_height}px;overflow-y:auto;white-space:nowrap;">
+    <table class="{_str_classes(classes)}">
+      <thead><tr style="text-align: {justify};">{header}</tr></thead>{str_caption}
+      <tbody></tbody>
+    </table>
+  </div>
+  <script type="application/octet-stream" class="bakepy-table-data">{payload}</script>
+</div>
+{LARGE_TABLE_SCRIPT}"""
+
+#Options of df.to_html() supported by write_table_html(). Any other option falls back to df.to_html().
+TABLE_WRITER_OPTIONS = ("na_rep", "float_format", "escape")
+
+#Control characters shown escaped by df.to_html().
+ESCAPED_CHARACTERS = str.maketrans({"\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+#Kinds of numpy dtypes supported by write_table_html(). Any other dtype (for example, complex) falls back to df.to_html().
+SUPPORTED_KINDS = "fiubOMm"
+
+#Cache of the formatting function resolved for each dtype.
+_FORMATTER_CACHE = dict()
+
+def _escape_values(values):
+    """
+    Escapes a list of strings for HTML, skipping the work when none of them needs it.
+    """
+    if any("&" in v or "<" in v or ">" in v for v in values):
+        return [escape(v, quote=False) for v in values]
+    return values
+
+def _get_float_format_function(float_format):
+    """
+    Gets the function of a float_format, which may be a function or a format string such as "%.2f".
+    """
+    return float_format.__mod__ if isinstance(float_format, str) else float_format
+
+def _trim_float_zeros(values, mask):
+    """
+    Trims the maximum number of trailing zeros equally from every formatted value, leaving at least one decimal, like pandas.
+    Values where mask is True (missing or infinite) are not considered nor trimmed.
+    """
+    strings = np.array(values)[~mask]
+    if len(strings) == 0:
+        return values
+    decimals = len(strings[0]) - strings[0].find(".") - 1
+    trim = 0
+    while trim < decimals - 1 and np.char.endswith(strings, "0" * (trim + 1)).all():
+        trim += 1
+    if trim == 0:
+        return values
+    return [v if m else v[:-trim] for v, m in zip(values, mask)]
+
+def _format_float_column(values, mask, na_rep, float_format):
+    """
+    Formats a float column like df.to_html(): with pandas' display.precision, trimming zeros equally and switching to scientific notation for very small/large values.
+    """
+    if float_format is not None:
+        float_format = _get_float_format_function(float_format)
+        values = [na_rep if m else float_format(v) for v, m in zip(values.tolist(), mask)]
+        return values, False
+
+    precision = pd.get_option("display.precision")
+    floats = values.tolist()
+    formatted = [na_rep if m else f"{v:.{precision}f}" for v, m in zip(floats, mask)]
+
+    #Infinite values are formatted as "inf", so they do not count towards the number of decimals.
+    finite = np.isfinite(values)
+    formatted = _trim_float_zeros(formatted, ~finite)
+
+    abs_values = np.abs(values[finite])
+    too_long = max((len(v) for v in formatted), default=0) > precision + 6
+    has_large_values = (abs_values > 1e6).any()
+    has_small_values = ((abs_values < 10 ** -precision) & (abs_values > 0)).any()
+    if has_small_values or (too_long and has_large_values):
+        return [na_rep if m else f"{v:.{precision}e}" for v, m in zip(floats, mask)], False
+    return formatted, False
+
+def _format_int_column(values, mask, na_rep, float_format):
+    return values.astype(str).tolist(), False
+
+def _format_bool_column(values, mask, na_rep, float_format):
+    return np.where(values, "True", "False").tolist(), False
+
+def _format_object_column(series, mask, na_rep, float_format):
+    formatted = series.astype(str).tolist()
+    values = series.array
+    if series.dtype == object:
+        if float_format is not None:
+            float_format = _get_float_format_function(float_format)
+            for i, value in enumerate(values):
+                if isinstance(value, float) and value == value:
+                    formatted[i] = float_format(value)
+        for i, value in enumerate(values):
+            #astype(str) decodes bytes, while df.to_html() shows their representation.
+            if isinstance(value, bytes):
+                formatted[i] = str(value)
+    for i in np.flatnonzero(mask):
+        #Like df.to_html(), na_rep only replaces NaN. None, NA and NaT are shown as such.
+        value = values[i]
+        formatted[i] = na_rep if isinstance(value, float) and value != value else str(value)
+    if any("\t" in v or "\n" in v or "\r" in v for v in formatted):
+        formatted = [v.translate(ESCAPED_CHARACTERS) for v in formatted]
+    return formatted, True
+
+#Formatting functions of numpy dtype kinds. Each returns the formatted strings and whether they need escaping.
+COLUMN_FORMATTERS = {
+    "f": _format_float_column,
+    "i": _format_int_column,
+    "u": _format_int_column,
+    "b": _format_bool_column,
+}
+
+def _get_column_formatter(dtype):
+    """
+    Gets the formatting function of a dtype. Extension dtypes (for example, nullable integers) are formatted as objects.
+    """
+    try:
+        return _FORMATTER_CACHE[dtype]
+    except KeyError:
+        kind = dtype.kind if isinstance(dtype, np.dtype) else None
+        formatter = _FORMATTER_CACHE[dtype] = COLUMN_FORMATTERS.get(kind, _format_object_column)
+        return formatter
+
+def _format_column(series, na_rep = "NaN", float_format = None, escape_html = True):
+    """
+    Formats every value of a column at once.
+    """
+    formatter = _get_column_formatter(series.dtype)
+    if formatter is _format_object_column:
+        #Other dtypes use pandas' string conversion, which formats dates and categories like df.to_html().
+        formatted, needs_escaping = formatter(series, series.isna().to_numpy(), na_rep, float_format)
+    else:
+        values = series.to_numpy()
+        mask = np.isnan(values) if formatter is _format_float_column else None
+        formatted, needs_escaping = formatter(values, mask, na_rep, float_format)
+    if needs_escaping and escape_html:
+        formatted = _escape_values(formatted)
+    return formatted
+
+def can_write_table_html(df, options):
+    """
+    Checks whether write_table_html() supports a dataframe and a set of df.to_html() options.
+    """
+    if not (df.shape[1] > 0 and not isinstance(df.index, pd.MultiIndex) and not isinstance(df.columns, pd.MultiIndex)
+            and df.columns.name is None and all(k in TABLE_WRITER_OPTIONS for k in options)):
+        return False
+    for dtype in list(df.dtypes) + [df.index.dtype]:
+        if isinstance(dtype, np.dtype):
+            if dtype.kind not in SUPPORTED_KINDS:
+                return False
+        elif dtype.kind == "c" or (dtype.kind == "f" and options.get("float_format") is not None):
+            #Extension float dtypes (for example, Float64 or sparse floats) are formatted as objects, which ignores float_format.
+            return False
+    return True
+
+def write_table_html(df, caption = None, classes = ["table", "table-bordered"], justify = "left", index = True,
+                     na_rep = "NaN", float_format = None, escape = True):
+    """
+    Renders a dataframe as an HTML table, formatting each column at once instead of cell by cell.
+
+    Parameters
+    ----------
+    df: DataFrame
+        The dataframe to render. Must not have MultiIndex index/columns or named columns.
+    caption: str, default = None
+        The table's caption.
+    classes: list/str, default = ["table", "table-bordered"]
+        The classes to apply to the HTML table generated.
+    justify: str, default="left"
+        The justification for the table's header.
+    index: bool, default=True
+        If True, adds the index to the table.
+    na_rep: str, default = "NaN"
+        The representation of missing values.
+    float_format: function/str, default = None
+        A function or format string used to format floating point values.
+    escape: bool, default = True
+        If True, escapes the characters <, > and & of the values and labels.
+    Returns
+    -------
+    repr: str
+        An HTML string, with the same markup as df.to_html().
+    """
+    escape_html = escape
+    cell_columns = [[f"      <td>{v}</td>" for v in _format_column(df.iloc[:, j], na_rep, float_format, escape_html)]
+                    for j in range(df.shape[1])]
+    labels = [str(c) for c in df.columns]
+    if escape_html:
+        labels = _escape_values(labels)
+    header = [f"      <th>{c}</th>" for c in labels]
+
+    if index:
+        index_labels = _format_column(df.index.to_series(index=range(len(df))), na_rep, None, escape_html)
+        cell_columns.insert(0, [f"      <th>{v}</th>" for v in index_labels])
+        header.insert(0, "      <th></th>")
+
+    lines = [f'<table border="1" class="{_str_classes(classes)}">', "  <thead>", f'    <tr style="text-align: {justify};">']
+    lines.extend(header)
+    lines.append("    </tr>")
+    if index and df.index.name is not None:
+        name = str(df.index.name)
+        lines.extend(["    <tr>", f"      <th>{_escape_values([name])[0] if escape_html else name}</th>"])
+        lines.extend(["      <th></th>"] * df.shape[1])
+        lines.append("    </tr>")
+    lines.append("  </thead>")
+    if caption is not None:
+        lines.append(f"""  <caption class="text-center">{caption}</caption>""")
+    lines.append("  <tbody>")
+    lines.extend("    <tr>\n" + "\n".join(row) + "\n    </tr>" for row in zip(*cell_columns))
+    lines.append("  </tbody>")
+    lines.append("</table>")
+    return "\n".join(lines)
@@ -1,7 +1,16 @@
 import os
+import re
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+import warnings
 import mimetypes
 import requests
 
+from concurrent.futures import ThreadPoolExecutor
+
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -53,19 +62,227 @@ def check_is_url(s):
     except:
         return False
 
-def get_image_data(path):
+DEFAULT_TIMEOUT = 30
+DEFAULT_FETCH_WORKERS = 8
+
+_SESSION = None
+_SESSION_POOL_SIZE = 0
+_SESSION_LOCK = threading.Lock()
+
+def get_session(pool_size = None):
+    """
+    Gets the pooled HTTP session shared by all remote requests.
+
+    Parameters
+    ----------
+    pool_size: int, default = None
+        The number of concurrent requests per host to keep connections for. The pool grows to the largest size requested,
+        so callers making requests from several threads should pass their number of workers. The pool holds at least 8.
+    """
+    global _SESSION, _SESSION_POOL_SIZE
+    pool_size = max(pool_size or 0, DEFAULT_FETCH_WORKERS)
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+        if pool_size > _SESSION_POOL_SIZE:
+            #Requests in progress keep using the connections of the previous adapter.
+            adapter = requests.adapters.HTTPAdapter(pool_connections=DEFAULT_FETCH_WORKERS, pool_maxsize=pool_size)
+            _SESSION.mount("http://", adapter)
+            _SESSION.mount("https://", adapter)
+            _SESSION_POOL_SIZE = pool_size
+        return _SESSION
+
+class HTTPCache:
+    """
+    A directory-based cache of remote files, revalidated with their ETag/Last-Modified headers.
+
+    Parameters
+    ----------
+    directory: str
+        The directory holding the cached files. Created if it does not exist.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory).absolute()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.data", self.directory / f"{key}.json"
+
+    def get(self, url):
+        """
+        Gets a cached file.
+
+        Returns
+        -------
+        meta: dict
+            The content type and validators of the file.
+        data: bytes
+            The file contents.
+        """
+        data_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, data
+
+    def set(self, url, meta, data):
+        """
+        Stores a file in the cache.
+        """
+        data_path, meta_path = self._paths(url)
+        try:
+            for path, content in [(data_path, data), (meta_path, json.dumps(meta).encode("utf-8"))]:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        except OSError:
+            warnings.warn(f"Could not write to the HTTP cache at {self.directory}.")
+
+def fetch_url(url, timeout = DEFAULT_TIMEOUT, http_cache = None):
+    """
+    Downloads a remote file through the pooled session.
+
+    Parameters
+    ----------
+    url: str
+        The URL of the file.
+    timeout: float, default = 30
+        The timeout of the request in seconds.
+    http_cache: HTTPCache/str, default = None
+        A cache (or the directory of one) used to avoid downloading unchanged files again.
+    Returns
+    -------
+    content_type: str
+        The MIME type reported by the server, if any.
+    data: bytes
+        The file contents.
+    """
+    if http_cache is not None and not isinstance(http_cache, HTTPCache):
+        http_cache = HTTPCache(http_cache)
+
+    headers = {}
+    cached = None
+    if http_cache is not None:
+        cached = http_cache.get(url)
+        if cached is not None:
+            meta = cached[0]
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get_session().get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and cached is not None:
+        return cached[0].get("content_type"), cached[1]
+
+    response.raise_for_status()
+
+    content_type = response.headers.get("Content-Type")
+    if content_type is not None:
+        content_type = content_type.split(";")[0].strip()
+
+    if http_cache is not None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            http_cache.set(url, {"content_type": content_type, "etag": etag, "last_modified": last_modified}, response.content)
+
+    return content_type, response.content
+
+def get_image_data(path, timeout = DEFAULT_TIMEOUT, http_cache = None):
     #Get image type
     img_type = mimetypes.guess_type(path)[0]
 
     #Handle remote images.
     if check_is_url(path):
-        img_data = requests.get(path).content
+        content_type, img_data = fetch_url(path, timeout, http_cache)
+        if img_type is None:
+            img_type = content_type
     else:
         with open(path, "rb") as file:
             img_data = file.read()
 
     return img_type, img_data
 
+def get_images_data(paths, workers = DEFAULT_FETCH_WORKERS, timeout = DEFAULT_TIMEOUT, http_cache = None):
+    """
+    Gets the data of several images, downloading the remote ones concurrently.
+
+    Parameters
+    ----------
+    paths: list
+        The paths (local or remote) to the image files.
+    workers: int, default = 8
+        The number of concurrent downloads.
+    timeout: float, default = 30
+        The timeout of each request in seconds.
+    http_cache: HTTPCache/str, default = None
+        A cache (or the directory of one) used to avoid downloading unchanged files again.
+    Returns
+    -------
+    images: dict
+        A dictionary from each path to its image type and data.
+    """
+    if http_cache is not None and not isinstance(http_cache, HTTPCache):
+        http_cache = HTTPCache(http_cache)
+
+    paths = list(dict.fromkeys(paths))
+    remote = [p for p in paths if check_is_url(p)]
+    images = dict()
+
+    if len(remote) > 1 and workers is not None and workers > 1:
+        get_session(workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {p: pool.submit(get_image_data, p, timeout, http_cache) for p in remote}
+            for p, future in futures.items():
+                images[p] = future.result()
+
+    for p in paths:
+        if p not in images:
+            images[p] = get_image_data(p, timeout, http_cache)
+    return images
+
+def get_data_uri(img_type, img_data):
+    return f"data:{img_type};base64,{str(base64.b64encode(img_data),'utf-8')}"
+
+IMG_SRC_REGEX = re.compile(r"""(<img\b[^>]*?\bsrc\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+
+def embed_image_srcs(html, **fetch_options):
+    """
+    Replaces the src of every <img> tag in an HTML string with its base64 embedded data.
+
+    Parameters
+    ----------
+    html: str
+        The HTML string.
+    fetch_options: dict
+        Keyword arguments used by get_images_data(), such as the number of workers, timeout and http_cache.
+
+    Notes
+    ----------
+        Works on partial documents (such as a single rendered fragment) since tags are not parsed into a tree.
+    """
+    matches = [m for m in IMG_SRC_REGEX.finditer(html) if not m.group(3).startswith('data:')]
+    if len(matches) == 0:
+        return html
+
+    images = get_images_data([m.group(3) for m in matches], **fetch_options)
+
+    def embed(match):
+        img_src = match.group(3)
+        #If image is already embedded, skip.
+        if img_src.startswith('data:'):
+            return match.group(0)
+        return f"{match.group(1)}{match.group(2)}{get_data_uri(*images[img_src])}{match.group(2)}"
+    return IMG_SRC_REGEX.sub(embed, html)
+
 class Working_Directory():
     def __init__(self, dirpath):
         self.dirpath = dirpath
@@ -0,0 +1,50 @@
+"""
+Compares laying out many small elements with Report.add_many against calling Report.add for each of them.
+
+Usage: python benchmarks/bench_add_many.py [--items 2000] [--ncols 3] [--size 4]
+"""
+import argparse
+import time
+
+from bakepy import Report
+
+def build_loop(items, ncols, size):
+    r = Report()
+    r.add_container("grid")
+    for i, x in enumerate(items):
+        r.add(x, size=size, new_row=(i % ncols == 0))
+    return r
+
+def build_many(items, ncols, size):
+    r = Report()
+    r.add_container("grid")
+    r.add_many(items, ncols=ncols, sizes=size)
+    return r
+
+def run(n_items = 2000, ncols = 3, size = 4, repeat = 3):
+    items = [f"<p>Plot {i}</p>" for i in range(n_items)]
+    results = {}
+    reports = {}
+    for mode, build in [("loop", build_loop), ("add_many", build_many)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reports[mode] = build(items, ncols, size)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results[mode] = {"seconds": best}
+    results["identical"] = reports["loop"].body.to_html() == reports["add_many"].body.to_html()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--ncols", type=int, default=3)
+    parser.add_argument("--size", type=int, default=4)
+    args = parser.parse_args()
+
+    results = run(args.items, args.ncols, args.size)
+    base = results["loop"]["seconds"]
+    for mode in ("loop", "add_many"):
+        print(f"{mode:>9}: {results[mode]['seconds']*1000:.1f}ms ({base/results[mode]['seconds']:.1f}x)")
+    print(f"identical output: {results['identical']}")
@@ -0,0 +1,60 @@
+"""
+Measures the memory retained by a report of matplotlib figures, with and without eager rendering, with tracemalloc.
+
+Usage: python benchmarks/bench_eager_render.py [--figures 100] [--points 20000] [--format png]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from bakepy import Report
+
+def build_report(n_figures, n_points, save_format, eager_render):
+    r = Report(eager_render=eager_render)
+    rng = np.random.default_rng(0)
+    for i in range(n_figures):
+        fig, ax = plt.subplots(figsize=(6, 4))
+        ax.plot(rng.normal(size=n_points).cumsum())
+        r.add(fig, caption=f"Figure {i}", save_format=save_format)
+        del fig, ax
+    return r
+
+def run(n_figures = 100, n_points = 20000, save_format = "png", eager_render = True):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    r = build_report(n_figures, n_points, save_format, eager_render)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    open_figures = len(plt.get_fignums())
+    plt.close("all")
+    del r
+
+    return {
+        "figures": n_figures,
+        "eager_render": eager_render,
+        "seconds": seconds,
+        "bytes": current,
+        "peak_bytes": peak,
+        "open_figures": open_figures,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--figures", type=int, default=100)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--format", default="png")
+    args = parser.parse_args()
+
+    for eager_render in (False, True):
+        res = run(args.figures, args.points, args.format, eager_render)
+        print(f"eager_render={eager_render}: {res['bytes'] / 2**20:.1f} MiB retained, peak {res['peak_bytes'] / 2**20:.1f} MiB, "
+              f"{res['open_figures']} open figures, built in {res['seconds']:.2f}s")
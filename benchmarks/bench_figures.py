@@ -0,0 +1,70 @@
+"""
+Measures how matplotlib figure serialization in Report.save_html scales with the number of worker processes.
+
+Usage: python benchmarks/bench_figures.py [--figures 200] [--workers 1 2 4] [--format svg]
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from bakepy import Report
+
+def build_report(n_figures, points = 2000, save_format = "svg"):
+    rng = np.random.default_rng(0)
+    r = Report()
+    for i in range(n_figures):
+        fig, ax = plt.subplots(figsize=(4, 3))
+        ax.plot(rng.standard_normal(points).cumsum())
+        ax.set_title(f"Figure {i}")
+        r.add(fig, size=4, new_row=(i % 3 == 0), save_format=save_format)
+        plt.close(fig)
+    return r
+
+def run(n_figures = 200, workers = (1, 2, 4), save_format = "svg", points = 2000):
+    results = {}
+    r = build_report(n_figures, points, save_format)
+
+    #Sending a figure to a worker costs at least its pickling, which has to be much cheaper than serializing it.
+    figures = [x for x, _ in r.body.iter_elements()]
+    start = time.perf_counter()
+    for fig in figures:
+        pickle.dumps(fig)
+    results["pickle"] = {"seconds": time.perf_counter() - start}
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "report.html")
+        for w in [None] + list(workers):
+            mode = "serial" if w is None else f"{w}_workers"
+            if w is not None and cpus <= 1:
+                #figure_workers is ignored on a single CPU, so the run would only time the serial path again.
+                results[mode] = {"skipped": "figure_workers is ignored on a single CPU"}
+                continue
+            start = time.perf_counter()
+            r.save_html(filename, prettify=False, scan_images=False, embed_links=False, figure_workers=w)
+            results[mode] = {"seconds": time.perf_counter() - start}
+    results["cpus"] = cpus
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--figures", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--format", default="svg")
+    parser.add_argument("--points", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run(args.figures, args.workers, args.format, args.points)
+    base = results["serial"]["seconds"]
+    print(f"{results.pop('cpus')} CPUs, pickling the figures takes {results.pop('pickle')['seconds']:.2f}s")
+    for mode, res in results.items():
+        if "skipped" in res:
+            print(f"{mode:>10}: skipped, {res['skipped']}")
+        else:
+            print(f"{mode:>10}: {res['seconds']:.2f}s ({base/res['seconds']:.1f}x)")
@@ -0,0 +1,75 @@
+"""
+Measures the markdown recipe, with and without LaTeX formulas, and the batch rendering of deferred markdown.
+
+Usage: python benchmarks/bench_markdown.py [--texts 200] [--repeat 3]
+"""
+import argparse
+import time
+
+from bakepy import Report
+from bakepy.recipes import get_html
+from bakepy.markdown_engine import FormulaCache, use_formula_cache
+
+def make_texts(n_texts, latex = False):
+    texts = []
+    for i in range(n_texts):
+        text = f"""
+        ## Section {i}
+
+        Some **bold** and *italic* text, a [link](https://example.com/{i}) and a list:
+
+        - First item {i}
+        - Second item {i}
+        """
+        if latex:
+            #Every formula is different, so none of them is found in the formula cache.
+            text += f"\n        The formula $`x_{{{i}}}^2 + \\frac{{{i}}}{{y}}`$ is inline.\n"
+        texts.append(text)
+    return texts
+
+def render_recipes(texts, latex):
+    return [get_html("markdown", text, latex=latex) for text in texts]
+
+def render_deferred(texts):
+    r = Report()
+    for text in texts:
+        r.recipe("markdown", text, latex=True, defer=True, new_row=False)
+    return r.body.to_html()
+
+def run(n_texts = 200, repeat = 3):
+    modes = {
+        "markdown": lambda: render_recipes(make_texts(n_texts), False),
+        "latex": lambda: render_recipes(make_texts(n_texts, True), True),
+        "latex_deferred": lambda: render_deferred(make_texts(n_texts, True)),
+    }
+    results = {}
+    for mode, f in modes.items():
+        best = None
+        for _ in range(repeat):
+            #A new in-memory formula cache per repetition, so formulas are always rendered by KaTeX.
+            with use_formula_cache(FormulaCache(directory=False)):
+                start = time.perf_counter()
+                f()
+                seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results[mode] = {"seconds": best, "ms_per_text": best / n_texts * 1e3}
+
+    #Formulas found in the formula cache.
+    cache = FormulaCache(directory=False)
+    texts = make_texts(n_texts, True)
+    with use_formula_cache(cache):
+        render_recipes(texts, True)
+        start = time.perf_counter()
+        render_recipes(texts, True)
+        seconds = time.perf_counter() - start
+    results["latex_cached"] = {"seconds": seconds, "ms_per_text": seconds / n_texts * 1e3}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for mode, res in run(args.texts, args.repeat).items():
+        print(f"{mode}: {res['seconds']:.3f}s ({res['ms_per_text']:.2f} ms/text)")
@@ -0,0 +1,49 @@
+"""
+Measures the memory used by the containers, rows and columns of a report with tracemalloc.
+
+Usage: python benchmarks/bench_node_memory.py [--cells 100000] [--ncols 4]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from bakepy import Report
+
+def build_report(n_cells, ncols):
+    r = Report()
+    r.add_container("grid")
+    #Every cell holds the same element, so only the nodes themselves are measured.
+    r.add_many(["<p>cell</p>"] * n_cells, ncols=ncols, sizes=12 // ncols)
+    return r
+
+def run(n_cells = 100000, ncols = 4):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    r = build_report(n_cells, ncols)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_rows = len(r.current_container.elements)
+    n_nodes = n_cells + n_rows
+    return {
+        "cells": n_cells,
+        "rows": n_rows,
+        "seconds": seconds,
+        "bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_node": current / n_nodes,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument("--ncols", type=int, default=4)
+    args = parser.parse_args()
+
+    res = run(args.cells, args.ncols)
+    print(f"{res['cells']} columns in {res['rows']} rows: {res['bytes'] / 2**20:.1f} MiB ({res['bytes_per_node']:.0f} bytes/node), "
+          f"peak {res['peak_bytes'] / 2**20:.1f} MiB, built in {res['seconds']:.2f}s")
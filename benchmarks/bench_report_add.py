@@ -0,0 +1,56 @@
+"""
+Measures how the cost of building a report with Report.add scales with its number of elements.
+
+Usage: python benchmarks/bench_report_add.py [--sizes 1000 10000 50000 100000] [--layout rows]
+"""
+import argparse
+import time
+
+from bakepy import Report
+
+LAYOUTS = ("rows", "cols", "containers")
+
+def build_report(n_elements, layout = "rows"):
+    r = Report()
+    for i in range(n_elements):
+        if layout == "rows":
+            #A new row for each element, all in the same container.
+            r.add(f"<p>{i}</p>")
+        elif layout == "cols":
+            #A new column for each element, all in the same row.
+            r.add(f"<p>{i}</p>", new_row=(i == 0))
+        else:
+            r.add_container(f"c{i}")
+            r.add(f"<p>{i}</p>")
+    return r
+
+def run(sizes = (1000, 10000, 50000, 100000), layout = "rows"):
+    if layout not in LAYOUTS:
+        raise Exception(f"Invalid layout {layout}. Valid layouts are: {list(LAYOUTS)}.")
+    results = {}
+    for n in sizes:
+        start = time.perf_counter()
+        r = build_report(n, layout)
+        seconds = time.perf_counter() - start
+
+        #Removing from the middle and moving the cursor around must not rescan the report either.
+        start = time.perf_counter()
+        if layout == "containers":
+            for i in range(0, n, max(n // 100, 1)):
+                r.set_current_container(f"c{i}")
+        else:
+            for _ in range(100):
+                r.remove_row(row_idx=0) if layout == "rows" else r.remove_col(col_idx=0)
+        cursor_seconds = time.perf_counter() - start
+
+        results[n] = {"seconds": seconds, "us_per_add": seconds / n * 1e6, "cursor_seconds": cursor_seconds}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--layout", default="rows", choices=LAYOUTS)
+    args = parser.parse_args()
+
+    for n, res in run(args.sizes, args.layout).items():
+        print(f"{n:>8} elements: {res['seconds']:.2f}s ({res['us_per_add']:.1f} us/add), 100 cursor operations: {res['cursor_seconds']:.3f}s")
@@ -0,0 +1,68 @@
+"""
+Compares the BeautifulSoup save path of Report.save_html against the streaming and soup-free paths.
+
+Usage: python benchmarks/bench_save_html.py [--images 300] [--size 256]
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+from bakepy import Report
+
+def make_png(path, size = 256):
+    """
+    Writes a size x size grayscale gradient PNG without third party libraries.
+    """
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+    rows = b"".join(b"\x00" + bytes((x + y) % 256 for x in range(size)) for y in range(size))
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows)))
+        f.write(chunk(b"IEND", b""))
+
+def build_report(img_dir, n_images, size):
+    r = Report()
+    r.recipe("title", "Save benchmark")
+    for i in range(n_images):
+        path = os.path.join(img_dir, f"img_{i}.png")
+        make_png(path, size)
+        r.recipe("img", path, size=3, caption=f"Image {i}", new_row=(i % 4 == 0))
+        r.add(f"<p>Paragraph {i}</p>", new_col=False)
+    return r
+
+MODES = {
+    "soup": dict(prettify=True),
+    "stream": dict(prettify=False, scan_images=True),
+    "fast": dict(prettify=False, scan_images=False),
+}
+
+def run(n_images = 300, size = 256, repeat = 3):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        r = build_report(tmp, n_images, size)
+        for mode, kwargs in MODES.items():
+            filename = os.path.join(tmp, f"report_{mode}.html")
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                r.save_html(filename, **kwargs)
+                timings.append(time.perf_counter() - start)
+            results[mode] = {"seconds": min(timings), "bytes": os.path.getsize(filename)}
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.images, args.size, args.repeat)
+    base = results["soup"]["seconds"]
+    for mode, res in results.items():
+        print(f"{mode:>8}: {res['seconds']:.3f}s ({base/res['seconds']:.1f}x) {res['bytes']} bytes")
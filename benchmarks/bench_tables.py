@@ -0,0 +1,51 @@
+"""
+Compares the DataFrame renderer's "bakepy" table writer against df.to_html().
+
+Usage: python benchmarks/bench_tables.py [--rows 10000] [--cols 30] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bakepy.rendering import get_html
+
+def build_dataframe(rows, cols):
+    rng = np.random.default_rng(0)
+    data = {}
+    for j in range(cols):
+        if j % 3 == 0:
+            data[f"float_{j}"] = rng.standard_normal(rows)
+        elif j % 3 == 1:
+            data[f"int_{j}"] = rng.integers(0, 10**6, rows)
+        else:
+            data[f"str_{j}"] = rng.choice(["alpha", "beta", "gamma", "<delta>"], rows)
+    return pd.DataFrame(data)
+
+def run(rows = 10000, cols = 30, repeat = 3):
+    df = build_dataframe(rows, cols)
+    results = {}
+    outputs = {}
+    for engine in ("pandas", "bakepy"):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[engine] = get_html(df, engine=engine, large_table_threshold=None)
+            times.append(time.perf_counter() - start)
+        results[engine] = {"seconds": min(times)}
+    results["identical"] = outputs["pandas"] == outputs["bakepy"]
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.cols, args.repeat)
+    base = results["pandas"]["seconds"]
+    for engine in ("pandas", "bakepy"):
+        print(f"{engine:>7}: {results[engine]['seconds']:.2f}s ({base/results[engine]['seconds']:.1f}x)")
+    print(f"Identical output: {results['identical']}")
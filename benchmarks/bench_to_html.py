@@ -0,0 +1,47 @@
+"""
+Measures rendering a report's tree with HTMLElement.to_html, and re-rendering it with memoization.
+
+Usage: python benchmarks/bench_to_html.py [--cells 20000] [--ncols 4] [--repeat 3]
+"""
+import argparse
+import time
+
+from bakepy import Report
+from bakepy.html import memoize_html
+
+def build_report(n_cells, ncols):
+    r = Report()
+    r.add_many([f"<p>Cell {i}</p>" for i in range(n_cells)], ncols=ncols, sizes=12 // ncols)
+    return r
+
+def run(n_cells = 20000, ncols = 4, repeat = 3):
+    r = build_report(n_cells, ncols)
+    results = {}
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        html = r.body.to_html()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    results["to_html"] = {"seconds": best, "us_per_cell": best / n_cells * 1e6, "bytes": len(html)}
+
+    with memoize_html():
+        r.body.to_html()
+        start = time.perf_counter()
+        memoized = r.body.to_html()
+        seconds = time.perf_counter() - start
+    results["memoized"] = {"seconds": seconds, "us_per_cell": seconds / n_cells * 1e6}
+    results["identical"] = html == memoized
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cells", type=int, default=20000)
+    parser.add_argument("--ncols", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    res = run(args.cells, args.ncols, args.repeat)
+    print(f"to_html: {res['to_html']['seconds']:.3f}s ({res['to_html']['us_per_cell']:.1f} us/cell, {res['to_html']['bytes'] / 2**20:.1f} MiB)")
+    print(f"memoized: {res['memoized']['seconds']:.4f}s ({res['memoized']['us_per_cell']:.2f} us/cell), identical: {res['identical']}")
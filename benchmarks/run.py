@@ -0,0 +1,280 @@
+"""
+Runs the benchmark suite and writes its results as JSON, optionally comparing them against the results of a previous run.
+
+Usage: python benchmarks/run.py [--profile quick] [--only tables figures] [--output results.json] [--compare baseline.json] [--threshold 0.2]
+
+Each benchmark module exposes a run() function returning a dictionary of results. Benchmarks whose optional dependencies
+(pandas, matplotlib) are not installed are recorded as skipped. Compared metrics are lower-is-better (times and sizes);
+the exit status is 1 if any of them grew by more than the threshold, or if any output check (such as "identical") failed.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+#The benchmarks import bakepy from the checkout they belong to, so runs of different commits can be compared.
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+#Benchmarks as name: (module, arguments of run() for each profile).
+SUITE = {
+    "report_add_rows": ("bench_report_add", {
+        "quick": {"sizes": (1000, 10000), "layout": "rows"},
+        "full": {"sizes": (1000, 10000, 50000, 100000), "layout": "rows"},
+    }),
+    "report_add_cols": ("bench_report_add", {
+        "quick": {"sizes": (1000, 10000), "layout": "cols"},
+        "full": {"sizes": (1000, 10000, 50000, 100000), "layout": "cols"},
+    }),
+    "add_many": ("bench_add_many", {
+        "quick": {"n_items": 2000},
+        "full": {"n_items": 20000},
+    }),
+    "node_memory": ("bench_node_memory", {
+        "quick": {"n_cells": 20000},
+        "full": {"n_cells": 100000},
+    }),
+    "to_html": ("bench_to_html", {
+        "quick": {"n_cells": 5000},
+        "full": {"n_cells": 50000},
+    }),
+    "save_html": ("bench_save_html", {
+        "quick": {"n_images": 50, "repeat": 1},
+        "full": {"n_images": 300},
+    }),
+    "tables_small": ("bench_tables", {
+        "quick": {"rows": 100, "cols": 10},
+        "full": {"rows": 100, "cols": 10},
+    }),
+    "tables_medium": ("bench_tables", {
+        "quick": {"rows": 1000, "cols": 30},
+        "full": {"rows": 10000, "cols": 30},
+    }),
+    "tables_large": ("bench_tables", {
+        "quick": {"rows": 10000, "cols": 30, "repeat": 1},
+        "full": {"rows": 100000, "cols": 30},
+    }),
+    "figures_svg": ("bench_figures", {
+        "quick": {"n_figures": 20, "workers": (2,), "save_format": "svg"},
+        "full": {"n_figures": 200, "workers": (1, 2, 4), "save_format": "svg"},
+    }),
+    "figures_png": ("bench_figures", {
+        "quick": {"n_figures": 20, "workers": (2,), "save_format": "png"},
+        "full": {"n_figures": 200, "workers": (1, 2, 4), "save_format": "png"},
+    }),
+    "eager_render": ("bench_eager_render", {
+        "quick": {"n_figures": 20},
+        "full": {"n_figures": 100},
+    }),
+    "markdown": ("bench_markdown", {
+        "quick": {"n_texts": 50, "repeat": 1},
+        "full": {"n_texts": 200},
+    }),
+}
+
+PROFILES = ("quick", "full")
+
+#Lower-is-better metrics compared across runs.
+COMPARED_METRICS = ("seconds", "cursor_seconds", "us_per_add", "us_per_cell", "ms_per_text", "bytes", "bytes_per_node", "peak_bytes")
+
+#Output checks that must hold in every run.
+CHECKS = ("identical",)
+
+#Times below this many seconds are too noisy to compare.
+DEFAULT_MIN_SECONDS = 0.01
+
+DEFAULT_THRESHOLD = 0.2
+
+def get_metadata(profile):
+    """
+    Gets the environment of a run, so results are only compared with runs of the same commit or machine knowingly.
+    """
+    metadata = {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "profile": profile,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    try:
+        from bakepy.__about__ import __version__
+        metadata["bakepy"] = __version__
+    except ImportError:
+        metadata["bakepy"] = None
+    try:
+        root = os.path.dirname(BENCHMARKS_DIR)
+        metadata["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        metadata["dirty"] = subprocess.run(["git", "status", "--porcelain", "--", "bakepy"], cwd=root, capture_output=True, text=True, check=True).stdout != ""
+    except (OSError, subprocess.CalledProcessError):
+        metadata["commit"] = None
+    return metadata
+
+def run_benchmark(name, profile = "quick"):
+    """
+    Runs a benchmark of the suite.
+
+    Parameters
+    ----------
+    name: str
+        The name of the benchmark.
+    profile: str, default = "quick"
+        The size of the benchmark's workload. Either "quick" or "full".
+    Returns
+    -------
+    result: dict
+        The arguments of the benchmark and its results, or the reason it was skipped or failed.
+    """
+    module_name, profiles = SUITE[name]
+    params = profiles[profile]
+    entry = {"module": module_name, "params": params}
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        entry["skipped"] = str(e)
+        return entry
+
+    start = time.perf_counter()
+    try:
+        entry["results"] = module.run(**params)
+    except Exception:
+        entry["error"] = traceback.format_exc()
+    entry["wall_seconds"] = time.perf_counter() - start
+    return entry
+
+def run_suite(names = None, profile = "quick"):
+    """
+    Runs several benchmarks of the suite.
+
+    Parameters
+    ----------
+    names: list, default = None
+        The names of the benchmarks to run, or prefixes of them (for example, "tables"). If None, runs every benchmark.
+    profile: str, default = "quick"
+        The size of the benchmarks' workload. Either "quick" or "full".
+    Returns
+    -------
+    results: dict
+        The metadata of the run and the results of each benchmark.
+    """
+    if profile not in PROFILES:
+        raise Exception(f"Invalid profile {profile}. Valid profiles are: {list(PROFILES)}.")
+    selected = [n for n in SUITE if names is None or any(n == x or n.startswith(f"{x}_") for x in names)]
+    if names is not None and len(selected) == 0:
+        raise Exception(f"No benchmarks match {names}. Valid benchmarks are: {list(SUITE)}.")
+
+    results = {"metadata": get_metadata(profile), "benchmarks": {}}
+    for name in selected:
+        print(f"Running {name}...", file=sys.stderr, flush=True)
+        entry = results["benchmarks"][name] = run_benchmark(name, profile)
+        if "skipped" in entry:
+            print(f"  skipped: {entry['skipped']}", file=sys.stderr)
+        elif "error" in entry:
+            print(f"  failed:\n{entry['error']}", file=sys.stderr)
+        else:
+            print(f"  done in {entry['wall_seconds']:.2f}s", file=sys.stderr)
+    return results
+
+def flatten(value, prefix = ""):
+    """
+    Flattens nested results into a dictionary from "/"-joined paths to values.
+    """
+    if isinstance(value, dict):
+        flat = {}
+        for k, v in value.items():
+            flat.update(flatten(v, f"{prefix}/{k}" if prefix else str(k)))
+        return flat
+    return {prefix: value}
+
+def compare(results, baseline, threshold = DEFAULT_THRESHOLD, min_seconds = DEFAULT_MIN_SECONDS):
+    """
+    Compares the results of a run against those of a previous one.
+
+    Parameters
+    ----------
+    results: dict
+        The results of the run, as returned by run_suite().
+    baseline: dict
+        The results of the previous run.
+    threshold: float, default = 0.2
+        The relative growth of a metric above which it is reported as a regression.
+    min_seconds: float, default = 0.01
+        Times below this in both runs are not compared.
+    Returns
+    -------
+    rows: list
+        The (path, baseline value, new value, ratio, status) of each compared metric and failed check.
+    """
+    rows = []
+    for name, entry in results["benchmarks"].items():
+        new = flatten(entry.get("results", {}))
+        old = flatten(baseline.get("benchmarks", {}).get(name, {}).get("results", {}))
+        for path, value in new.items():
+            metric = path.rsplit("/", 1)[-1]
+            if metric in CHECKS:
+                if value is False:
+                    rows.append((f"{name}/{path}", old.get(path), value, None, "FAILED"))
+                continue
+            if metric not in COMPARED_METRICS or not isinstance(value, (int, float)):
+                continue
+            previous = old.get(path)
+            if not isinstance(previous, (int, float)) or previous <= 0:
+                continue
+            if "bytes" not in metric:
+                #Per-unit times are as noisy as the time they are derived from.
+                seconds_path = path if "seconds" in metric else "/".join(path.split("/")[:-1] + ["seconds"])
+                seconds = (new.get(seconds_path, value), old.get(seconds_path, previous))
+                if all(isinstance(x, (int, float)) for x in seconds) and max(seconds) < min_seconds:
+                    continue
+            ratio = value / previous
+            if ratio > 1 + threshold:
+                status = "REGRESSION"
+            elif ratio < 1 / (1 + threshold):
+                status = "improved"
+            else:
+                status = "ok"
+            rows.append((f"{name}/{path}", previous, value, ratio, status))
+    return rows
+
+def _to_json(value):
+    #Tuples of the benchmarks' arguments are stored as lists.
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Object of type {type(value)} is not JSON serializable")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="quick", choices=PROFILES)
+    parser.add_argument("--only", nargs="+", default=None, help=f"Benchmarks to run. One of: {', '.join(SUITE)}")
+    parser.add_argument("--output", default=None, help="The JSON file to write the results to. If None, they are printed.")
+    parser.add_argument("--compare", default=None, help="A JSON file with the results of a previous run.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS)
+    args = parser.parse_args()
+
+    results = run_suite(args.only, args.profile)
+    if args.output is None:
+        print(json.dumps(results, indent=2, default=_to_json))
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=_to_json)
+
+    failed = any("error" in entry for entry in results["benchmarks"].values())
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("metadata", {}).get("profile") != args.profile:
+            print(f"Warning: the baseline was run with the {baseline.get('metadata', {}).get('profile')} profile.", file=sys.stderr)
+        rows = compare(results, baseline, args.threshold, args.min_seconds)
+        for path, previous, value, ratio, status in rows:
+            str_ratio = "" if ratio is None else f"{ratio:.2f}x"
+            print(f"{status:>10} {str_ratio:>7}  {path}: {previous} -> {value}", file=sys.stderr)
+        failed = failed or any(status in ("REGRESSION", "FAILED") for *_, status in rows)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import pickle
+import threading
+
+import pytest
+
+from bakepy import Report, assets
+from bakepy.assets import AssetRegistry, use_asset_registry
+from bakepy.html import Image, memoize_html
+from bakepy.recipes import get_html
+from bakepy.rendering import get_html as render_html
+
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg==")
+PNG_URI = f"data:image/png;base64,{base64.b64encode(PNG).decode()}"
+
+@pytest.fixture
+def image(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "image.png").write_bytes(PNG)
+    return "image.png"
+
+def test_img_recipe_returns_html_string():
+    html = get_html("img", "image.png", caption="Caption")
+    assert isinstance(html, str)
+    assert '<img src="image.png" class="figure-img img-fluid">' in html
+    assert "Caption</figcaption>" in html
+
+    #Rendered on its own or in a report, the image is registered instead of being kept as a string.
+    assert render_html(html) == html
+    loaded = pickle.loads(pickle.dumps(html))
+    assert isinstance(loaded, Image) and (loaded.url, loaded.caption) == ("image.png", "Caption") and loaded == html
+
+def test_registry_resolves_sources(image):
+    with AssetRegistry() as registry, use_asset_registry(registry):
+        assert render_html(Image(image)) == Image(image).get_html(PNG_URI)
+        #Embedded images are kept as they are.
+        assert render_html(Image(PNG_URI)) == Image(PNG_URI)
+    assert registry.images == [image, PNG_URI]
+
+    with AssetRegistry(embed_images=False) as registry, use_asset_registry(registry):
+        assert render_html(Image(image)) == Image(image)
+
+def test_registry_prefetches_remote_images_once(monkeypatch):
+    calls = []
+    started = threading.Event()
+
+    def get_image_data(path, timeout = None, http_cache = None):
+        calls.append(path)
+        started.set()
+        return "image/png", PNG
+    monkeypatch.setattr(assets, "get_image_data", get_image_data)
+
+    url = "https://example.com/image.png"
+    with AssetRegistry(fetch_workers=2) as registry, use_asset_registry(registry):
+        registry.prefetch([url, url, "local.png"])
+        assert started.wait(5)
+        assert render_html(Image(url)) == render_html(Image(url)) == Image(url).get_html(PNG_URI)
+        #Both uses were served by the prefetched download.
+        assert calls == [url]
+        assert registry._pending == dict()
+        render_html(Image(url))
+    assert calls == [url, url]
+
+def test_memoized_elements_replay_registrations(image):
+    r = Report()
+    r.add(Image(image))
+    r.add("<p>Text</p>")
+    with memoize_html():
+        with AssetRegistry() as registry, use_asset_registry(registry):
+            first = r.body.to_html()
+        assert registry.images == [image]
+        with AssetRegistry() as registry, use_asset_registry(registry):
+            second = r.body.to_html()
+        #The memoized HTML is reused, and its images are registered again.
+        assert registry.images == [image]
+    assert first == second
+
+def test_figures_without_embedding_use_placeholder_files(tmp_path, monkeypatch):
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    monkeypatch.chdir(tmp_path)
+    fig, ax = plt.subplots()
+    ax.plot([1, 2])
+    r = Report()
+    r.add(fig, save_format="png", embed=False)
+    placeholder = f"BAKEPY_IMG_{id(fig)}.png"
+
+    r.save_html("linked.html", embed_images=False, prettify=False)
+    assert f'src="{placeholder}"' in (tmp_path / "linked.html").read_text()
+    assert (tmp_path / placeholder).read_bytes().startswith(b"\x89PNG")
+
+    #When the report embeds images, the placeholder file is embedded as well.
+    r.save_html("embedded.html")
+    html = (tmp_path / "embedded.html").read_text()
+    assert placeholder not in html and "data:image/png;base64," in html
+    plt.close(fig)
+
+def test_deduplicator_stores_repeated_images_once(image):
+    r = Report()
+    r.add(Image(image))
+    r.add(Image(image), new_row=False)
+    r.add(f'<img src="{PNG_URI}">')
+    for prettify in (True, False):
+        r.save_html("report.html", prettify=prettify, dedupe_assets=True)
+        html = open("report.html", encoding="utf-8").read()
+        assert html.count(PNG_URI) == 1
+        assert html.count("data-bakepy-src=") == 3
+        assert html.index("bakepy-assets") < html.index("</body>")
+
+def test_deduplicator_srcset():
+    dedup = assets.AssetDeduplicator()
+    html = dedup.dedupe(f'<img src="{PNG_URI}" srcset="{PNG_URI} 1x, {PNG_URI} 2x"><img src="local.png">')
+    digest = next(iter(dedup.assets))
+    assert list(dedup.assets.values()) == [PNG_URI]
+    assert html == f'<img data-bakepy-src="{digest}" data-bakepy-srcset="bakepy-asset:{digest} 1x, bakepy-asset:{digest} 2x"><img src="local.png">'
+
+def test_writer_names_are_stable(tmp_path):
+    (tmp_path / "image.png").write_bytes(PNG)
+    urls = []
+    for workers in (None, 4):
+        with assets.AssetWriter(tmp_path / "assets", base=tmp_path, workers=workers) as writer:
+            urls.append((writer.write_data(PNG, "image/png"), writer.copy_file(str(tmp_path / "image.png")), writer.write_data("a {}", "text/css")))
+    digest = hashlib.sha256(PNG).hexdigest()[:32]
+    assert urls[0] == urls[1]
+    assert urls[0][:2] == (f"assets/{digest}.png", f"assets/{digest}.png")
+    assert urls[0][2].endswith(".css")
+    assert sorted(p.name for p in (tmp_path / "assets").iterdir()) == sorted({f"{digest}.png", urls[0][2][len("assets/"):]})
+
+def test_saved_reports_link_the_same_files(image, tmp_path):
+    r = Report()
+    r.add(Image(image))
+    r.save_html("first.html", embed_images=False, assets_dir="assets")
+    r.save_html("second.html", embed_images=False, assets_dir="assets")
+    first = (tmp_path / "first.html").read_text()
+    assert first == (tmp_path / "second.html").read_text()
+    assert f'src="assets/{hashlib.sha256(PNG).hexdigest()[:32]}.png"' in first
+
+@pytest.mark.parametrize("failing", [("copy_file_range",), ("copy_file_range", "sendfile")])
+def test_copy_falls_back_to_a_plain_copy(tmp_path, monkeypatch, failing):
+    data = bytes(range(256)) * 5000
+    (tmp_path / "src.bin").write_bytes(data)
+
+    def fail(*args, **kwargs):
+        raise OSError("Not supported")
+    for name in failing:
+        monkeypatch.setattr(assets.os, name, fail, raising=False)
+    assets._copy_file(tmp_path / "src.bin", tmp_path / "dst.bin")
+    assert (tmp_path / "dst.bin").read_bytes() == data
+
+    #Without the system calls at all.
+    for name in failing:
+        monkeypatch.delattr(assets.os, name)
+    assets._copy_file(tmp_path / "src.bin", tmp_path / "other.bin")
+    assert (tmp_path / "other.bin").read_bytes() == data
@@ -0,0 +1,62 @@
+import importlib.util
+import json
+import subprocess
+import sys
+
+from pathlib import Path
+
+import pytest
+
+RUN_PATH = Path(__file__).parents[1] / "benchmarks" / "run.py"
+
+@pytest.fixture(scope="module")
+def run():
+    spec = importlib.util.spec_from_file_location("bakepy_benchmarks_run", RUN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def results(**benchmarks):
+    return {"metadata": {"profile": "quick"}, "benchmarks": {k: {"results": v} for k, v in benchmarks.items()}}
+
+def test_compare_statuses(run):
+    new = results(a={"slow": {"seconds": 1.5}, "fast": {"seconds": 0.5}, "same": {"seconds": 1.1}, "tiny": {"seconds": 0.002},
+                     "size": {"bytes": 130}, "cells": {"seconds": 0.001, "us_per_cell": 3.0}, "identical": False, "cpus": 4},
+                  b={"new": {"seconds": 1.0}})
+    old = results(a={"slow": {"seconds": 1.0}, "fast": {"seconds": 1.0}, "same": {"seconds": 1.0}, "tiny": {"seconds": 0.001},
+                     "size": {"bytes": 100}, "cells": {"seconds": 0.001, "us_per_cell": 1.0}, "identical": True, "cpus": 1})
+    rows = {path: (previous, value, status) for path, previous, value, _, status in run.compare(new, old, threshold=0.2, min_seconds=0.01)}
+    assert rows == {
+        "a/slow/seconds": (1.0, 1.5, "REGRESSION"),
+        "a/fast/seconds": (1.0, 0.5, "improved"),
+        "a/same/seconds": (1.0, 1.1, "ok"),
+        #Sizes are compared regardless of min_seconds, and times derived from short runs are not.
+        "a/size/bytes": (100, 130, "REGRESSION"),
+        "a/identical": (True, False, "FAILED"),
+    }
+
+def test_compare_skips_missing_and_skipped_results(run):
+    new = results(figures={"serial": {"seconds": 1.0}, "2_workers": {"skipped": "single CPU"}})
+    old = results(figures={"serial": {"seconds": 1.0}, "2_workers": {"seconds": 0.5}})
+    assert [row[0] for row in run.compare(new, old)] == ["figures/serial/seconds"]
+
+@pytest.fixture(scope="module")
+def add_many_results(tmp_path_factory):
+    output = tmp_path_factory.mktemp("benchmarks") / "results.json"
+    subprocess.run([sys.executable, str(RUN_PATH), "--only", "add_many", "--output", str(output)], check=True, capture_output=True)
+    return output.read_text()
+
+@pytest.mark.parametrize("factor, code, status", [(100, 0, "improved"), (0.001, 1, "REGRESSION")])
+def test_compare_command(add_many_results, tmp_path, factor, code, status):
+    baseline = json.loads(add_many_results)
+    for mode in ("loop", "add_many"):
+        baseline["benchmarks"]["add_many"]["results"][mode]["seconds"] *= factor
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+
+    process = subprocess.run([sys.executable, str(RUN_PATH), "--only", "add_many", "--compare", str(tmp_path / "baseline.json"), "--min-seconds", "0"],
+                             capture_output=True, text=True)
+    assert process.returncode == code
+    lines = [l.split() for l in process.stderr.splitlines() if "add_many/" in l]
+    assert sorted(l[2] for l in lines) == ["add_many/add_many/seconds:", "add_many/loop/seconds:"]
+    assert all(l[0] == status for l in lines)
+    assert json.loads(process.stdout)["benchmarks"]["add_many"]["results"]["identical"] is True
@@ -0,0 +1,78 @@
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from bakepy import cache
+from bakepy.cache import RenderCache
+
+def test_get_and_set(tmp_path):
+    c = RenderCache(tmp_path)
+    assert c.get("a") is None
+    c.set("a", "<p>a</p>")
+    assert c.get("a") == "<p>a</p>"
+    #Entries are shared with other instances using the same directory.
+    assert RenderCache(tmp_path).get("a") == "<p>a</p>"
+    c.clear()
+    assert c.get("a") is None
+
+def test_skips_entries_larger_than_the_cache(tmp_path):
+    c = RenderCache(tmp_path, max_size=4)
+    c.set("a", "<p>a</p>")
+    assert c.get("a") is None
+
+def test_evicts_least_recently_used(tmp_path):
+    c = RenderCache(tmp_path, max_size=24)
+    for i, key in enumerate("abc"):
+        c.set(key, "<p>x</p>")
+        os.utime(c._path(key), (i, i))
+    #Reading an entry marks it as recently used.
+    assert c.get("a") == "<p>x</p>"
+    c.set("d", "<p>x</p>")
+    assert c.get("b") is None
+    assert [c.get(key) for key in "acd"] == ["<p>x</p>"] * 3
+    assert c._size == 24
+
+def make_figure(values, title = "Title", color = None):
+    fig, ax = plt.subplots()
+    ax.plot(values, color=color, label="values")
+    ax.set_title(title)
+    ax.legend()
+    return fig
+
+def test_matplotlib_key():
+    values = np.arange(10.0)
+    key = cache._get_matplotlib_key(make_figure(values))
+    assert key == cache._get_matplotlib_key(make_figure(values.copy()))
+
+    changed = [make_figure(values + 1), make_figure(values, title="Other"), make_figure(values, color="red")]
+    assert all(cache._get_matplotlib_key(fig) != key for fig in changed)
+    plt.close("all")
+
+def test_matplotlib_key_does_not_draw(monkeypatch):
+    fig = make_figure(np.arange(10.0))
+    key = cache._get_matplotlib_key(fig)
+    fig.canvas.draw()
+    #Drawing does not change the key of a simple figure.
+    assert cache._get_matplotlib_key(fig) == key
+
+    def draw(*args, **kwargs):
+        raise AssertionError("The figure was drawn.")
+    monkeypatch.setattr(fig.canvas, "draw", draw)
+    monkeypatch.setattr(fig, "draw", draw)
+    assert cache._get_matplotlib_key(fig) == key
+    plt.close("all")
+
+def test_matplotlib_key_skips_foreign_artists():
+    from matplotlib.lines import Line2D
+
+    class CustomLine(Line2D):
+        pass
+    CustomLine.__module__ = "custom"
+
+    fig, ax = plt.subplots()
+    ax.add_line(CustomLine([0, 1], [0, 1]))
+    assert cache._get_matplotlib_key(fig) is None
+    plt.close("all")
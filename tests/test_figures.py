@@ -0,0 +1,76 @@
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+
+from bakepy import Report
+from bakepy.figures import FigureSerializer, serialize_figure, use_figure_serializer
+
+@pytest.fixture
+def report():
+    r = Report()
+    figures = []
+    for i in range(5):
+        fig, ax = plt.subplots(figsize=(2, 2))
+        ax.plot([0, i, 2 * i])
+        ax.set_title(f"Figure {i}")
+        figures.append(fig)
+        r.add(fig, save_format="png", new_row=(i % 2 == 0))
+    #A figure rendered twice is serialized once.
+    r.add(figures[0], save_format="png")
+    yield r
+    plt.close("all")
+
+def test_serializer_matches_serial_output(report):
+    serial = report.body.to_html()
+    with FigureSerializer(workers=2, window=2) as serializer, use_figure_serializer(serializer):
+        serializer.add(report.body.iter_elements())
+        parallel = report.body.to_html()
+    assert parallel == serial
+
+def test_serializer_skips_figures_not_rendered(report):
+    figures = [fig for fig, _ in report.body.iter_elements()]
+    with FigureSerializer(workers=1, window=1) as serializer:
+        serializer.add(report.body.iter_elements())
+        #Figures skipped while rendering (for example, because they were cached) are dropped.
+        assert serializer.get(figures[2], "png", {}) == serialize_figure(figures[2], "png")
+        assert serializer.get(figures[1], "png", {}) is None
+        assert serializer.get(figures[3], "png", {}) == serialize_figure(figures[3], "png")
+
+def test_serialize_figure_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fig, ax = plt.subplots()
+    ax.plot([1, 2])
+    img_type, svg = serialize_figure(fig)
+    assert img_type == "image/svg+xml"
+    root = re.search(rb"<svg\b[^>]*>", svg).group(0)
+    assert root.count(b"width=") == root.count(b"height=") == 1
+    assert b'width="100%" height="100%"' in root
+    assert serialize_figure(fig, "png")[0] == "image/png"
+
+    #Rendering embedded figures writes no files.
+    r = Report()
+    r.add(fig, caption="Figure")
+    assert "data:image/svg+xml;base64," in r.body.to_html()
+    assert list(tmp_path.iterdir()) == []
+    plt.close(fig)
+
+def test_serialize_figures_concurrently():
+    figures = []
+    for i in range(8):
+        fig, ax = plt.subplots(figsize=(2, 2))
+        ax.plot([0, i])
+        figures.append(fig)
+    fonttype = plt.rcParams["svg.fonttype"]
+    serial = [serialize_figure(fig, "png") for fig in figures]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(lambda fig: serialize_figure(fig, "png"), figures)) == serial
+        svgs = list(pool.map(serialize_figure, figures))
+    #Text is kept as text in every SVG, and the global rcParams are restored.
+    assert all(b"<text" in svg for _, svg in svgs)
+    assert plt.rcParams["svg.fonttype"] == fonttype
+    plt.close("all")
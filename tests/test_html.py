@@ -0,0 +1,112 @@
+import copy
+import dataclasses
+import io
+import pickle
+import sys
+
+import pytest
+
+from bakepy import Report, html
+from bakepy.html import Body, Column, Row, EMPTY_OPTIONS, memoize_html
+
+def build_report(n_rows):
+    r = Report()
+    for i in range(n_rows):
+        r.add(f"<p>Row {i}</p>")
+    return r
+
+def test_pickled_column_does_not_include_report():
+    r = build_report(400)
+    with memoize_html():
+        r.body.to_html()
+    column = r.current_col
+    #A column holding a single paragraph, without the other 399 rows.
+    assert len(pickle.dumps(column)) < 500
+
+    loaded = pickle.loads(pickle.dumps(column))
+    assert loaded._parent is None and loaded._html is None and loaded._positions is None
+    assert loaded.to_html() == column.to_html()
+
+def test_pickled_report_keeps_parent_links():
+    r = build_report(3)
+    loaded = pickle.loads(pickle.dumps(r))
+    assert loaded.body.to_html() == r.body.to_html()
+    assert loaded.current_col._parent is loaded.current_row
+    assert loaded.current_row._parent is loaded.current_container
+    assert loaded.current_container._parent is loaded.body
+    loaded.add("<p>New</p>")
+    assert "<p>New</p>" in loaded.body.to_html()
+
+def test_copies_keep_parent_links():
+    r = build_report(3)
+    row = r.current_row
+    shallow = copy.copy(row)
+    assert r.current_col._parent is row
+    deep = copy.deepcopy(row)
+    assert deep.elements[0]._parent is deep and deep._parent is None
+
+def test_pickled_column_subclass_keeps_attributes():
+    column = Column(size=4)
+    column.add_element("<p>x</p>", caption="c")
+    loaded = pickle.loads(pickle.dumps(column))
+    assert loaded == column and loaded.parse_options == [{"caption": "c"}]
+
+def test_nodes_are_slotted():
+    r = build_report(3)
+    for node in (r.body, r.current_container, r.current_row, r.current_col):
+        assert not hasattr(node, "__dict__")
+        with pytest.raises(AttributeError):
+            node.unknown_attribute = 1
+    assert sys.getsizeof(r.current_col) < 128
+
+def test_empty_options_are_shared_and_read_only():
+    r = build_report(3)
+    options = [o for row in r.current_container.elements for o in row.parse_options + row.elements[0].parse_options]
+    assert all(o is EMPTY_OPTIONS for o in options)
+    with pytest.raises(Exception, match="cannot be modified"):
+        EMPTY_OPTIONS["a"] = 1
+    assert copy.deepcopy(EMPTY_OPTIONS) is EMPTY_OPTIONS and pickle.loads(pickle.dumps(EMPTY_OPTIONS)) is EMPTY_OPTIONS
+    r.add("<p>With options</p>", caption="A")
+    assert r.current_row.elements[0].parse_options[0] == {"caption": "A"}
+
+def test_classes_and_styles_are_shared():
+    a, b = Column(classes=["x", "y"]), Column(classes=("x", "y"))
+    assert a.classes == ("x", "y") and a.classes is b.classes
+    a.add_cls("z")
+    assert a.classes == ("x", "y", "z") and b.classes == ("x", "y")
+    assert a.str_cls() == "col x y z"
+
+def test_interned_classes_are_bounded(monkeypatch):
+    monkeypatch.setattr(html, "_INTERNED", {})
+    monkeypatch.setattr(html, "MAX_INTERNED", 2)
+    columns = [Column(styles=[f"width: {i}px;"]) for i in range(10)]
+    assert len(html._INTERNED) == 2
+    assert [c.styles for c in columns] == [(f"width: {i}px;",) for i in range(10)]
+    assert Column(styles=["width: 0px;"]).styles is columns[0].styles
+
+def test_nodes_work_with_dataclass_functions():
+    column = Column(classes=["x"], size=4)
+    row = Row(elements=[column], parse_options=[EMPTY_OPTIONS])
+    assert dataclasses.is_dataclass(column)
+    assert [f.name for f in dataclasses.fields(column)] == ["name", "elements", "parse_options", "classes", "styles", "size", "main_class"]
+    resized = dataclasses.replace(column, size=6)
+    assert resized.size == 6 and resized.classes == ("x",) and column.size == 4
+    assert dataclasses.asdict(row)["elements"][0]["size"] == 4
+    assert [f.name for f in dataclasses.fields(Body)][-1] == "stylesheets"
+
+def test_write_html_matches_to_html():
+    r = build_report(5)
+    r.add("<p>Column</p>", new_row=False)
+    r.add_container(name="other")
+    r.add("# Markdown", md=True)
+    out = io.StringIO()
+    r.body.write_html(out)
+    assert out.getvalue() == r.body.to_html()
+
+    with memoize_html():
+        memoized = io.StringIO()
+        r.body.write_html(memoized)
+        #The second write uses the memoized HTML.
+        again = io.StringIO()
+        r.body.write_html(again)
+    assert memoized.getvalue() == again.getvalue() == r.body.to_html()
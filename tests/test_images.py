@@ -0,0 +1,61 @@
+import base64
+import io
+import re
+
+import pytest
+
+from bakepy import Report
+from bakepy.assets import AssetRegistry, use_asset_registry
+from bakepy.html import Image
+from bakepy.images import ImageOptimizer, get_image_widths
+from bakepy.rendering import get_html
+
+PILImage = pytest.importorskip("PIL.Image")
+
+def png(width, height):
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="png")
+    return buffer.getvalue()
+
+def decoded_width(uri):
+    return PILImage.open(io.BytesIO(base64.b64decode(uri.split(",", 1)[1]))).width
+
+def test_image_widths_follow_the_layout():
+    r = Report()
+    r.add(Image("wide.png"))
+    r.add(Image("half.png"), size=6)
+    r.add(Image("auto.png"), new_row=False)
+    r.add(Image("half.png"), size=4)
+    assert get_image_widths(r.body) == {"wide.png": 1272, "half.png": 612, "auto.png": 612}
+
+def test_srcset_widths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "large.png").write_bytes(png(2000, 100))
+    (tmp_path / "small.png").write_bytes(png(500, 100))
+    optimizer = ImageOptimizer(format="png", densities=(2, 1), widths={"large.png": 612, "small.png": 400})
+    assert optimizer.densities == (1, 2)
+
+    with AssetRegistry(image_optimizer=optimizer) as registry, use_asset_registry(registry):
+        html = get_html(Image("large.png"))
+        small = get_html(Image("small.png"))
+    src = re.search(r'src="(data:[^"]*)"', html).group(1)
+    srcset = re.search(r'srcset="([^"]*)"', html).group(1).split(", ")
+    assert decoded_width(src) == 612
+    assert [c.rsplit(" ", 1)[1] for c in srcset] == ["1x", "2x"]
+    assert [decoded_width(c.rsplit(" ", 1)[0]) for c in srcset] == [612, 1224]
+
+    #Higher densities are limited to the original image.
+    srcset = re.search(r'srcset="([^"]*)"', small).group(1).split(", ")
+    assert [decoded_width(c.rsplit(" ", 1)[0]) for c in srcset] == [400, 500]
+
+    #Images no wider than their column get a single variant.
+    optimizer.widths["small.png"] = 600
+    with AssetRegistry(image_optimizer=optimizer) as registry, use_asset_registry(registry):
+        assert "srcset" not in get_html(Image("small.png"))
+
+def test_max_width_caps_every_density():
+    optimizer = ImageOptimizer(format="png", max_width=300, densities=(1, 2), widths={"a.png": 612})
+    variants = optimizer.optimize("a.png", "image/png", png(2000, 100))
+    assert [w for _, _, w in variants] == [300]
+    #Images are never enlarged.
+    assert [w for _, _, w in ImageOptimizer(format="png").optimize("b.png", "image/png", png(100, 10))] == [100]
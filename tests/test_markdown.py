@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from bakepy import markdown_engine
+from bakepy.markdown_engine import FormulaCache, convert_markdown, render_formulas, use_formula_cache
+
+OPTIONS = {"no_inline_svg": False}
+
+class Renderer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"<span>{self.calls}</span>"
+
+def test_formula_cache_hit_and_miss():
+    cache = FormulaCache()
+    render = Renderer()
+    assert cache.lookup("inline", "x^2", OPTIONS) is None
+    assert cache.get("inline", "x^2", OPTIONS, render) == "<span>1</span>"
+    assert cache.get("inline", "x^2", OPTIONS, render) == "<span>1</span>"
+    assert render.calls == 1
+    #The kind, source and options are all part of the key.
+    cache.get("block", "x^2", OPTIONS, render)
+    cache.get("inline", "x^3", OPTIONS, render)
+    cache.get("inline", "x^2", {"no_inline_svg": True}, render)
+    assert render.calls == 4
+    cache.clear()
+    assert cache.lookup("inline", "x^2", OPTIONS) is None
+
+def test_formula_cache_is_in_memory_by_default(monkeypatch, tmp_path):
+    monkeypatch.setenv("BAKEPY_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    for cache in (FormulaCache(), FormulaCache(directory=False)):
+        assert cache.directory is None
+        cache.get("inline", "x^2", OPTIONS, Renderer())
+    assert os.listdir(tmp_path) == []
+
+def test_formula_cache_directory(tmp_path):
+    render = Renderer()
+    FormulaCache(tmp_path).get("inline", "x^2", OPTIONS, render)
+    assert len(list(tmp_path.glob("*.html"))) == 1
+
+    #Another cache (for example, in another run) on the same directory finds the formula.
+    cache = FormulaCache(str(tmp_path))
+    assert cache.get("inline", "x^2", OPTIONS, render) == "<span>1</span>"
+    assert render.calls == 1
+    cache.clear()
+    assert list(tmp_path.glob("*.html")) == []
+
+def test_formula_cache_directory_is_bounded(tmp_path):
+    cache = FormulaCache(tmp_path, max_size=100)
+    for i in range(10):
+        cache.store("inline", f"x^{i}", OPTIONS, "<span>" + "x" * 30 + "</span>")
+    sizes = [p.stat().st_size for p in tmp_path.glob("*.html")]
+    assert 0 < len(sizes) < 10 and sum(sizes) <= 100
+
+def test_use_formula_cache_with_directory(tmp_path):
+    with use_formula_cache(str(tmp_path)) as cache:
+        assert isinstance(cache, FormulaCache) and cache.directory == str(tmp_path)
+
+TEXTS = [
+    "Inline $`x^2`$ formula.",
+    "```math\n\\frac{1}{2}\n```",
+    "The same $`x^2`$ formula and $`y_1`$ another one.",
+]
+
+def test_batch_matches_single_formulas(monkeypatch):
+    pytest.importorskip("markdown_katex")
+    with use_formula_cache(FormulaCache()):
+        try:
+            single = [convert_markdown(text, latex=True) for text in TEXTS]
+        except Exception as e:
+            pytest.skip(f"KaTeX is not available: {e}")
+
+    with use_formula_cache(FormulaCache()):
+        #Identical formulas are rendered once.
+        assert render_formulas(TEXTS) == 3
+        assert render_formulas(TEXTS) == 0
+        #Converting after the batch only reads the cache.
+        def fail(*args, **kwargs):
+            raise AssertionError("A formula was rendered again.")
+        monkeypatch.setattr(markdown_engine, "md_inline2html", fail)
+        monkeypatch.setattr(markdown_engine, "md_block2html", fail)
+        assert [convert_markdown(text, latex=True) for text in TEXTS] == single
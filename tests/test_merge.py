@@ -0,0 +1,66 @@
+import pytest
+
+from bakepy import Report
+from bakepy.parallel import build_reports
+
+def build(label, containers = ("default_container",)):
+    r = Report()
+    for name in containers:
+        if name in r.containers:
+            r.set_current_container(name)
+        else:
+            r.add_container(name)
+        r.add(f"<p>{label} {name}</p>")
+    return r
+
+def texts(report):
+    return {name: [x.elements[0].elements[0] for x in c.elements] for name, c in report.containers.items()}
+
+def test_merge_appends_rows_of_containers_with_the_same_name():
+    r = build("a", ("default_container", "shared"))
+    other = build("b", ("shared", "default_container", "new"))
+    r.merge(other)
+    assert texts(r) == {
+        "default_container": ["<p>a default_container</p>", "<p>b default_container</p>"],
+        "shared": ["<p>a shared</p>", "<p>b shared</p>"],
+        "new": ["<p>b new</p>"],
+    }
+    assert list(r.containers) == ["default_container", "shared", "new"]
+    assert r.current_container_name == "new"
+    #The other report is left empty, and both can still be added to.
+    assert other.containers == dict() and other.body.elements == []
+    other.add("<p>b again</p>")
+    r.add("<p>a again</p>")
+    assert texts(r)["new"][-1] == "<p>a again</p>"
+
+def test_merge_overwrite_replaces_containers_in_place():
+    r = build("a", ("default_container", "shared", "last"))
+    r.merge(build("b", ("shared", "shared_2")), overwrite=True)
+    assert list(r.containers) == ["default_container", "shared", "last", "shared_2"]
+    assert texts(r)["shared"] == ["<p>b shared</p>"]
+    assert r.body.elements[1] is r.containers["shared"]
+
+def test_merge_into_a_single_container():
+    r = build("a")
+    other = build("b", ("default_container", "other"))
+    r.merge(other, container_name="merged", copy=True)
+    assert texts(r)["merged"] == ["<p>b default_container</p>", "<p>b other</p>"]
+    #Copies leave the other report unchanged.
+    assert texts(other) == {"default_container": ["<p>b default_container</p>"], "other": ["<p>b other</p>"]}
+
+    #Merging a copy twice adds the rows twice.
+    r.merge(other, container_name="merged", copy=True)
+    assert len(texts(r)["merged"]) == 4
+
+def test_merge_into_itself_raises():
+    r = build("a")
+    with pytest.raises(Exception):
+        r.merge(r)
+
+def test_merged_build_reports_keep_builder_order():
+    builders = [lambda i=i: build(i, ("default_container", f"only_{i % 2}")) for i in range(4)]
+    r = Report()
+    for other in build_reports(builders, workers=2, executor="thread"):
+        r.merge(other)
+    assert list(r.containers) == ["default_container", "only_0", "only_1"]
+    assert [x.html for x in texts(r)["only_0"]] == ["<p>0 only_0</p>", "<p>2 only_0</p>"]
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from bakepy import Report
+from bakepy.assets import AssetRegistry, use_asset_registry
+from bakepy.html import Deferred, Image
+from bakepy.parallel import iter_html_parallel
+
+def build_report(n_cols = 12):
+    r = Report()
+    for i in range(n_cols):
+        r.add(f"<p>Column {i}</p>", new_row=(i % 4 == 0))
+        r.add("# Title", md=True, new_col=False)
+    r.add_container("other")
+    r.add("<p>Other</p>")
+    return r
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+@pytest.mark.parametrize("window", [None, 1, 3])
+def test_matches_serial_output(executor, window):
+    r = build_report()
+    assert "".join(iter_html_parallel(r.body, workers=2, executor=executor, window=window)) == r.body.to_html()
+
+def test_keeps_document_order_when_columns_finish_out_of_order():
+    r = Report()
+    for i in range(6):
+        #Earlier columns take longer to render.
+        r.add(Deferred(lambda i=i: (time.sleep(0.05 * (6 - i)), f"<p>Column {i}</p>")[1]), new_row=False)
+    html = "".join(iter_html_parallel(r.body, workers=6, window=6))
+    assert [html.index(f"Column {i}") for i in range(6)] == sorted(html.index(f"Column {i}") for i in range(6))
+    assert html == r.body.to_html()
+
+def test_window_bounds_columns_in_flight():
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def render(i):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return f"<p>Column {i}</p>"
+
+    r = Report()
+    for i in range(10):
+        r.add(Deferred(lambda i=i: render(i)), new_row=(i % 3 == 0))
+    html = "".join(iter_html_parallel(r.body, workers=4, window=2))
+    #The column being written, and at most two ahead of it.
+    assert running[1] <= 3
+    assert html == r.body.to_html()
+
+def test_merges_registrations_in_document_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    r = Report()
+    for i in range(5):
+        r.add(Image(f"image_{i}.png"), new_row=False)
+    with AssetRegistry(embed_images=False) as registry, use_asset_registry(registry):
+        "".join(iter_html_parallel(r.body, workers=3, window=2))
+    assert registry.images == [f"image_{i}.png" for i in range(5)]
@@ -0,0 +1,56 @@
+import pytest
+
+from bakepy import Report, rendering
+from bakepy.cache import RenderCache, register_cache_key, use_render_cache
+from bakepy.rendering import register_batch_html_renderer, register_html_renderer
+
+class Item:
+    def __init__(self, value):
+        self.value = value
+
+class OtherItem(Item):
+    pass
+
+@pytest.fixture
+def batch_calls(monkeypatch):
+    monkeypatch.setattr(rendering, "RENDER_FUNCTIONS_DICT", dict(rendering.RENDER_FUNCTIONS_DICT))
+    monkeypatch.setattr(rendering, "BATCH_RENDER_FUNCTIONS_DICT", dict(rendering.BATCH_RENDER_FUNCTIONS_DICT))
+    monkeypatch.setattr(rendering, "_RENDERER_CACHE", dict())
+    calls = []
+
+    @register_html_renderer(cls=Item)
+    def _get_item_html(element, suffix = ""):
+        return f"<p>single {element.value}{suffix}</p>"
+
+    @register_batch_html_renderer(cls=Item)
+    def _get_item_batch_html(elements, options):
+        calls.append([e.value for e in elements])
+        return [f"<p>batch {e.value}{o.get('suffix', '')}</p>" for e, o in zip(elements, options)]
+    return calls
+
+def test_batch_renderer_called_once_per_column(batch_calls):
+    r = Report()
+    r.add([Item(1), "<p>text</p>", OtherItem(2), Item(3)], new_col=False)
+    r.add([Item(4)], suffix="!", new_col=False)
+    r.add(Item(5))
+    html = r.body.to_html()
+    assert batch_calls == [[1, 2, 3, 4], [5]]
+    #Results keep the position and options of each element.
+    assert html.index("batch 1") < html.index("<p>text</p>") < html.index("batch 2") < html.index("batch 3") < html.index("batch 4!")
+    assert "single" not in html
+
+    #Objects rendered on their own use the regular renderer.
+    assert rendering.get_html(Item(6)) == "<p>single 6</p>"
+    assert len(batch_calls) == 2
+
+def test_batch_renderer_skips_cached_elements(batch_calls, monkeypatch, tmp_path):
+    monkeypatch.setattr("bakepy.cache.CACHE_KEY_FUNCTIONS_DICT", dict())
+    register_cache_key(cls=Item)(lambda element: str(element.value))
+    r = Report()
+    r.add([Item(1), Item(2)], new_col=False)
+    with use_render_cache(RenderCache(tmp_path)):
+        first = r.body.to_html()
+        r.add(Item(3), new_row=False, new_col=False)
+        second = r.body.to_html()
+    assert batch_calls == [[1, 2], [3]]
+    assert second.startswith(first[:first.index("batch 2") + len("batch 2")])
@@ -0,0 +1,155 @@
+import pytest
+
+from bakepy import Report
+from bakepy.html import EMPTY_OPTIONS
+
+def texts(element):
+    return [x.elements[0] for x in element.elements]
+
+def test_add_container_overwrite_keeps_position():
+    r = Report()
+    r.add_container("a")
+    r.add_container("b")
+    old = r.containers["a"]
+    r.add_container("a", overwrite=True)
+    assert r.body.elements == [r.containers["a"], r.containers["b"]]
+    assert r.containers["a"] is not old and r.body.elements[0] is r.containers["a"]
+    assert r.current_container_name == "a" and r.current_container is r.containers["a"]
+
+def test_add_container_appends_new_containers():
+    r = Report()
+    r.add_container("a")
+    r.add_container("b")
+    r.add_container("c")
+    assert [c.name for c in r.body.elements] == ["a", "b", "c"]
+
+def test_remove_named_container():
+    r = Report()
+    r.add_container("a")
+    r.add("<p>a</p>")
+    r.add_container("b")
+    r.add("<p>b</p>")
+    e, _ = r.remove_container("a")
+    assert e.name == "a"
+    assert list(r.containers) == ["b"] and r.body.elements == [r.containers["b"]]
+    assert r.current_container_name == "b" and r.current_col.elements == ["<p>b</p>"]
+
+def test_remove_current_container_moves_cursor():
+    r = Report()
+    r.add_container("a")
+    r.add("<p>a</p>")
+    r.add_container("b")
+    r.remove_container()
+    assert r.current_container_name == "a" and r.current_col.elements == ["<p>a</p>"]
+    r.remove_container()
+    assert r.current_container is None and r.current_col is None
+
+def test_remove_current_col():
+    r = Report()
+    for i in range(3):
+        r.add(f"<p>{i}</p>", new_row=False)
+    r.set_current_col(1)
+    r.remove_col()
+    assert [c.elements[0] for c in r.current_row.elements] == ["<p>0</p>", "<p>2</p>"]
+    #The current column moves to the last one of the row.
+    assert r.current_col_idx == 1 and r.current_col.elements == ["<p>2</p>"]
+
+def test_remove_col_before_current():
+    r = Report()
+    for i in range(3):
+        r.add(f"<p>{i}</p>", new_row=False)
+    r.remove_col(col_idx=0)
+    assert r.current_col_idx == 1 and r.current_col.elements == ["<p>2</p>"]
+    r.add("<p>3</p>", new_row=False)
+    assert [c.elements[0] for c in r.current_row.elements] == ["<p>1</p>", "<p>2</p>", "<p>3</p>"]
+
+def test_remove_row_before_current():
+    r = Report()
+    for i in range(4):
+        r.add(f"<p>{i}</p>")
+    r.remove_row(row_idx=1)
+    assert r.current_row_idx == 2 and r.current_col.elements == ["<p>3</p>"]
+    r.remove_row()
+    assert r.current_row_idx == 1 and r.current_col.elements == ["<p>2</p>"]
+
+def test_remove_without_rows_or_cols():
+    r = Report()
+    r.add_container("empty")
+    with pytest.raises(Exception, match="No row to remove"):
+        r.remove_row()
+    r.add_row()
+    with pytest.raises(Exception, match="No col to remove"):
+        r.remove_col()
+
+def test_cursor_survives_many_removals():
+    r = Report()
+    for i in range(50):
+        r.add(f"<p>{i}</p>")
+    expected = [f"<p>{i}</p>" for i in range(50)]
+    for idx in (0, 10, 20, -1, 5):
+        r.remove_row(row_idx=idx)
+        expected.pop(idx)
+        assert [row.elements[0].elements[0] for row in r.current_container.elements] == expected
+        assert r.current_container.elements[r.current_row_idx] is r.current_row
+        assert r.current_row.elements[r.current_col_idx] is r.current_col
+
+@pytest.mark.parametrize("sizes", [[], [4, 0], -1])
+def test_add_many_invalid_sizes(sizes):
+    r = Report()
+    with pytest.raises(Exception, match="Invalid"):
+        r.add_many(["<p>a</p>", "<p>b</p>"], sizes=sizes)
+    assert r.current_row is None
+
+def test_add_many_shares_empty_options():
+    r = Report()
+    r.add_many([f"<p>{i}</p>" for i in range(5)], sizes=[6, 6])
+    rows = r.current_container.elements
+    assert [len(row.elements) for row in rows] == [2, 2, 1]
+    assert all(o is EMPTY_OPTIONS for row in rows for o in row.parse_options)
+    assert all(o is EMPTY_OPTIONS for row in rows for col in row.elements for o in col.parse_options)
+
+def test_add_many_string_sizes():
+    r = Report()
+    with pytest.raises(Exception, match="Pass ncols"):
+        r.add_many(["<p>a</p>", "<p>b</p>"], sizes="auto")
+    r.add_many(["<p>a</p>", "<p>b</p>", "<p>c</p>"], ncols=2, sizes="auto")
+    rows = r.current_container.elements
+    assert [len(row.elements) for row in rows] == [2, 1]
+    assert all(col.str_main_cls() == "col-auto" for row in rows for col in row.elements)
+
+def test_add_many_fills_current_row():
+    r = Report()
+    r.add("<p>0</p>")
+    r.add_many([f"<p>{i}</p>" for i in range(1, 6)], ncols=3, new_row=False)
+    rows = r.current_container.elements
+    assert [[col.elements[0] for col in row.elements] for row in rows] == [["<p>0</p>", "<p>1</p>", "<p>2</p>"], ["<p>3</p>", "<p>4</p>", "<p>5</p>"]]
+    assert r.current_row_idx == 1 and r.current_col.elements == ["<p>5</p>"]
+
+    #A full current row is not extended.
+    r.add_many(["<p>6</p>"], ncols=3, new_row=False)
+    assert [len(row.elements) for row in r.current_container.elements] == [3, 3, 1]
+
+    #Without ncols or sizes, every item is added to the current row.
+    r.add_many(["<p>7</p>", "<p>8</p>"], new_row=False)
+    assert [len(row.elements) for row in r.current_container.elements] == [3, 3, 3]
+
+def test_find_element_compares_parents_by_identity(monkeypatch):
+    r = Report()
+    for i in range(3):
+        r.add("<p>Same</p>")
+    rows = r.current_container.elements
+    assert rows[0] == rows[1]
+    #Equal rows are never compared as whole subtrees when looking up a child.
+    monkeypatch.setattr(type(rows[0]), "__eq__", lambda self, other: pytest.fail("Compared rows by value."))
+    assert rows[0].find_element(rows[1].elements[0]) is None
+    assert rows[1].find_element(rows[1].elements[0]) == 0
+    r.remove_row(row_idx=0)
+    assert r.current_row is rows[1] and r.current_row_idx == 1
+
+def test_streamed_save_html_matches_to_html(tmp_path):
+    r = Report()
+    for i in range(5):
+        r.add(f"<p>Row {i}</p>", new_row=(i % 2 == 0))
+    filename = tmp_path / "report.html"
+    r.save_html(str(filename), prettify=False, embed_links=False)
+    assert filename.read_text() == r.body.to_html()
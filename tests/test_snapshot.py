@@ -0,0 +1,109 @@
+import base64
+import struct
+
+import pytest
+
+from bakepy import Report
+from bakepy.html import Image
+from bakepy.snapshot import RenderedFragment, SnapshotFile, SNAPSHOT_HEADER, BLOB_ALIGNMENT
+
+pd = pytest.importorskip("pandas")
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg==")
+
+def cursor(report):
+    return report.current_container_name, report.current_row_idx, report.current_col_idx
+
+def saved_html(report, filename):
+    report.save_html(filename)
+    with open(filename, encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture
+def report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fig, ax = plt.subplots()
+    ax.plot([1, 3, 2])
+    fig.savefig("local.png")
+
+    r = Report()
+    r.add("<p>Text</p>")
+    r.add(pd.DataFrame({"a": [1.5, None], "b": ["x", "<y>"]}), new_row=False)
+    r.add_container("figures")
+    r.add(fig, caption="A figure", save_format="png")
+    r.recipe("img", "local.png")
+    r.set_current_container("default_container")
+    r.set_current_col(0, row_idx=0)
+    plt.close(fig)
+    return r
+
+def test_snapshot_round_trip(report):
+    report.save_snapshot("report.bakepy")
+    loaded = Report.load_snapshot("report.bakepy")
+    assert list(loaded.containers) == list(report.containers)
+    assert cursor(loaded) == cursor(report) == ("default_container", 0, 0)
+    assert saved_html(loaded, "loaded.html") == saved_html(report, "report.html")
+
+def test_snapshot_saved_over_loaded_file(report):
+    report.save_snapshot("report.bakepy")
+    loaded = Report.load_snapshot("report.bakepy")
+    loaded.add("<p>Added</p>")
+    report.add("<p>Added</p>")
+    #The blobs of the loaded report are read from the file being replaced.
+    loaded.save_snapshot("report.bakepy")
+    reloaded = Report.load_snapshot("report.bakepy")
+    assert cursor(reloaded) == cursor(report) == ("default_container", 1, 0)
+    assert saved_html(reloaded, "reloaded.html") == saved_html(report, "report.html")
+    assert saved_html(loaded, "loaded.html") == saved_html(report, "report.html")
+
+def test_eager_render_resolves_images_from_output_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out" / "image.png").write_bytes(PNG)
+    reports = [Report(eager_render=eager_render) for eager_render in (False, True)]
+    for r in reports:
+        r.add(Image("image.png", caption="Relative"))
+        r.recipe("img", "image.png")
+    #The image only exists next to the saved report, not in the working directory.
+    assert isinstance(reports[1].current_col.elements[0], RenderedFragment)
+    lazy, eager = [saved_html(r, "out/report.html") for r in reports]
+    assert eager == lazy
+    assert eager.count(f"data:image/png;base64,{base64.b64encode(PNG).decode('ascii')}") == 2
+
+    #Snapshots store the image itself.
+    reports[1].save_snapshot("out/report.bakepy")
+    (tmp_path / "out" / "image.png").unlink()
+    assert saved_html(Report.load_snapshot("out/report.bakepy"), "out/report.html") == eager
+
+def test_snapshot_blobs_are_aligned_and_stored_once(report):
+    report.recipe("img", "local.png")
+    report.add(pd.DataFrame({"a": [1]}))
+    report.save_snapshot("report.bakepy")
+    source = SnapshotFile("report.bakepy")
+    assert all(offset % BLOB_ALIGNMENT == 0 for offset, _ in source.blobs)
+    #The image used twice is stored once.
+    data = open("local.png", "rb").read()
+    assert [source.get_bytes(i) for i in range(len(source.blobs))].count(data) == 1
+    #Blobs can be viewed as arrays without copying.
+    offset, length = source.blobs[0]
+    assert source.get_view(0)[:length - length % 8].cast("d").nbytes == length - length % 8
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: b"",
+    lambda data: data[:10],
+    lambda data: b"NOTASNAP" + data[8:],
+    lambda data: data[:8] + struct.pack("<I", 99) + data[12:],
+    lambda data: data[:SNAPSHOT_HEADER.size] + data[SNAPSHOT_HEADER.size:-10],
+    lambda data: data[:-2] + b"{]",
+])
+def test_corrupt_snapshot_raises(report, corrupt):
+    report.save_snapshot("report.bakepy")
+    with open("report.bakepy", "rb") as f:
+        data = f.read()
+    with open("corrupt.bakepy", "wb") as f:
+        f.write(corrupt(data))
+    with pytest.raises(Exception, match="snapshot"):
+        Report.load_snapshot("corrupt.bakepy")
@@ -0,0 +1,93 @@
+import re
+import base64
+
+from pathlib import Path
+
+import pytest
+
+import bakepy.stylesheets as stylesheets
+
+from bakepy import Report
+from bakepy.assets import AssetWriter
+from bakepy.stylesheets import StylesheetCache, embed_links, get_cache_dir, link_stylesheets
+
+def test_cache_dir_environment(monkeypatch, tmp_path):
+    monkeypatch.delenv("BAKEPY_CACHE_DIR", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assert get_cache_dir() == tmp_path / "xdg" / "bakepy"
+    assert StylesheetCache().directory == tmp_path / "xdg" / "bakepy" / "stylesheets"
+
+    monkeypatch.setenv("BAKEPY_CACHE_DIR", str(tmp_path / "bakepy"))
+    assert get_cache_dir() == tmp_path / "bakepy"
+
+    monkeypatch.delenv("BAKEPY_CACHE_DIR")
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert get_cache_dir() == Path.home() / ".cache" / "bakepy"
+
+def test_save_html_does_not_fetch_stylesheets_by_default(monkeypatch, tmp_path):
+    def fail(*args, **kwargs):
+        raise AssertionError("Stylesheets were fetched.")
+    monkeypatch.setattr(stylesheets, "fetch_url", fail)
+    monkeypatch.setenv("BAKEPY_CACHE_DIR", str(tmp_path / "cache"))
+
+    r = Report()
+    r.add("<p>Hello</p>")
+    for prettify in (True, False):
+        r.save_html(str(tmp_path / "report.html"), prettify=prettify)
+        html = (tmp_path / "report.html").read_text()
+        assert "bootstrap.min.css" in html
+        assert "<style>" not in html
+    assert not (tmp_path / "cache").exists()
+
+KATEX_URL = "https://cdn.example.com/katex/katex.min.css"
+KATEX_CSS = (
+    '@font-face{font-family:KaTeX_Main;src:url(fonts/KaTeX_Main-Regular.woff2) format("woff2"),'
+    'url(fonts/KaTeX_Main-Regular.woff) format("woff"),url(fonts/KaTeX_Main-Regular.ttf) format("truetype")}'
+    '.katex{font:normal 1.21em KaTeX_Main}.check{background:url("data:image/svg+xml,%3csvg%3e")}'
+)
+FONT = b"wOF2 font data"
+
+@pytest.fixture
+def remote_files(monkeypatch):
+    files = {
+        KATEX_URL: KATEX_CSS.encode("utf-8"),
+        "https://cdn.example.com/katex/fonts/KaTeX_Main-Regular.woff2": FONT,
+    }
+    fetched = []
+    def fetch_url(url, timeout = None, http_cache = None):
+        fetched.append(url)
+        if url not in files:
+            raise Exception(f"404 {url}")
+        return None, files[url]
+    monkeypatch.setattr(stylesheets, "fetch_url", fetch_url)
+    return files, fetched
+
+def test_embed_links_embeds_fonts(remote_files, tmp_path):
+    files, fetched = remote_files
+    head = f'<link href="{KATEX_URL}" rel="stylesheet">'
+    html = embed_links(head, StylesheetCache(tmp_path))
+    assert f"url(data:font/woff2;base64,{base64.b64encode(FONT).decode('ascii')})" in html
+    assert "https://" not in html and ".woff)" not in html and ".ttf" not in html
+    assert 'url("data:image/svg+xml,%3csvg%3e")' in html
+    assert fetched == [KATEX_URL, "https://cdn.example.com/katex/fonts/KaTeX_Main-Regular.woff2"]
+
+    #Fonts are cached like stylesheets.
+    embed_links(head, StylesheetCache(tmp_path))
+    assert len(fetched) == 2
+
+def test_embed_links_keeps_missing_fonts(remote_files, tmp_path):
+    files, _ = remote_files
+    del files["https://cdn.example.com/katex/fonts/KaTeX_Main-Regular.woff2"]
+    with pytest.warns(UserWarning, match="KaTeX_Main-Regular.woff2"):
+        html = embed_links(f'<link href="{KATEX_URL}" rel="stylesheet">', StylesheetCache(tmp_path / "cache"))
+    assert "url(https://cdn.example.com/katex/fonts/KaTeX_Main-Regular.woff2)" in html
+
+def test_link_stylesheets_writes_fonts(remote_files, tmp_path):
+    with AssetWriter(tmp_path / "assets", base=tmp_path) as writer:
+        head = link_stylesheets(f'<link href="{KATEX_URL}" rel="stylesheet">', writer, StylesheetCache(tmp_path / "cache"))
+    href = re.search(r'href="([^"]+)"', head).group(1)
+    assert href.startswith("assets/") and href.endswith(".css")
+    css = (tmp_path / href).read_text()
+    font = re.search(r"url\(([^)]+\.woff2)\)", css).group(1)
+    #Relative to the stylesheet, which is in the same directory.
+    assert (tmp_path / "assets" / font).read_bytes() == FONT
@@ -0,0 +1,110 @@
+import base64
+import gzip
+import json
+import re
+import struct
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bakepy.rendering import get_html
+from bakepy.tables import get_large_table_html, write_table_html, can_write_table_html
+
+def test_import_without_pandas():
+    code = "import sys; sys.modules['pandas'] = None; sys.modules['numpy'] = None; import bakepy; bakepy.Report().body.to_html()"
+    subprocess.run([sys.executable, "-W", "ignore", "-c", code], check=True)
+
+def test_large_table_string_classes():
+    df = pd.DataFrame({"a": np.arange(5)})
+    html = get_large_table_html(df, classes="table")
+    assert '<table class="dataframe table">' in html
+    html = get_large_table_html(df, classes=("table", "table-sm"))
+    assert '<table class="dataframe table table-sm">' in html
+
+DATAFRAMES = {
+    "float": pd.DataFrame({"a": [1.0, 2.25, np.nan]}),
+    "inf": pd.DataFrame({"a": [np.inf, 1.0, 2.5]}),
+    "neg_inf": pd.DataFrame({"a": [-np.inf, np.nan, 2.0]}),
+    "inf_large": pd.DataFrame({"a": [np.inf, 1e7, 2.5]}),
+    "small": pd.DataFrame({"a": [1e-9, 2.5]}),
+    "int": pd.DataFrame({"a": [1, 2]}),
+    "bool": pd.DataFrame({"a": [True, False]}),
+    "object_none": pd.DataFrame({"a": ["x", None, np.nan, 1.5]}),
+    "object_missing": pd.DataFrame({"a": [pd.NA, pd.NaT, None, "z"]}),
+    "object_bytes": pd.DataFrame({"a": [b"x", b"y"]}),
+    "object_containers": pd.DataFrame({"a": [[1, 2.5], {"k": None}, (1,), "t\tx\ny"]}),
+    "complex": pd.DataFrame({"a": [1 + 2j, 3.5 - 1j]}),
+    "datetime": pd.DataFrame({"a": pd.to_datetime(["2020-01-01", None])}),
+    "category": pd.DataFrame({"a": pd.Categorical(["x", None])}),
+    "nullable": pd.DataFrame({"a": pd.array([1, None], dtype="Int64"), "b": pd.array([1.5, None], dtype="Float64")}),
+    "string": pd.DataFrame({"a": pd.array(["t\tx", None], dtype="string")}),
+    "escaped": pd.DataFrame({"<a>": ["<b>&"]}),
+    "index": pd.DataFrame({"a": [1, 2]}, index=pd.Index([None, b"k"], name="i")),
+}
+
+OPTIONS = [dict(), dict(na_rep="-"), dict(float_format="{:.2f}".format), dict(escape=False)]
+
+@pytest.mark.parametrize("name", DATAFRAMES)
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("classes", [["table", "table-bordered"], "table", None])
+def test_write_table_html_matches_pandas(name, options, classes):
+    df = DATAFRAMES[name]
+    expected = df.to_html(classes=classes, justify="left", index=True, **options)
+    if can_write_table_html(df, options):
+        assert write_table_html(df, None, classes, "left", True, **options) == expected
+
+def test_unsupported_dtypes_fall_back():
+    assert not can_write_table_html(DATAFRAMES["complex"], {})
+    assert not can_write_table_html(DATAFRAMES["nullable"], {"float_format": "{:.2f}".format})
+    assert can_write_table_html(DATAFRAMES["nullable"], {})
+
+def decode_large_table(html):
+    """
+    Decodes the payload of a large table like the browser script does, as (header, columns).
+    """
+    payload = re.search(r'class="bakepy-table-data">(.*?)</script>', html).group(1)
+    data = gzip.decompress(base64.b64decode(payload))
+    header_length = struct.unpack("<I", data[:4])[0]
+    header = json.loads(data[4:4 + header_length])
+
+    def column(spec):
+        if spec["kind"] == "str":
+            return spec["values"]
+        #Numeric columns are read in place as float64 arrays.
+        assert spec["offset"] % 8 == 0
+        return np.frombuffer(data, dtype="<f8", count=header["rows"], offset=spec["offset"])
+    index = None if header["index"] is None else column(header["index"])
+    return header, index, [column(spec) for spec in header["columns"]]
+
+def test_large_table_payload_round_trip():
+    df = pd.DataFrame({
+        "float": [1.5, np.nan, -2.25, 1e300],
+        "int": [1, -2, 3, 2**40],
+        "big": [2**60, 1, 2, 3],
+        "str": ["a", None, "<b>", "d"],
+        "bool": [True, False, True, False],
+    }, index=pd.Index([10, 20, 30, 40], name="idx"))
+    header, index, columns = decode_large_table(get_large_table_html(df, na_rep="-"))
+    assert header["rows"] == 4 and header["na_rep"] == "-"
+    np.testing.assert_array_equal(index, df.index.to_numpy(dtype="float64"))
+    np.testing.assert_array_equal(columns[0], df["float"].to_numpy())
+    np.testing.assert_array_equal(columns[1], df["int"].to_numpy(dtype="float64"))
+    #Integers that do not fit in a float64 and non-numeric columns are kept as strings.
+    assert columns[2] == [str(x) for x in df["big"]]
+    assert columns[3] == ["a", None, "<b>", "d"]
+    assert columns[4] == ["True", "False", "True", "False"]
+
+    header, index, columns = decode_large_table(get_large_table_html(df[["float"]], index=False, float_format="{:.1f}".format))
+    assert index is None
+    assert columns == [["1.5", None, "-2.2", "{:.1f}".format(1e300)]]
+
+def test_large_table_threshold():
+    df = pd.DataFrame({"a": np.arange(5)})
+    assert get_html(df, large_table_threshold=5) == get_html(df, large_table_threshold=None) == get_html(df)
+    assert "bakepy-table-data" not in get_html(df, large_table_threshold=5)
+    large = get_html(df, large_table_threshold=4, page_size=2)
+    assert 'data-page-size="2"' in large
+    np.testing.assert_array_equal(decode_large_table(large)[2][0], np.arange(5))
@@ -0,0 +1,145 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bakepy.utils import HTTPCache, fetch_url, get_images_data, embed_image_srcs
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path == "/etag.png":
+            if self.headers.get("If-None-Match") == ETAG:
+                return self._send(304)
+            return self._send(200, PNG, {"ETag": ETAG})
+        if self.path == "/modified.png":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self._send(304)
+            return self._send(200, PNG, {"Last-Modified": LAST_MODIFIED})
+        if self.path == "/versioned.png":
+            etag = f'"{self.server.version}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304)
+            return self._send(200, PNG + self.server.version.encode("utf-8"), {"ETag": etag})
+        if self.path == "/plain.png":
+            return self._send(200, PNG)
+        if self.path.startswith("/slow"):
+            time.sleep(float(self.path.split("/")[2]))
+            return self._send(200, self.path.encode("utf-8"))
+        return self._send(404)
+
+    def _send(self, status, body = b"", headers = {}):
+        self.send_response(status)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1,localhost")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    httpd.version = "v1"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.mark.parametrize("path, header", [("/etag.png", "If-None-Match"), ("/modified.png", "If-Modified-Since")])
+def test_revalidation_reuses_cache(server, tmp_path, path, header):
+    cache = HTTPCache(tmp_path)
+    url = server.url + path
+    assert fetch_url(url, http_cache=cache) == ("image/png", PNG)
+    assert header not in server.requests[0][1]
+
+    #The server answers 304 Not Modified without a body, so the data comes from the cache.
+    assert fetch_url(url, http_cache=cache) == ("image/png", PNG)
+    assert header in server.requests[1][1]
+    assert len(server.requests) == 2
+
+def test_revalidation_updates_changed_files(server, tmp_path):
+    url = server.url + "/versioned.png"
+    assert fetch_url(url, http_cache=tmp_path) == ("image/png", PNG + b"v1")
+    server.version = "v2"
+    #The stale ETag is sent, and the new contents replace the cached ones.
+    assert fetch_url(url, http_cache=tmp_path) == ("image/png", PNG + b"v2")
+    assert server.requests[1][1]["If-None-Match"] == '"v1"'
+
+    #The cache is kept across instances (and runs).
+    assert fetch_url(url, http_cache=HTTPCache(tmp_path)) == ("image/png", PNG + b"v2")
+    assert server.requests[2][1]["If-None-Match"] == '"v2"'
+    assert HTTPCache(tmp_path).get(url) == ({"content_type": "image/png", "etag": '"v2"', "last_modified": None}, PNG + b"v2")
+
+def test_files_without_validators_are_not_cached(server, tmp_path):
+    cache = HTTPCache(tmp_path)
+    url = server.url + "/plain.png"
+    assert fetch_url(url, http_cache=cache) == ("image/png", PNG)
+    assert cache.get(url) is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_timeout(server):
+    start = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        fetch_url(f"{server.url}/slow/2", timeout=0.2)
+    assert time.perf_counter() - start < 1.5
+
+def test_failed_downloads_raise(server):
+    with pytest.raises(requests.HTTPError):
+        fetch_url(f"{server.url}/missing.png")
+    with pytest.raises(requests.HTTPError):
+        embed_image_srcs(f'<img src="{server.url}/missing.png">')
+
+def test_concurrent_fetch_order(server):
+    #Earlier images take longer, so they finish last.
+    delays = [0.6, 0.4, 0.2, 0.0]
+    paths = [f"{server.url}/slow/{d}" for d in delays]
+    start = time.perf_counter()
+    images = get_images_data(paths + paths[:1], workers=4)
+    elapsed = time.perf_counter() - start
+
+    assert list(images) == paths
+    assert [data for _, data in images.values()] == [p[len(server.url):].encode("utf-8") for p in paths]
+    #Downloaded concurrently, and each path once.
+    assert elapsed < sum(delays)
+    assert len(server.requests) == len(paths)
+
+def test_save_html_raises_on_failed_download(server, tmp_path):
+    from bakepy import Report
+    r = Report()
+    r.recipe("img", f"{server.url}/missing.png")
+    with pytest.raises(requests.HTTPError):
+        r.save_html(str(tmp_path / "report.html"), embed_links=False)
+
+def test_session_pool_grows_with_workers(server, monkeypatch, caplog):
+    from bakepy import utils
+    monkeypatch.setattr(utils, "_SESSION", None)
+    monkeypatch.setattr(utils, "_SESSION_POOL_SIZE", 0)
+    session = utils.get_session()
+    assert session.get_adapter(server.url)._pool_maxsize == 8
+
+    paths = [f"{server.url}/slow/0.1/{i}" for i in range(16)]
+    with caplog.at_level("WARNING", logger="urllib3.connectionpool"):
+        get_images_data(paths, workers=16)
+    assert utils.get_session() is session
+    assert session.get_adapter(server.url)._pool_maxsize == 16
+    #Every connection was kept for reuse.
+    assert "Connection pool is full" not in caplog.text
+    #Smaller requests keep the larger pool.
+    utils.get_session(4)
+    assert session.get_adapter(server.url)._pool_maxsize == 16